@@ -1,11 +1,152 @@
 import os
 
-from models.database_models import Vin
+from models.database_models import CacheMetadata, Vin
 
 HERE = os.path.dirname(os.path.abspath(__file__))
 
 # App configuration
 vin_parquet_name = "vin_cache.parquet"
 vin_table_name = Vin.__table__.name
+cache_metadata_table_name = CacheMetadata.__table__.name
 vin_parquet_path = os.path.join(HERE, "..", "data", vin_parquet_name)
 vpic_api_url = "https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/{}?format=json"
+
+# VIN validation configuration
+# Also reject lookups of VINs with an invalid model year code (position 10) or check digit
+# (position 9). Both are mandatory in North America, but not always present on VINs from
+# elsewhere, which the vPIC API still decodes. /remove only checks the format, so that
+# cached VINs can always be removed.
+vin_strict_validation = False
+
+# Prefix decoder configuration
+# Decode cache misses locally from the vehicles seen with the same first 8 VIN characters,
+# when at least prefix_decoder_min_samples of them were seen and prefix_decoder_min_share
+# of those agree on the make, model and body class.
+prefix_decoder_enabled = True
+prefix_decoder_min_samples = 5
+prefix_decoder_min_share = 0.95
+# Optional CSV file of reference vehicles (prefix, make, model, body_class[, model_year, count]).
+prefix_decoder_reference_path = None
+
+# Cache configuration
+# "sqlite" queries the database on the event loop, "async_sqlite" on a dedicated thread pool.
+# "redis" stores the cache on a server speaking the Redis protocol, shared by every worker and
+# node, and also queries it on a dedicated thread pool. "sharded_sqlite" spreads the VINs
+# across the DATABASE_SHARD_URLS databases of database/config.py, so that writers to different
+# shards do not wait for each other, and queries them on a dedicated thread pool.
+cache_backend = "async_sqlite"
+async_cache_workers = 8
+
+# Shared cache configuration, used when cache_backend is "redis".
+redis_host = "localhost"
+redis_port = 6379
+redis_db = 0
+redis_password = None
+# Seconds to connect or wait for a reply before the lookup is treated as a cache miss.
+redis_timeout = 0.5
+redis_key_prefix = "vin:"
+# Seconds cached vehicle details are kept on the server (None keeps them until removed).
+redis_ttl = None
+# Channel VINs removed through /remove are published on, for every worker to drop them from
+# its in-memory tier.
+redis_invalidation_channel = "vin-cache-invalidations"
+# How the vehicle details are serialized on the server. "struct" stores them in a compact
+# fixed-field layout, "json" as a JSON document. Values stored with either stay readable.
+redis_codec = "struct"
+
+# In-memory cache tier configuration
+memory_cache_max_size = 10000
+memory_cache_ttl = 300
+
+# Serve cache hits of /lookup from the JSON body kept by the in-memory tier, with the
+# "Cached Result?" and "Source" fields appended, rather than building and encoding a dict.
+lookup_raw_cache_hits = True
+
+# Stale-while-revalidate configuration
+# Seconds after which cached vehicle details are stale. Stale details are still served, while a
+# background task refreshes them from the vPIC API. None never refreshes them.
+vehicle_details_ttl = 30 * 24 * 60 * 60
+# Background refreshes in flight at most. Stale hits beyond that are served without one.
+vehicle_details_refresh_concurrency = 4
+
+# Negative cache configuration
+# Seconds a VIN the vPIC API returned no vehicle details for is answered with a 404 locally.
+negative_cache_ttl = 900
+negative_cache_workers = 2
+
+# vPIC client session configuration
+vpic_connection_limit = 100
+vpic_connection_limit_per_host = 100
+vpic_dns_cache_ttl = 300
+vpic_keepalive_timeout = 30
+vpic_connect_timeout = 5
+vpic_read_timeout = 15
+vpic_total_timeout = 20
+
+# vPIC resilience configuration
+# Retries of requests that failed with a timeout, a connection error, a 429 or a 5xx. Retry n waits
+# a random time up to vpic_retry_backoff * 2 ** n seconds, and at most vpic_retry_backoff_max.
+# A 429 with a Retry-After header waits that long instead, also at most vpic_retry_backoff_max.
+vpic_max_retries = 2
+vpic_retry_backoff = 0.2
+vpic_retry_backoff_max = 2
+# Consecutive failed requests that open the circuit, and seconds it stays open before a single
+# request is let through to probe the API. Requests fail fast while the circuit is open.
+vpic_circuit_failure_threshold = 5
+vpic_circuit_reset_timeout = 30
+# Requests started per second at most, in bursts of up to vpic_rate_limit_burst (None for no
+# limit), and seconds a request waits for the limit before failing fast.
+vpic_rate_limit = 50
+vpic_rate_limit_burst = 20
+vpic_rate_limit_max_wait = 1
+
+# Batch lookup configuration
+vpic_batch_api_url = "https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVINValuesBatch/"
+vpic_batch_size = 50
+vpic_batch_concurrency = 4
+batch_lookup_max_vins = 1000
+
+# SQLite cache eviction configuration
+# Bounds of the SQLite cache, in rows and in bytes of used database pages (None for no bound).
+cache_max_rows = 1000000
+cache_max_bytes = None
+# Rows evicted first once a bound is exceeded: "lru" the least recently read, "lfu" the least
+# read. Evictions bring the cache down to cache_eviction_target times the exceeded bound.
+cache_eviction_policy = "lru"
+cache_eviction_target = 0.9
+# Seconds between two eviction runs, which also write the counted reads to the database.
+cache_eviction_interval = 60
+# Free pages returned to the file system per run at most, for databases created with
+# auto_vacuum=INCREMENTAL.
+cache_vacuum_pages = 1000
+
+# Bulk remove configuration
+bulk_remove_max_vins = 100000
+
+# Warm-up configuration
+# Directory the /warmup endpoint reads VIN lists from.
+warmup_directory = os.path.join(HERE, "..", "data")
+# vPIC batch requests in flight at most, and started per second at most (None for no limit).
+warmup_concurrency = 2
+warmup_rate = 5
+# VINs fetched and inserted in a single transaction before the progress is saved.
+warmup_batch_size = 500
+
+# Import configuration
+# Rows read from the parquet file at a time, and written per transaction.
+import_batch_size = 10000
+import_transaction_rows = 50000
+# What an import does with rows whose VIN is already cached: "replace" overwrites them, "skip"
+# keeps the cached rows, "newer" overwrites them only if the imported row was fetched later.
+import_on_conflict = "replace"
+
+# Export configuration
+# Rows read from the database per parquet row group.
+export_row_group_size = 100000
+# Parquet compression codec ("zstd", "snappy", "gzip", "brotli", "lz4" or "none") and level.
+export_compression = "zstd"
+export_compression_level = None
+# Directory holding the parquet snapshot served by /export and its manifest.
+vin_snapshot_path = os.path.join(HERE, "..", "data", "vin_cache_snapshot")
+# Appended parts are folded back into a single part once there are this many.
+export_snapshot_max_parts = 16
@@ -0,0 +1,62 @@
+import asyncio
+
+import aiohttp
+
+from app.config import (
+    vpic_connect_timeout,
+    vpic_connection_limit,
+    vpic_connection_limit_per_host,
+    vpic_dns_cache_ttl,
+    vpic_keepalive_timeout,
+    vpic_read_timeout,
+    vpic_total_timeout,
+)
+
+
+class HttpSession:
+    """
+    Singleton holder for the application wide aiohttp client session.
+
+    The session keeps a pool of keep-alive connections to the vPIC API, so requests
+    after the first one skip the TCP and TLS handshakes.
+    """
+
+    __session = None
+    __loop = None
+
+    @classmethod
+    def get_session(cls) -> aiohttp.ClientSession:
+        """
+        Returns the shared client session, creating it on first use.
+        Must be called from within a running event loop.
+
+        :return: The client session.
+        :rtype: aiohttp.ClientSession
+        """
+        loop = asyncio.get_running_loop()
+        # A session cannot outlive the loop it was created on, so a new loop gets a new session.
+        if cls.__session is None or cls.__session.closed or cls.__loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=vpic_connection_limit,
+                limit_per_host=vpic_connection_limit_per_host,
+                ttl_dns_cache=vpic_dns_cache_ttl,
+                keepalive_timeout=vpic_keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=vpic_total_timeout,
+                connect=vpic_connect_timeout,
+                sock_read=vpic_read_timeout,
+            )
+            cls.__session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            cls.__loop = loop
+        return cls.__session
+
+    @classmethod
+    async def close(cls):
+        """
+        Closes the shared client session and its pooled connections.
+        """
+        if cls.__session is not None and not cls.__session.closed:
+            await cls.__session.close()
+        cls.__session = None
+        cls.__loop = None
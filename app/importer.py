@@ -0,0 +1,185 @@
+"""
+Imports a parquet file, such as the /export output, back into the cache, so a warm cache
+can be moved between nodes or restored without fetching every VIN from the vPIC API again.
+
+Usage: python -m app.importer PARQUET_FILE [--on-conflict replace|skip|newer] [--batch-size N]
+"""
+
+import argparse
+import itertools
+import json
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.config import import_batch_size, import_on_conflict, import_transaction_rows
+from app.vin_validation import validate_vins
+from caching.cache_interface import CacheInterface
+from caching.factory import cache_databases, negative_cache
+from caching.sharded_cache import ShardedSqliteCache
+from caching.sqlite_cache import CONFLICT_POLICIES, SqliteCache
+from database.connection import Database
+from log.logger import logger
+from metrics.metrics import imported_rows
+from models.database_models import create_tables, parse_model_year
+
+# Recorded in the source column of imported rows.
+IMPORT_SOURCE = "import"
+# Columns copied from the parquet file when present. Only vin is required. cached_at is the
+# column of the /export output holding the time the vehicle details were fetched.
+IMPORT_COLUMNS = ("vin", "make", "model", "model_year", "body_class", "cached_at")
+
+
+class ParquetToDatabaseError(Exception):
+    pass
+
+
+def import_parquet(
+    source: Union[str, BinaryIO],
+    database=Database,
+    on_conflict: str = import_on_conflict,
+    batch_size: int = import_batch_size,
+    transaction_rows: int = import_transaction_rows,
+    negative_cache: Optional[CacheInterface] = None,
+) -> Dict[str, int]:
+    """
+    Upserts the rows of a parquet file into the vins table.
+
+    The file is read batch_size rows at a time and written transaction_rows rows per
+    transaction, so the memory used does not depend on the size of the file. Rows with an
+    invalid VIN are skipped. A failed transaction leaves the ones committed before it.
+
+    :param source: The path of the parquet file, or the file object.
+    :type source: Union[str, BinaryIO]
+    :param database: The database to write to, or the list of the shards of a sharded
+        cache, each row going to the shard of its VIN.
+    :param on_conflict: What to do with rows whose VIN is already cached, one of
+        CONFLICT_POLICIES.
+    :type on_conflict: str
+    :param batch_size: The number of rows read from the file at a time.
+    :type batch_size: int
+    :param transaction_rows: The number of rows written per transaction.
+    :type transaction_rows: int
+    :param negative_cache: The negative cache to remove the imported VINs from, when
+        writing to shards. A single database has its negative cache in it.
+    :type negative_cache: Optional[CacheInterface]
+    :return: The number of rows read, written (inserted or updated) and invalid.
+    :rtype: Dict[str, int]
+    :raises ParquetToDatabaseError: If the file is not a parquet file with a vin column, or
+        the conflict policy is unknown.
+    :raises Exception: Any exception writing the database.
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ParquetToDatabaseError(
+            f"Unknown conflict policy: {on_conflict}, expected one of "
+            f"{CONFLICT_POLICIES}."
+        )
+    try:
+        parquet_file = pq.ParquetFile(source)
+    except Exception as e:
+        raise ParquetToDatabaseError(f"Could not read the parquet file: {e}")
+    names = parquet_file.schema_arrow.names
+    columns = [name for name in IMPORT_COLUMNS if name in names]
+    if "vin" not in columns:
+        raise ParquetToDatabaseError("The parquet file has no vin column.")
+
+    counts = {"rows": 0, "written": 0, "invalid": 0}
+    if isinstance(database, list):
+        cache = ShardedSqliteCache(database, negative_cache=negative_cache)
+    else:
+        cache = SqliteCache(database)
+    rows = read_rows(parquet_file, columns, batch_size, counts)
+    while True:
+        first_row = next(rows, None)
+        if first_row is None:
+            break
+        transaction = itertools.chain(
+            [first_row], itertools.islice(rows, transaction_rows - 1)
+        )
+        written = cache.import_rows(transaction, on_conflict=on_conflict)
+        counts["written"] += written
+        imported_rows.inc("written", amount=written)
+        logger.info(f"Imported {counts['rows']} rows so far.")
+    imported_rows.inc("invalid", amount=counts["invalid"])
+    return counts
+
+
+def read_rows(
+    parquet_file: pq.ParquetFile,
+    columns: List[str],
+    batch_size: int,
+    counts: Dict[str, int],
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the rows of the parquet file with a valid VIN as rows of the vins table, and
+    counts the rows read and the invalid ones in counts.
+
+    :rtype: Iterator[Dict[str, Any]]
+    """
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        counts["rows"] += batch.num_rows
+        missing = [None] * batch.num_rows
+        values = {
+            name: to_naive_utc(batch.column(name)).to_pylist()
+            if name in columns
+            else missing
+            for name in IMPORT_COLUMNS
+        }
+        vins = [(vin or "").strip() for vin in values["vin"]]
+        for index, error in enumerate(validate_vins(vins)):
+            if error:
+                counts["invalid"] += 1
+                continue
+            yield {
+                "vin": vins[index],
+                "make": values["make"][index],
+                "model": values["model"][index],
+                "model_year": parse_model_year(values["model_year"][index]),
+                "body_class": values["body_class"][index],
+                "fetched_at": values["cached_at"][index],
+                "last_accessed_at": values["cached_at"][index],
+                "source": IMPORT_SOURCE,
+            }
+
+
+def to_naive_utc(array: pa.Array) -> pa.Array:
+    """
+    Converts a timestamp array with a time zone to naive UTC, the way fetched_at is stored.
+    Arrow stores such timestamps in UTC, so this only drops the time zone, which also spares
+    building a time zone aware datetime per row. Other arrays are returned as they are.
+
+    :rtype: pa.Array
+    """
+    if pa.types.is_timestamp(array.type) and array.type.tz is not None:
+        return array.cast(pa.timestamp(array.type.unit))
+    return array
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="Parquet file, such as the /export output.")
+    parser.add_argument(
+        "--on-conflict", choices=CONFLICT_POLICIES, default=import_on_conflict
+    )
+    parser.add_argument("--batch-size", type=int, default=import_batch_size)
+    parser.add_argument("--transaction-rows", type=int, default=import_transaction_rows)
+    arguments = parser.parse_args()
+    if not cache_databases:
+        parser.error(
+            "The cache backend is not stored in SQLite and cannot be imported into."
+        )
+    create_tables(Database.get_engine())
+    counts = import_parquet(
+        arguments.path,
+        cache_databases,
+        on_conflict=arguments.on_conflict,
+        batch_size=arguments.batch_size,
+        transaction_rows=arguments.transaction_rows,
+        negative_cache=negative_cache,
+    )
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,83 @@
+import asyncio
+
 from fastapi import FastAPI, HTTPException, Request
 
 
-from routers import lookup, remove, export
+from app.config import prefix_decoder_enabled, prefix_decoder_reference_path
+from app.http_session import HttpSession
+from app.middleware import MetricsMiddleware
+from app.prefix_decoder import prefix_decoder
+from app.routers import lookup, remove, export, importer, metrics, stats, warmup
+from caching.factory import cache_databases, cache_evictor, invalidation_subscriber
+from database.connection import Database
+from models.database_models import create_tables
 
 
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 app.include_router(lookup.router)
 app.include_router(remove.router)
 app.include_router(export.router)
+app.include_router(importer.router)
+app.include_router(metrics.router)
+app.include_router(warmup.router)
+app.include_router(stats.router)
+
+
+@app.on_event("startup")
+async def create_database_tables():
+    # Runs before the other startup hooks, which may read the tables.
+    await asyncio.get_running_loop().run_in_executor(
+        None, create_tables, Database.get_engine()
+    )
+
+
+@app.on_event("startup")
+async def open_http_session():
+    HttpSession.get_session()
+
+
+@app.on_event("startup")
+async def load_prefix_decoder():
+    if prefix_decoder_enabled:
+        await asyncio.get_running_loop().run_in_executor(
+            None, prefix_decoder.load, cache_databases, prefix_decoder_reference_path
+        )
+
+
+@app.on_event("startup")
+async def subscribe_to_invalidations():
+    if invalidation_subscriber is not None:
+        invalidation_subscriber.start()
+
+
+@app.on_event("shutdown")
+async def unsubscribe_from_invalidations():
+    if invalidation_subscriber is not None:
+        await asyncio.get_running_loop().run_in_executor(
+            None, invalidation_subscriber.stop
+        )
+
+
+@app.on_event("startup")
+async def start_cache_eviction():
+    if cache_evictor is not None:
+        cache_evictor.start()
+
+
+@app.on_event("shutdown")
+async def stop_cache_eviction():
+    if cache_evictor is not None:
+        await asyncio.get_running_loop().run_in_executor(None, cache_evictor.stop)
+
+
+@app.on_event("shutdown")
+async def cancel_warmup():
+    await warmup.cancel_warmup()
+
+
+@app.on_event("shutdown")
+async def close_http_session():
+    # Stale entries being refreshed still need the session.
+    await lookup.stale_refreshes.close()
+    await HttpSession.close()
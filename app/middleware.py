@@ -0,0 +1,68 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+
+from metrics.metrics import (
+    format_server_timing,
+    http_request_duration,
+    http_requests,
+    server_timings,
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing the HTTP requests.
+
+    Stages timed while handling a request are reported in its Server-Timing header, along
+    with the time taken until the response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.paths = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = server_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timings(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    format_server_timing(
+                        timings + [("total", time.perf_counter() - started)]
+                    ),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            server_timings.reset(token)
+            path = self.route_path(scope)
+            http_requests.inc(scope["method"], path, str(status))
+            http_request_duration.observe(
+                time.perf_counter() - started, scope["method"], path
+            )
+
+    def route_path(self, scope) -> str:
+        """
+        Returns the request path if it is one of the routes of the app, "other" otherwise,
+        so that unknown paths do not each get their own series.
+
+        :rtype: str
+        """
+        if self.paths is None:
+            self.paths = {route.path for route in scope["app"].routes}
+        path = scope["path"]
+        return path if path in self.paths else "other"
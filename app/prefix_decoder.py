@@ -0,0 +1,196 @@
+import csv
+import datetime
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.config import prefix_decoder_min_samples, prefix_decoder_min_share
+from app.vin_validation import MODEL_YEAR_INDEX, MODEL_YEARS, decode_model_year
+from log.logger import logger
+from models.database_models import Vin, parse_model_year
+
+# The World Manufacturer Identifier (positions 1-3) and the Vehicle Descriptor Section
+# (positions 4-8) identify the make, model and body of a vehicle.
+PREFIX_LENGTH = 8
+
+# (Make, Model, Body Class)
+Vehicle = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class PrefixDecoder:
+    """
+    Decodes VINs locally from an index of the vehicles seen with the same WMI and VDS.
+
+    The index is learned from the vehicle details already cached and, optionally, from a
+    reference file. A VIN is decoded only when enough vehicles were seen for its prefix and
+    nearly all of them agree; the model year comes from position 10 of the VIN.
+    """
+
+    def __init__(self, min_samples: int, min_share: float):
+        self.min_samples = min_samples
+        self.min_share = min_share
+        self._vehicles: Dict[str, Counter] = {}
+        self._model_years: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, vin: str, vehicle_details: Dict[str, Any], count: int = 1):
+        """
+        Adds the vehicle details decoded for a VIN to the index.
+
+        :param vin: The VIN.
+        :type vin: str
+        :param vehicle_details: The vehicle details, as produced by build_response.
+        :type vehicle_details: Dict[str, Any]
+        :param count: The number of vehicles the details stand for.
+        :type count: int
+        """
+        vehicle = (
+            vehicle_details.get("Make"),
+            vehicle_details.get("Model"),
+            vehicle_details.get("Body Class"),
+        )
+        if not vehicle[0] or len(vin) < PREFIX_LENGTH:
+            return
+        prefix = vin[:PREFIX_LENGTH].upper()
+        model_year = parse_model_year(vehicle_details.get("Model Year"))
+        with self._lock:
+            self._vehicles.setdefault(prefix, Counter())[vehicle] += count
+            if model_year is not None:
+                self._model_years.setdefault(prefix, set()).add(model_year)
+
+    def decode(self, vin: str) -> Dict[str, Any]:
+        """
+        Decodes the VIN from the index, if its prefix is known with enough confidence.
+
+        :param vin: A valid VIN.
+        :type vin: str
+        :return: The vehicle details, in the shape produced by build_response, or an empty
+            dictionary if the VIN cannot be decoded locally.
+        :rtype: Dict[str, Any]
+        """
+        prefix = vin[:PREFIX_LENGTH].upper()
+        with self._lock:
+            vehicles = self._vehicles.get(prefix)
+            if not vehicles:
+                return {}
+            total = sum(vehicles.values())
+            (make, model, body_class), count = vehicles.most_common(1)[0]
+            model_years = set(self._model_years.get(prefix, ()))
+        if total < self.min_samples or count / total < self.min_share:
+            return {}
+
+        model_year = self.decode_model_year(vin, model_years)
+        return {
+            "Make": make,
+            "Model": model,
+            "Model Year": None if model_year is None else str(model_year),
+            "Body Class": body_class,
+            "Input VIN Requested": vin,
+        }
+
+    @staticmethod
+    def decode_model_year(vin: str, model_years: set) -> Optional[int]:
+        """
+        Decodes the model year, picking between the two 30 year cycles the code at
+        position 10 can stand for the one closest to the model years seen for the prefix.
+
+        :rtype: Optional[int]
+        """
+        model_year = MODEL_YEARS.get(vin[MODEL_YEAR_INDEX])
+        if model_year is None or not model_years:
+            return decode_model_year(vin)
+        latest_model_year = datetime.date.today().year + 1
+        candidates = [
+            year for year in (model_year, model_year + 30) if year <= latest_model_year
+        ]
+        return min(
+            candidates,
+            key=lambda year: min(abs(year - seen) for seen in model_years),
+        )
+
+    def load_database(self, database) -> int:
+        """
+        Learns the index from the vehicle details cached in the database.
+
+        :param database: The database holding the vins table.
+        :return: The number of rows learned from.
+        :rtype: int
+        """
+        statement = select(Vin.vin, Vin.make, Vin.model, Vin.body_class, Vin.model_year)
+        rows = 0
+        with database.get_engine().connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                statement
+            )
+            for vin, make, model, body_class, model_year in result:
+                self.observe(
+                    vin,
+                    {
+                        "Make": make,
+                        "Model": model,
+                        "Body Class": body_class,
+                        "Model Year": model_year,
+                    },
+                )
+                rows += 1
+        return rows
+
+    def load_reference(self, path: str) -> int:
+        """
+        Learns the index from a reference CSV file with the columns prefix (the first 8
+        characters of the VIN), make, model, body_class and, optionally, model_year and
+        count, the number of vehicles the row stands for.
+
+        :param path: The path of the CSV file.
+        :type path: str
+        :return: The number of rows learned from.
+        :rtype: int
+        """
+        rows = 0
+        with open(path, newline="") as reference_file:
+            for row in csv.DictReader(reference_file):
+                self.observe(
+                    row["prefix"],
+                    {
+                        "Make": row.get("make") or None,
+                        "Model": row.get("model") or None,
+                        "Body Class": row.get("body_class") or None,
+                        "Model Year": row.get("model_year") or None,
+                    },
+                    count=int(row.get("count") or 1),
+                )
+                rows += 1
+        return rows
+
+    def load(self, databases: List, reference_path: Optional[str] = None):
+        """
+        Learns the index from the databases, such as the shards of the cache, and, if
+        given, the reference file.
+        Failures are logged, and leave the decoder with whatever it learned so far.
+        """
+        try:
+            rows = sum(self.load_database(database) for database in databases)
+            if reference_path:
+                rows += self.load_reference(reference_path)
+            logger.info(f"Prefix decoder learned from {rows} vehicles.")
+        except Exception:
+            logger.exception("Encountered exception while loading the prefix decoder.")
+
+    def clear(self):
+        with self._lock:
+            self._vehicles.clear()
+            self._model_years.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of prefixes in the index.
+
+        :rtype: Dict[str, int]
+        """
+        with self._lock:
+            return {"prefixes": len(self._vehicles)}
+
+
+prefix_decoder = PrefixDecoder(prefix_decoder_min_samples, prefix_decoder_min_share)
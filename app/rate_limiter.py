@@ -0,0 +1,53 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Token bucket limiting calls to rate per second on average, with bursts of up to burst
+    calls at once.
+
+    Each caller reserves the next free slot before sleeping until it, so concurrent
+    callers are spread out evenly instead of all waking up at once.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        # When the bucket is refilled, i.e. the earliest time the next call may start once
+        # the burst is used up.
+        self._full_at = 0.0
+
+    async def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """
+        Waits until the caller may start its call. Returns at once if rate is None.
+
+        :param max_wait: Seconds the caller is willing to wait at most, None for no limit.
+        :type max_wait: Optional[float]
+        :return: True once the call may start, False at once if it would wait longer than
+            max_wait, in which case no slot is reserved.
+        :rtype: bool
+        """
+        if not self.rate:
+            return True
+        now = time.monotonic()
+        full_at = max(self._full_at, now)
+        delay = full_at - now - (self.burst - 1) / self.rate
+        if max_wait is not None and delay > max_wait:
+            return False
+        self._full_at = full_at + 1 / self.rate
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def retry_after(self) -> float:
+        """
+        Returns the seconds until a call may start without waiting.
+
+        :rtype: float
+        """
+        if not self.rate:
+            return 0.0
+        delay = self._full_at - time.monotonic() - (self.burst - 1) / self.rate
+        return max(delay, 0.0)
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from log.logger import logger
+
+
+class Refresher:
+    """
+    Runs refreshes in the background, at most one per key and max_concurrency at once.
+
+    Refreshes requested while max_concurrency of them are already running are skipped
+    rather than queued, so a burst of stale reads cannot pile up work; the next read of
+    a skipped key requests it again.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max_concurrency
+        self.started = 0
+        self.skipped = 0
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def schedule(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Starts function in the background for the given key, unless a refresh of that
+        key is already running or max_concurrency refreshes are.
+
+        :param key: The key identifying the refresh.
+        :type key: Hashable
+        :param function: A callable returning the awaitable to run.
+        :type function: Callable[[], Awaitable[Any]]
+        :return: True if a refresh of the key is running, False if it was skipped.
+        :rtype: bool
+        """
+        if key in self._tasks:
+            return True
+        if len(self._tasks) >= self.max_concurrency:
+            self.skipped += 1
+            return False
+        task = asyncio.ensure_future(function())
+        self._tasks[key] = task
+        task.add_done_callback(lambda task: self._finish(key, task))
+        self.started += 1
+        return True
+
+    async def close(self):
+        """
+        Waits for the refreshes in flight to finish.
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of refreshes started, skipped and in flight.
+
+        :rtype: Dict[str, int]
+        """
+        return {
+            "started": self.started,
+            "skipped": self.skipped,
+            "in_flight": len(self._tasks),
+        }
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        self._tasks.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                f"Encountered exception while refreshing {key}.",
+                exc_info=task.exception(),
+            )
@@ -0,0 +1,241 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from aiohttp import ClientError, ClientResponseError
+
+from app.rate_limiter import RateLimiter
+from metrics.metrics import upstream_rejections, upstream_retries
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+
+class UpstreamError(Exception):
+    """
+    Raised when a request to an upstream API failed, after any retries.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class UpstreamUnavailableError(UpstreamError):
+    """
+    Raised without sending the request, while the circuit is open or the rate limit is
+    used up.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops requests to an upstream API after failure_threshold consecutive failures.
+
+    The circuit then stays open for reset_timeout seconds, during which requests fail fast.
+    After that, a single request is let through: the circuit closes again if it succeeds,
+    and stays open for another reset_timeout seconds if it fails.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """
+        Tells whether a request may be sent now. A True answer while the circuit is half open
+        reserves the probe, which must be followed by record_success, record_failure or release.
+
+        :rtype: bool
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self):
+        """
+        Gives the probe back without an outcome, e.g. when the request was cancelled.
+        """
+        self._probing = False
+
+    def retry_after(self) -> float:
+        """
+        Returns the seconds until the circuit lets a request through again.
+
+        :rtype: float
+        """
+        if self.state != OPEN:
+            return 0.0
+        return max(self._opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+
+def is_retryable(exception: Exception) -> bool:
+    """
+    Tells whether a failed request may succeed when sent again: timeouts, connection errors,
+    429 Too Many Requests and 5xx responses.
+
+    :rtype: bool
+    """
+    if isinstance(exception, ClientResponseError):
+        return exception.status == 429 or exception.status >= 500
+    return isinstance(exception, (ClientError, asyncio.TimeoutError))
+
+
+def parse_retry_after(exception: Exception) -> Optional[float]:
+    """
+    Returns the delay the Retry-After header of a 429 Too Many Requests response asks for,
+    given in seconds or as an HTTP date.
+
+    :return: The delay in seconds, or None if the response has no valid Retry-After header.
+    :rtype: Optional[float]
+    """
+    if not isinstance(exception, ClientResponseError) or exception.status != 429:
+        return None
+    retry_after = (exception.headers or {}).get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class UpstreamPolicy:
+    """
+    Sends requests to an upstream API through a circuit breaker and a rate limiter, and
+    retries the ones that failed with a retryable error after a backoff with full jitter, or
+    after the delay the Retry-After header of a 429 response asks for, up to backoff_max.
+
+    The timeouts of each attempt are the ones of the client session.
+    """
+
+    def __init__(
+        self,
+        circuit_breaker: CircuitBreaker,
+        rate_limiter: RateLimiter,
+        max_retries: int,
+        backoff: float,
+        backoff_max: float,
+        rate_limit_max_wait: Optional[float] = None,
+    ):
+        self.circuit_breaker = circuit_breaker
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.rate_limit_max_wait = rate_limit_max_wait
+
+    async def call(self, endpoint: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs attempt until it succeeds, fails with an error that is not retryable, or
+        max_retries retries have failed.
+
+        :param endpoint: The name of the endpoint, for the metrics.
+        :type endpoint: str
+        :param attempt: A callable returning the awaitable sending the request once.
+        :type attempt: Callable[[], Awaitable[T]]
+        :return: The result of the successful attempt.
+        :rtype: T
+        :raises UpstreamUnavailableError: If the circuit is open or the rate limit is used up.
+        :raises UpstreamError: If the request failed.
+        """
+        for retry in range(self.max_retries + 1):
+            await self.admit(endpoint)
+            try:
+                result = await attempt()
+            except Exception as e:
+                status = e.status if isinstance(e, ClientResponseError) else None
+                if not is_retryable(e):
+                    # The API answered, so it is up.
+                    self.circuit_breaker.record_success()
+                    raise UpstreamError(str(e), status) from e
+                self.circuit_breaker.record_failure()
+                if retry == self.max_retries:
+                    raise UpstreamError(str(e), status) from e
+                upstream_retries.inc(endpoint)
+                await asyncio.sleep(self.retry_delay(retry, e))
+            except BaseException:
+                self.circuit_breaker.release()
+                raise
+            else:
+                self.circuit_breaker.record_success()
+                return result
+
+    async def admit(self, endpoint: str):
+        """
+        Waits until a request may be sent.
+
+        :raises UpstreamUnavailableError: If the circuit is open or the rate limit is used up.
+        """
+        if not self.circuit_breaker.allow():
+            upstream_rejections.inc(endpoint, "circuit_open")
+            raise UpstreamUnavailableError(
+                "The circuit to the upstream API is open.",
+                retry_after=self.circuit_breaker.retry_after(),
+            )
+        try:
+            acquired = await self.rate_limiter.acquire(
+                max_wait=self.rate_limit_max_wait
+            )
+        except BaseException:
+            self.circuit_breaker.release()
+            raise
+        if not acquired:
+            self.circuit_breaker.release()
+            upstream_rejections.inc(endpoint, "rate_limited")
+            raise UpstreamUnavailableError(
+                "The rate limit of the upstream API is used up.",
+                retry_after=self.rate_limiter.retry_after(),
+            )
+
+    def retry_delay(self, retry: int, exception: Exception) -> float:
+        retry_after = parse_retry_after(exception)
+        if retry_after is None:
+            return self.backoff_delay(retry)
+        return min(retry_after, self.backoff_max)
+
+    def backoff_delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.backoff * 2**retry, self.backoff_max))
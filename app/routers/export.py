@@ -1,74 +1,441 @@
+import io
+import json
 import os
-import pandas as pd
+import tempfile
+import threading
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.parquet as pq
 from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import DateTime, text
 
-from app.config import vin_parquet_name, vin_table_name, vin_parquet_path
-from database.connection import Database
+from app.config import (
+    cache_metadata_table_name,
+    export_compression,
+    export_compression_level,
+    export_row_group_size,
+    export_snapshot_max_parts,
+    vin_parquet_name,
+    vin_snapshot_path,
+    vin_table_name,
+)
+from caching.factory import cache_databases
+from caching.sqlite_cache import REWRITE_VERSION, VERSION
 from log.logger import logger
+from metrics.metrics import export_snapshot_duration, timed
 
 router = APIRouter()
 
+vin_parquet_schema = pa.schema(
+    [
+        ("vin", pa.string()),
+        ("make", pa.string()),
+        ("model", pa.string()),
+        ("model_year", pa.int16()),
+        ("body_class", pa.dictionary(pa.int32(), pa.string())),
+        ("cached_at", pa.timestamp("us", tz="UTC")),
+    ]
+)
+# Snapshots written with another schema, codec or number of shards are rebuilt rather than
+# extended.
+snapshot_format = (
+    f"{vin_parquet_schema}|{export_compression}|{export_compression_level}"
+    f"|{len(cache_databases)}"
+)
+manifest_name = "manifest.json"
+snapshot_lock = threading.Lock()
+
 
 @router.get("/export")
-def export_cache() -> Response:
+def export_cache(request: Request) -> Response:
     """
     Exports the cache as a parquet file with the name vin_parquet_name defined in config.py.
+    The shards of a sharded cache are merged into the one file.
+
+    The file is served from a snapshot on disk that is only rebuilt, or extended with the rows
+    added since, when the cache has changed. The cache version is sent as the ETag, and a
+    matching If-None-Match header is answered with 304 Not Modified.
 
-    :return: The HTTP response containing the exported Parquet file.
+    :param Request request: The FastAPI request object.
+    :return: The HTTP response streaming the exported Parquet file.
     :rtype: Response
+    :raises HTTPException 501: If the cache backend is not stored in SQLite.
     """
+    if not cache_databases:
+        raise HTTPException(
+            status_code=501,
+            detail="The cache backend is not stored in SQLite and cannot be exported.",
+        )
     try:
-        convert_database_to_parquet()
+        with timed("export_state"):
+            database_state = read_database_state()
+        etag = f'"{database_state[VERSION]}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        with timed("export_snapshot"):
+            manifest = refresh_snapshot(database_state)
+        try:
+            part_files = open_snapshot(manifest)
+        except FileNotFoundError:
+            # Another process replaced the snapshot in the meantime.
+            manifest = refresh_snapshot(database_state, rebuild=True)
+            part_files = open_snapshot(manifest)
     except DatabaseToParquetError as e:
         logger.exception(
             "Encountered exception while converting database to parquet file."
         )
         raise HTTPException(detail=str(e), status_code=500)
+
+    headers = {
+        "Content-Disposition": f"attachment; filename={vin_parquet_name}",
+        "ETag": f'"{manifest[VERSION]}"',
+    }
+    return StreamingResponse(
+        content=generate_snapshot_chunks(part_files),
+        media_type="application/octet-stream",
+        headers=headers,
+    )
+
+
+def read_database_state() -> Dict[str, Any]:
+    """
+    Reads the cache change counters and the highest rowid of the vins table of every
+    database, each in one transaction. The counters are summed over the databases, so they
+    change whenever one of them changes.
+
+    :return: The VERSION and REWRITE_VERSION counters, and the highest rowid of each
+        database as "max_rowids".
+    :rtype: Dict[str, Any]
+    :raises DatabaseToParquetError: If a database cannot be read.
+    """
+    database_state = {VERSION: 0, REWRITE_VERSION: 0, "max_rowids": []}
     try:
-        file_chunks = generate_file_chunks(vin_parquet_path)
-    except FileNotFoundError:
-        logger.exception("Database parquet file has not been found.")
-        raise HTTPException(
-            detail="Database parquet file has not been found.", status_code=404
+        for database in cache_databases:
+            with database.get_engine().connect() as connection, connection.begin():
+                counters = connection.execute(
+                    text(f"SELECT name, value FROM {cache_metadata_table_name}")
+                )
+                for name, value in counters.all():
+                    database_state[name] = database_state.get(name, 0) + value
+                database_state["max_rowids"].append(
+                    connection.execute(
+                        text(f"SELECT COALESCE(MAX(rowid), 0) FROM {vin_table_name}")
+                    ).scalar()
+                )
+    except Exception:
+        raise DatabaseToParquetError(
+            "Encountered exception while converting database to parquet file."
         )
+    return database_state
 
-    content = b"".join(file_chunks)
 
-    headers = {
-        "Content-Type": "application/octet-stream",
-        "Content-Disposition": f"attachment; filename={vin_parquet_name}",
+def refresh_snapshot(
+    database_state: Dict[str, Any], rebuild: bool = False
+) -> Dict[str, Any]:
+    """
+    Brings the parquet snapshot up to date with the given database state.
+
+    The snapshot is left alone when its version matches. When only rows were added since it
+    was taken, the rows added to any database are written as an extra part. Otherwise, or
+    once there are export_snapshot_max_parts parts, the snapshot is rebuilt from the whole
+    table.
+
+    :param database_state: The state returned by read_database_state.
+    :type database_state: Dict[str, Any]
+    :param rebuild: Rebuild the snapshot even if it is up to date.
+    :type rebuild: bool
+    :return: The manifest of the refreshed snapshot.
+    :rtype: Dict[str, Any]
+    :raises DatabaseToParquetError: If an error occurs during the conversion process.
+    """
+    with snapshot_lock:
+        manifest = read_manifest()
+        if (
+            manifest is not None
+            and manifest.get("format") == snapshot_format
+            and not rebuild
+        ):
+            if manifest[VERSION] == database_state[VERSION]:
+                return manifest
+            if (
+                manifest[REWRITE_VERSION] == database_state[REWRITE_VERSION]
+                and len(manifest["parts"]) < export_snapshot_max_parts
+            ):
+                parts = list(manifest["parts"])
+                if database_state["max_rowids"] != manifest["max_rowids"]:
+                    with timed(
+                        "snapshot_append", export_snapshot_duration, ("append",)
+                    ):
+                        parts.append(
+                            write_snapshot_part(
+                                database_state, after_rowids=manifest["max_rowids"]
+                            )
+                        )
+                return write_manifest(database_state, parts)
+
+        logger.info("Rebuilding the parquet snapshot of the cache.")
+        with timed("snapshot_rebuild", export_snapshot_duration, ("rebuild",)):
+            parts = [
+                write_snapshot_part(
+                    database_state, after_rowids=[0] * len(cache_databases)
+                )
+            ]
+        new_manifest = write_manifest(database_state, parts)
+        for part in (manifest or {}).get("parts", []):
+            if part not in parts:
+                remove_snapshot_file(part)
+        return new_manifest
+
+
+def write_snapshot_part(
+    database_state: Dict[str, Any], after_rowids: Sequence[int]
+) -> str:
+    """
+    Writes the rows of each database with a rowid in (after_rowid, max_rowid] to a new
+    snapshot part.
+
+    :return: The file name of the part, relative to vin_snapshot_path.
+    :rtype: str
+    :raises DatabaseToParquetError: If an error occurs during the conversion process.
+    """
+    part = f"part-{database_state[VERSION]:012d}-{sum(after_rowids):012d}.parquet"
+    temporary_path = None
+    try:
+        os.makedirs(vin_snapshot_path, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=vin_snapshot_path)
+        with os.fdopen(file_descriptor, "wb") as part_file:
+            for chunk in generate_parquet_chunks(
+                after_rowids=after_rowids, until_rowids=database_state["max_rowids"]
+            ):
+                part_file.write(chunk)
+        os.replace(temporary_path, os.path.join(vin_snapshot_path, part))
+    except Exception as e:
+        if temporary_path is not None:
+            remove_snapshot_file(os.path.basename(temporary_path))
+        if isinstance(e, DatabaseToParquetError):
+            raise
+        raise DatabaseToParquetError(
+            "Encountered exception while converting database to parquet file."
+        )
+    return part
+
+
+def read_manifest() -> Optional[Dict[str, Any]]:
+    """
+    Reads the manifest of the snapshot, if there is one.
+
+    :rtype: Optional[Dict[str, Any]]
+    """
+    try:
+        with open(os.path.join(vin_snapshot_path, manifest_name)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(database_state: Dict[str, Any], parts: List[str]) -> Dict[str, Any]:
+    """
+    Atomically replaces the manifest of the snapshot.
+
+    :rtype: Dict[str, Any]
+    """
+    manifest = {
+        "format": snapshot_format,
+        VERSION: database_state[VERSION],
+        REWRITE_VERSION: database_state[REWRITE_VERSION],
+        "max_rowids": database_state["max_rowids"],
+        "parts": parts,
     }
-    return Response(content=content, headers=headers)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=vin_snapshot_path)
+    with os.fdopen(file_descriptor, "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temporary_path, os.path.join(vin_snapshot_path, manifest_name))
+    return manifest
 
 
-def generate_file_chunks(file_path, chunk_size=4096):
-    with open(file_path, "rb") as file:
-        while True:
-            chunk = file.read(chunk_size)
-            if not chunk:
-                break
-            yield chunk
+def remove_snapshot_file(name: str):
+    try:
+        os.remove(os.path.join(vin_snapshot_path, name))
+    except FileNotFoundError:
+        pass
 
 
-def convert_database_to_parquet() -> None:
+def open_snapshot(manifest: Dict[str, Any]) -> List[BinaryIO]:
     """
-    Converts the database file into a parquet file.
+    Opens every part of the snapshot, so that it can still be streamed if it is replaced.
 
-    :raises Exception: If an error occurs during the conversion process.
+    :raises FileNotFoundError: If a part no longer exists.
+    :rtype: List[BinaryIO]
+    """
+    part_files = []
+    try:
+        for part in manifest["parts"]:
+            part_files.append(open(os.path.join(vin_snapshot_path, part), "rb"))
+    except FileNotFoundError:
+        for part_file in part_files:
+            part_file.close()
+        raise
+    return part_files
 
-    :rtype: None
+
+def generate_snapshot_chunks(part_files: List[BinaryIO]) -> Iterator[bytes]:
     """
-    database_engine = Database.get_engine()
-    select_query = f"SELECT * FROM {vin_table_name}"
+    Yields the snapshot as a single parquet file. A single part is streamed as is, several
+    parts are merged one row group at a time.
 
+    :param part_files: The open part files, closed once they have been read.
+    :type part_files: List[BinaryIO]
+    :rtype: Iterator[bytes]
+    """
     try:
-        vin_df = pd.read_sql_query(select_query, database_engine)
-        vin_df.to_parquet(vin_parquet_path)
+        if len(part_files) == 1:
+            yield from generate_file_chunks(part_files[0], chunk_size=65536)
+            return
+        sink = ParquetChunkSink()
+        with create_parquet_writer(sink) as writer:
+            for part_file in part_files:
+                parquet_file = pq.ParquetFile(part_file)
+                for index in range(parquet_file.num_row_groups):
+                    writer.write_table(
+                        parquet_file.read_row_group(index, use_threads=False)
+                    )
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+        yield sink.drain()
+    finally:
+        for part_file in part_files:
+            part_file.close()
+
+
+def generate_file_chunks(file, chunk_size=4096):
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def generate_parquet_chunks(
+    after_rowids: Optional[Sequence[int]] = None,
+    until_rowids: Optional[Sequence[Optional[int]]] = None,
+    batch_size: int = export_row_group_size,
+) -> Iterator[bytes]:
+    """
+    Reads the rows of each database with a rowid in (after_rowid, until_rowid] in batches of
+    batch_size rows and yields the bytes of a single parquet file as it is written, one row
+    group per batch. The databases are read one after the other. At least one chunk is
+    always yielded.
+
+    :param after_rowids: Per database, only rows with a greater rowid are read. Defaults to
+        every row.
+    :type after_rowids: Optional[Sequence[int]]
+    :param until_rowids: Per database, only rows with a lower or equal rowid are read, if
+        not None.
+    :type until_rowids: Optional[Sequence[Optional[int]]]
+    :param batch_size: The number of rows read from the database per row group.
+    :type batch_size: int
+    :raises DatabaseToParquetError: If an error occurs during the conversion process.
+    :rtype: Iterator[bytes]
+    """
+    after_rowids = after_rowids or [0] * len(cache_databases)
+    until_rowids = until_rowids or [None] * len(cache_databases)
+    sink = ParquetChunkSink()
+    try:
+        with create_parquet_writer(sink) as writer:
+            for database, after_rowid, until_rowid in zip(
+                cache_databases, after_rowids, until_rowids
+            ):
+                for rows in read_export_rows(
+                    database, after_rowid, until_rowid, batch_size
+                ):
+                    writer.write_table(build_export_table(rows))
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
     except Exception:
         raise DatabaseToParquetError(
             "Encountered exception while converting database to parquet file."
         )
+    yield sink.drain()
+
+
+def read_export_rows(
+    database, after_rowid: int, until_rowid: Optional[int], batch_size: int
+) -> Iterator[List]:
+    """
+    Reads the rows of the database with a rowid in (after_rowid, until_rowid], in rowid
+    order, batch_size rows at a time.
+
+    :rtype: Iterator[List]
+    """
+    select_query = (
+        f"SELECT vin, make, model, model_year, body_class, fetched_at FROM {vin_table_name}"
+        " WHERE rowid > :after_rowid"
+    )
+    if until_rowid is not None:
+        select_query += " AND rowid <= :until_rowid"
+    select_query = text(select_query + " ORDER BY rowid").columns(fetched_at=DateTime)
+    with database.get_engine().connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(
+            select_query, {"after_rowid": after_rowid, "until_rowid": until_rowid}
+        )
+        yield from result.partitions(batch_size)
+
+
+def create_parquet_writer(sink: BinaryIO) -> pq.ParquetWriter:
+    return pq.ParquetWriter(
+        sink,
+        vin_parquet_schema,
+        compression=export_compression,
+        compression_level=export_compression_level,
+    )
+
+
+def build_export_table(rows) -> pa.Table:
+    """
+    Converts rows of the export query into a table with the typed columns of vin_parquet_schema.
+
+    :rtype: pa.Table
+    """
+    columns = dict(zip(vin_parquet_schema.names, zip(*rows)))
+    columns["body_class"] = pa.array(
+        columns["body_class"], pa.string()
+    ).dictionary_encode()
+    return pa.table(columns, schema=vin_parquet_schema)
+
+
+class ParquetChunkSink(io.RawIOBase):
+    """
+    Write-only file object that buffers what the parquet writer writes until it is drained.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        """
+        Returns everything written since the last drain.
+
+        :rtype: bytes
+        """
+        chunk = b"".join(self._chunks)
+        self._chunks.clear()
+        return chunk
 
 
 class DatabaseToParquetError(Exception):
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import tempfile
+from typing import Dict
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.config import import_on_conflict
+from app.importer import ParquetToDatabaseError, import_parquet
+from caching.factory import cache, cache_databases, negative_cache
+from caching.sqlite_cache import SKIP
+from log.logger import logger
+
+router = APIRouter()
+
+import_lock = asyncio.Lock()
+
+
+@router.post("/import")
+async def import_cache(
+    request: Request, on_conflict: str = import_on_conflict
+) -> Dict[str, int]:
+    """
+    Imports a parquet file sent as the request body, such as the /export output, into the cache.
+
+    The body is streamed to a temporary file, which is then read and written to the database in
+    batches off the event loop. Only one import runs at a time.
+
+    :param Request request: The FastAPI request object.
+    :param str on_conflict: What to do with rows whose VIN is already cached: "replace", "skip"
+        or "newer".
+    :return: The number of rows read, written (inserted or updated) and invalid.
+    :rtype: dict
+    :raises HTTPException 400: If the body is not a parquet file with a vin column, or the
+        conflict policy is unknown.
+    :raises HTTPException 409: If an import is already running.
+    :raises HTTPException 500: If the database cannot be written.
+    :raises HTTPException 501: If the cache backend is not stored in SQLite.
+    """
+    if not cache_databases:
+        raise HTTPException(
+            status_code=501,
+            detail="The cache backend is not stored in SQLite and cannot be imported into.",
+        )
+    if import_lock.locked():
+        raise HTTPException(status_code=409, detail="An import is already running.")
+    async with import_lock:
+        loop = asyncio.get_running_loop()
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix=".parquet")
+        try:
+            with os.fdopen(file_descriptor, "wb") as temporary_file:
+                async for chunk in request.stream():
+                    await loop.run_in_executor(None, temporary_file.write, chunk)
+            counts = await loop.run_in_executor(
+                None,
+                lambda: import_parquet(
+                    temporary_path,
+                    cache_databases,
+                    on_conflict=on_conflict,
+                    negative_cache=negative_cache,
+                ),
+            )
+        except ParquetToDatabaseError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception:
+            logger.exception("Encountered exception while importing parquet file.")
+            raise HTTPException(
+                status_code=500, detail="Encountered exception while importing."
+            )
+        finally:
+            os.remove(temporary_path)
+            if on_conflict != SKIP:
+                # Replaced rows may still be held in memory. Rows committed before a
+                # failed transaction count too.
+                cache.clear()
+    return counts
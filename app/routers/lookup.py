@@ -1,88 +1,508 @@
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+
 import requests
 from requests.exceptions import RequestException
 
-import aiohttp
-from aiohttp import ClientError, ClientResponseError
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import Response
-from typing import Any, Dict, List
+from aiohttp import ClientResponseError
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.utils import build_response
-from caching.sqlite_cache import cache
-from app.config import vin_parquet_name, vin_table_name, vin_parquet_path, vpic_api_url
+from app.http_session import HttpSession
+from app.prefix_decoder import prefix_decoder
+from app.rate_limiter import RateLimiter
+from app.refresher import Refresher
+from app.resilience import (
+    CircuitBreaker,
+    UpstreamError,
+    UpstreamPolicy,
+    UpstreamUnavailableError,
+)
+from app.single_flight import SingleFlight
+from app.utils import build_batch_response, build_response
+from app.vin_validation import validate_vin, validate_vins
+from caching.factory import cache, negative_cache
+from app.config import (
+    vin_parquet_name,
+    vin_table_name,
+    vin_parquet_path,
+    prefix_decoder_enabled,
+    lookup_raw_cache_hits,
+    vpic_api_url,
+    vpic_batch_api_url,
+    vpic_batch_concurrency,
+    vpic_batch_size,
+    vpic_circuit_failure_threshold,
+    vpic_circuit_reset_timeout,
+    vpic_max_retries,
+    vpic_rate_limit,
+    vpic_rate_limit_burst,
+    vpic_rate_limit_max_wait,
+    vpic_retry_backoff,
+    vpic_retry_backoff_max,
+    vehicle_details_refresh_concurrency,
+    vehicle_details_ttl,
+    vin_strict_validation,
+)
 from log.logger import logger
+from metrics.metrics import (
+    add_server_timing,
+    cache_lookups,
+    cache_refreshes,
+    negative_cache_hits,
+    negative_cache_stores,
+    prefix_decoder_lookups,
+    server_timings,
+    stale_cache_hits,
+    timed,
+    upstream_request_duration,
+    upstream_requests_in_flight,
+)
+from models.parsing_models import BatchLookupRequest
 
 
 router = APIRouter()
+upstream_flights = SingleFlight()
+stale_refreshes = Refresher(vehicle_details_refresh_concurrency)
+vpic_upstream = UpstreamPolicy(
+    CircuitBreaker(vpic_circuit_failure_threshold, vpic_circuit_reset_timeout),
+    RateLimiter(vpic_rate_limit, vpic_rate_limit_burst),
+    max_retries=vpic_max_retries,
+    backoff=vpic_retry_backoff,
+    backoff_max=vpic_retry_backoff_max,
+    rate_limit_max_wait=vpic_rate_limit_max_wait,
+)
+# Replaces the closing brace of a cached JSON body, as a raw cache hit response.
+CACHE_HIT_FIELDS = b',"Cached Result?":true,"Source":"cache"}'
 
 
 @router.get("/lookup")
 async def lookup_vehicle_details(request: Request) -> Dict[str, Any]:
     """
     Checks the cache for the given vin to see if the vehicle details are present.
-    If they aren't present, the vPIC API is queried to obtain the vehicle details and the result is cached.
+    If they aren't present, the vehicle details are decoded locally by the prefix decoder when it is
+    confident enough, and otherwise the vPIC API is queried and the result is cached.
+    VINs the API recently returned no vehicle details for are answered from the negative cache.
+    Cached vehicle details older than vehicle_details_ttl are served as they are, while they are
+    refreshed from the API in the background.
+    The "Source" field of the response tells which of "cache", "prefix_decoder" or "vpic" served it.
+    With lookup_raw_cache_hits, cache hits are sent as the JSON body kept by the in-memory tier,
+    with the "Cached Result?" and "Source" fields spliced in, without encoding them again.
 
     :param Request request: The FastAPI request object.
     :return: A dictionary containing the vehicle details.
     :rtype: dict
-    :raises HTTPException 400: If the VIN is not a 17-character alphanumeric string.
+    :raises HTTPException 400: If the VIN is structurally invalid.
+    :raises HTTPException 404: If the API returns, or recently returned, no vehicle details.
+    :raises HTTPException 502: If the request to the API failed.
+    :raises HTTPException 503: If the API is not queried, as its circuit is open or its rate
+        limit is used up.
     """
 
     vin = request.query_params.get("vin", "")
-    if not len(vin) == 17 or not vin.isalnum():
+    with timed("validate"):
+        error = validate_vin(vin, strict=vin_strict_validation)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    if lookup_raw_cache_hits:
+        with timed("cache_get"):
+            body, fetched_at = await cache.aget_encoded_entry(vin)
+        if body is not None:
+            record_cache_hit(vin, fetched_at)
+            return Response(
+                content=body[:-1] + CACHE_HIT_FIELDS, media_type="application/json"
+            )
+    else:
+        with timed("cache_get"):
+            vehicle_details, fetched_at = await cache.aget_entry(vin)
+        if vehicle_details:
+            record_cache_hit(vin, fetched_at)
+            return annotate(vehicle_details, "cache")
+
+    cache_lookups.inc("miss")
+    with timed("negative_cache_get"):
+        negative_entry = await negative_cache.aget(vin)
+    if negative_entry:
+        negative_cache_hits.inc()
         raise HTTPException(
-            status_code=400,
-            detail="VIN should be a 17 characters alpha-numeric string.",
+            status_code=404,
+            detail=f"The API returned no valid values for the inputted vin: {vin}",
         )
 
-    vehicle_details = cache.get(vin)
-    if vehicle_details:
-        vehicle_details["Cached Result?"] = True
-        return vehicle_details
+    if prefix_decoder_enabled:
+        with timed("prefix_decode"):
+            vehicle_details = prefix_decoder.decode(vin)
+        if vehicle_details:
+            prefix_decoder_lookups.inc("decoded")
+            return annotate(vehicle_details, "prefix_decoder")
+        prefix_decoder_lookups.inc("fallback")
 
     logger.debug(
         f"No vehicle details present in the cache for {vin}. Querying the vPIC API."
     )
-    vehicle_object = await make_request(vin)
-    vehicle_details = build_response(vehicle_object, vin)
+    try:
+        with timed("upstream"):
+            vehicle_details = await upstream_flights.do(
+                vin, lambda: fetch_and_cache(vin)
+            )
+    except UpstreamUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The vPIC API is unavailable, try again later.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    except UpstreamError:
+        raise HTTPException(status_code=502, detail="The vPIC API request failed.")
 
     if not vehicle_details:
         raise HTTPException(
             status_code=404,
             detail=f"The API returned no valid values for the inputted vin: {vin}",
         )
-    cache.set(vin, vehicle_details)
-    vehicle_details["Cached Result?"] = False
+    return annotate(vehicle_details, "vpic")
 
-    return vehicle_details
 
+@router.post("/lookup/batch")
+async def lookup_vehicle_details_batch(
+    batch_request: BatchLookupRequest,
+) -> Dict[str, Any]:
+    """
+    Looks up the vehicle details for several VINs at once, the way /lookup does for one.
+    VINs present in the cache are fetched with a single query, and the stale ones are refreshed
+    in the background. VINs in the negative cache are reported as undecodable. The remaining
+    ones are decoded locally by the prefix decoder when it is confident enough, and otherwise
+    through the vPIC batch API, whose vehicle details are cached in a single transaction and
+    whose undecodable VINs are added to the negative cache. VINs whose batch request failed are
+    reported as not decoded because the API is unavailable.
 
-async def make_request(vin: str) -> Dict[str, Any]:
+    :param BatchLookupRequest batch_request: The request body containing the VINs.
+    :return: A dictionary with one result per distinct VIN, in the order they were requested,
+        each with the "Cached Result?" and "Source" fields of /lookup.
+    :rtype: dict
+    :raises HTTPException: 503 if every batch request failed and no VIN was answered otherwise.
     """
-    Makes an HTTP GET request to the vPIC API with the given VIN (Vehicle Identification Number).
+    vins = list(dict.fromkeys(batch_request.vins))
+    with timed("validate"):
+        errors = dict(zip(vins, validate_vins(vins, strict=vin_strict_validation)))
+    valid_vins = [vin for vin in vins if errors[vin] is None]
+
+    with timed("cache_get"):
+        cached_entries = await cache.aget_many_entries(valid_vins)
+    answered = {}
+    for vin, (vehicle_details, fetched_at) in cached_entries.items():
+        record_cache_hit(vin, fetched_at)
+        answered[vin] = annotate(vehicle_details, "cache")
+    missing_vins = [vin for vin in valid_vins if vin not in answered]
+    cache_lookups.inc("miss", amount=len(missing_vins))
+    if missing_vins:
+        with timed("negative_cache_get"):
+            negative_entries = await negative_cache.aget_many(missing_vins)
+        negative_cache_hits.inc(amount=len(negative_entries))
+        missing_vins = [vin for vin in missing_vins if vin not in negative_entries]
+
+    if prefix_decoder_enabled and missing_vins:
+        with timed("prefix_decode"):
+            for vin in missing_vins:
+                vehicle_details = prefix_decoder.decode(vin)
+                if vehicle_details:
+                    answered[vin] = annotate(vehicle_details, "prefix_decoder")
+        decoded = sum(vin in answered for vin in missing_vins)
+        prefix_decoder_lookups.inc("decoded", amount=decoded)
+        prefix_decoder_lookups.inc("fallback", amount=len(missing_vins) - decoded)
+        missing_vins = [vin for vin in missing_vins if vin not in answered]
+
+    failed_vins = set()
+    if missing_vins:
+        logger.debug(
+            f"No vehicle details present in the cache for {len(missing_vins)} vins. Querying the vPIC API."
+        )
+        with timed("upstream"):
+            batch_results, failed_vins = await make_batch_request(missing_vins)
+        failed_vins = set(failed_vins)
+        if len(failed_vins) == len(missing_vins) and not answered:
+            raise HTTPException(
+                status_code=503, detail="The vPIC API is unavailable, try again later."
+            )
+        with timed("build_response"):
+            fetched_details = {
+                vin: build_batch_response(batch_results.get(vin), vin)
+                for vin in missing_vins
+                if vin not in failed_vins
+            }
+        await store_fetched(fetched_details)
+        for vin, vehicle_details in fetched_details.items():
+            if vehicle_details:
+                answered[vin] = annotate(vehicle_details, "vpic")
+
+    results = []
+    for vin in vins:
+        if vin in answered:
+            vehicle_details = answered[vin]
+        elif vin in failed_vins:
+            vehicle_details = {
+                "Input VIN Requested": vin,
+                "Error": "The vPIC API is unavailable, try again later.",
+            }
+        elif errors[vin] is None:
+            vehicle_details = {
+                "Input VIN Requested": vin,
+                "Error": f"The API returned no valid values for the inputted vin: {vin}",
+            }
+        else:
+            vehicle_details = {"Input VIN Requested": vin, "Error": errors[vin]}
+        results.append(vehicle_details)
+
+    return {"Results": results}
+
+
+async def fetch_and_cache(vin: str) -> Dict[str, Any]:
+    """
+    Queries the vPIC API for the given vin and caches the vehicle details. If the API returned
+    none, the vin is recorded in the negative cache instead. Concurrent lookups for the same vin share a single call through upstream_flights.
 
     :param vin: The VIN (Vehicle Identification Number) for the vehicle.
     :type vin: str
-    :return: The response from the vPIC API as a dictionary.
+    :return: The vehicle details, or an empty dictionary if the API returned none.
     :rtype: Dict[str, Any]
-    :raises ClientResponseError: If an error occurs during the request.
-    :raises ClientError: If an error occurs during the request.
-    :raises Exception: If an exception occurs during the request.
+    :raises UpstreamError: If the request to the API failed.
     """
-    url = vpic_api_url.format(vin)
+    vehicle_object = await make_request(vin)
+    with timed("build_response"):
+        vehicle_details = build_response(vehicle_object, vin)
+    await store_fetched({vin: vehicle_details})
+    return vehicle_details
+
+
+async def store_fetched(fetched_details: Dict[str, Dict[str, Any]]):
+    """
+    Caches the vehicle details the vPIC API returned, and records the VINs it returned none
+    for in the negative cache.
+
+    :param fetched_details: The vehicle details built from the API response, empty for the
+        VINs the API returned none for, keyed by VIN.
+    :type fetched_details: Dict[str, Dict[str, Any]]
+    """
+    decoded = {vin: details for vin, details in fetched_details.items() if details}
+    undecodable = [vin for vin, details in fetched_details.items() if not details]
+    if decoded:
+        with timed("cache_set"):
+            await cache.aset_many(decoded)
+        for vin, vehicle_details in decoded.items():
+            prefix_decoder.observe(vin, vehicle_details)
+    if undecodable:
+        with timed("negative_cache_set"):
+            await negative_cache.aset_many(
+                dict.fromkeys(undecodable, datetime.utcnow())
+            )
+        negative_cache_stores.inc(amount=len(undecodable))
+
+
+def annotate(vehicle_details: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """
+    Returns a copy of the vehicle details with the "Cached Result?" and "Source" fields of a
+    lookup result.
+
+    :param vehicle_details: The vehicle details.
+    :type vehicle_details: Dict[str, Any]
+    :param source: What served them, one of "cache", "prefix_decoder" or "vpic".
+    :type source: str
+    :rtype: Dict[str, Any]
+    """
+    return dict(
+        vehicle_details, **{"Cached Result?": source == "cache", "Source": source}
+    )
+
+
+def record_cache_hit(vin: str, fetched_at: Optional[datetime]):
+    """
+    Counts a cache hit, and schedules a refresh of the vehicle details if they are stale.
+
+    :param vin: The VIN (Vehicle Identification Number) for the vehicle.
+    :type vin: str
+    :param fetched_at: When the cached vehicle details were fetched, None if unknown.
+    :type fetched_at: Optional[datetime]
+    """
+    cache_lookups.inc("hit")
+    if is_stale(fetched_at):
+        stale_cache_hits.inc()
+        stale_refreshes.schedule(vin, lambda: refresh_cached(vin))
+
+
+async def refresh_cached(vin: str):
+    """
+    Replaces the cached vehicle details for the given vin with the ones the vPIC API returns
+    now. If the API returns none, or the request fails, the cached vehicle details are kept.
+
+    :param vin: The VIN (Vehicle Identification Number) for the vehicle.
+    :type vin: str
+    """
+    # Runs after the response of the lookup that scheduled it, so it reports no timings.
+    server_timings.set(None)
     try:
-        async with aiohttp.ClientSession() as session:
+        vehicle_details = build_response(await make_request(vin), vin)
+    except UpstreamError:
+        vehicle_details = {}
+    if not vehicle_details:
+        cache_refreshes.inc("failed")
+        return
+    await cache.aset(vin, vehicle_details)
+    cache_refreshes.inc("refreshed")
+
+
+def is_stale(
+    fetched_at: Optional[datetime], ttl: Optional[float] = vehicle_details_ttl
+) -> bool:
+    """
+    Tells whether vehicle details fetched at the given time should be refreshed.
+
+    :param fetched_at: When the vehicle details were fetched, None if unknown.
+    :type fetched_at: Optional[datetime]
+    :param ttl: Seconds the vehicle details stay fresh, None if they never go stale.
+    :type ttl: Optional[float]
+    :return: True if the vehicle details are older than the ttl or of unknown age.
+    :rtype: bool
+    """
+    if ttl is None:
+        return False
+    if fetched_at is None:
+        return True
+    return datetime.utcnow() - fetched_at > timedelta(seconds=ttl)
+
+
+async def make_request(vin: str) -> List[Dict[str, Any]]:
+    """
+    Makes an HTTP GET request to the vPIC API with the given VIN (Vehicle Identification Number)
+    over the shared client session, through the circuit breaker, rate limiter and retries of
+    vpic_upstream.
+
+    :param vin: The VIN (Vehicle Identification Number) for the vehicle.
+    :type vin: str
+    :return: The "Results" of the vPIC API response.
+    :rtype: List[Dict[str, Any]]
+    :raises UpstreamUnavailableError: If the circuit is open or the rate limit is used up.
+    :raises UpstreamError: If the request failed, after any retries.
+    """
+    url = vpic_api_url.format(vin)
+
+    async def attempt() -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        outcome = "error"
+        upstream_requests_in_flight.inc()
+        try:
+            session = HttpSession.get_session()
             async with session.get(url) as response:
-                response_json = await response.json()
                 response.raise_for_status()
+                response_json = await response.json()
+            outcome = "success"
+            return response_json["Results"]
+        except ClientResponseError as e:
+            outcome = str(e.status)
+            raise
+        finally:
+            upstream_requests_in_flight.dec()
+            observe_upstream_request("decode", outcome, started)
 
-        response_json = await response.json()
-        return response_json["Results"]
-    except ClientResponseError as e:
-        return Response(content=str(e), status_code=response.status)
-    except ClientError as e:
-        logger.exception(f"Error while making the request to {url}")
-        return Response(content=str(e), status_code=response.status)
-    except Exception as e:
+    try:
+        return await vpic_upstream.call("decode", attempt)
+    except UpstreamUnavailableError as e:
+        logger.warning(f"Not making the request to {url}: {e}")
+        raise
+    except UpstreamError:
         logger.exception(f"Encountered exception while making request to {url}")
-        return Response(content=str(e), status_code=500)
+        raise
+
+
+async def make_batch_request(
+    vins: List[str],
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """
+    Decodes the given VINs through the vPIC batch API, vpic_batch_size VINs per request
+    with at most vpic_batch_concurrency requests in flight.
+
+    :param vins: The VINs to decode.
+    :type vins: List[str]
+    :return: The batch API results keyed by VIN, and the VINs whose request failed.
+    :rtype: Tuple[Dict[str, Dict[str, Any]], List[str]]
+    """
+    semaphore = asyncio.Semaphore(vpic_batch_concurrency)
+
+    async def decode_chunk(chunk: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        async with semaphore:
+            return await make_batch_chunk_request(chunk)
+
+    chunks = [
+        vins[start : start + vpic_batch_size]
+        for start in range(0, len(vins), vpic_batch_size)
+    ]
+    batch_results = {}
+    failed_vins = []
+    chunk_results = await asyncio.gather(*map(decode_chunk, chunks))
+    for chunk, results in zip(chunks, chunk_results):
+        if results is None:
+            failed_vins.extend(chunk)
+        else:
+            batch_results.update(results)
+    return batch_results, failed_vins
+
+
+async def make_batch_chunk_request(
+    vins: List[str],
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Makes a single HTTP POST request to the vPIC batch API for the given VINs.
+
+    :param vins: The VINs to decode, at most vpic_batch_size of them.
+    :type vins: List[str]
+    :return: The batch API results keyed by VIN, or None if the request failed.
+    :rtype: Optional[Dict[str, Dict[str, Any]]]
+    """
+    data = {"format": "json", "data": ";".join(vins)}
+
+    async def attempt() -> Dict[str, Dict[str, Any]]:
+        started = time.perf_counter()
+        outcome = "error"
+        upstream_requests_in_flight.inc()
+        try:
+            session = HttpSession.get_session()
+            async with session.post(vpic_batch_api_url, data=data) as response:
+                response.raise_for_status()
+                response_json = await response.json()
+            outcome = "success"
+            return {result.get("VIN"): result for result in response_json["Results"]}
+        except ClientResponseError as e:
+            outcome = str(e.status)
+            raise
+        finally:
+            upstream_requests_in_flight.dec()
+            observe_upstream_request("batch", outcome, started)
+
+    try:
+        return await vpic_upstream.call("batch", attempt)
+    except UpstreamUnavailableError as e:
+        logger.warning(f"Not making the request to {vpic_batch_api_url}: {e}")
+        return None
+    except UpstreamError:
+        logger.exception(
+            f"Encountered exception while making request to {vpic_batch_api_url}"
+        )
+        return None
+
+
+def observe_upstream_request(endpoint: str, outcome: str, started: float):
+    """
+    Records the duration of a request to the vPIC API in the metrics and in the
+    Server-Timing header of the current request.
+
+    :param endpoint: The vPIC endpoint, "decode" or "batch".
+    :type endpoint: str
+    :param outcome: "success", the HTTP status of a failed response, or "error".
+    :type outcome: str
+    :param started: The time.perf_counter() value when the request started.
+    :type started: float
+    """
+    duration = time.perf_counter() - started
+    upstream_request_duration.observe(duration, endpoint, outcome)
+    add_server_timing(f"vpic_{endpoint}", duration)
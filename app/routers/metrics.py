@@ -0,0 +1,98 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.prefix_decoder import prefix_decoder
+from app.resilience import CLOSED, HALF_OPEN, OPEN
+from app.routers import lookup
+from metrics.metrics import Counter, Gauge, registry
+
+router = APIRouter()
+
+
+def memory_cache_stat(name: str):
+    return lambda: lookup.cache.stats()[name]
+
+
+def upstream_flight_stat(name: str):
+    return lambda: lookup.upstream_flights.stats()[name]
+
+
+def stale_refresh_stat(name: str):
+    return lambda: lookup.stale_refreshes.stats()[name]
+
+
+memory_cache_size = Gauge(
+    "vin_memory_cache_size",
+    "VINs held in the in-memory cache tier.",
+    function=memory_cache_stat("size"),
+)
+memory_cache_counters = [
+    Counter(
+        f"vin_memory_cache_{name}_total",
+        f"Lookups and evictions of the in-memory cache tier: {name}.",
+        function=memory_cache_stat(name),
+    )
+    for name in ("hits", "misses", "evictions")
+]
+upstream_flights_started = Counter(
+    "vin_upstream_flights_started_total",
+    "vPIC lookups started for a VIN with no lookup already in flight.",
+    function=upstream_flight_stat("leaders"),
+)
+upstream_flights_coalesced = Counter(
+    "vin_upstream_flights_coalesced_total",
+    "vPIC lookups that awaited a lookup already in flight for the same VIN.",
+    function=upstream_flight_stat("coalesced"),
+)
+upstream_flights_in_flight = Gauge(
+    "vin_upstream_flights_in_flight",
+    "VINs with a vPIC lookup currently in flight.",
+    function=upstream_flight_stat("in_flight"),
+)
+stale_refreshes_started = Counter(
+    "vin_stale_refreshes_started_total",
+    "Background refreshes started for stale cache entries.",
+    function=stale_refresh_stat("started"),
+)
+stale_refreshes_skipped = Counter(
+    "vin_stale_refreshes_skipped_total",
+    "Stale cache entries served without a refresh, as too many were already in flight.",
+    function=stale_refresh_stat("skipped"),
+)
+stale_refreshes_in_flight = Gauge(
+    "vin_stale_refreshes_in_flight",
+    "Background refreshes of stale cache entries currently in flight.",
+    function=stale_refresh_stat("in_flight"),
+)
+
+# Numeric values of the circuit states, for the vin_upstream_circuit_state gauge.
+circuit_states = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+upstream_circuit_state = Gauge(
+    "vin_upstream_circuit_state",
+    "State of the circuit to the vPIC API: 0 closed, 1 half open, 2 open.",
+    function=lambda: circuit_states[lookup.vpic_upstream.circuit_breaker.state],
+)
+upstream_circuit_opened = Counter(
+    "vin_upstream_circuit_opened_total",
+    "Times the circuit to the vPIC API opened after consecutive failed requests.",
+    function=lambda: lookup.vpic_upstream.circuit_breaker.opened,
+)
+
+prefix_decoder_prefixes = Gauge(
+    "vin_prefix_decoder_prefixes",
+    "VIN prefixes (WMI and VDS) known to the prefix decoder.",
+    function=lambda: prefix_decoder.stats()["prefixes"],
+)
+
+
+@router.get("/metrics")
+def read_metrics() -> PlainTextResponse:
+    """
+    Exposes the metrics of the app in the Prometheus text exposition format.
+
+    :return: The metrics.
+    :rtype: PlainTextResponse
+    """
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
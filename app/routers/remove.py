@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Request
 from typing import Any, Dict, List
 
-from caching.sqlite_cache import cache
+from app.vin_validation import validate_vin, validate_vins
+from caching.cache_interface import DeleteCriteria
+from caching.factory import cache, negative_cache
+from log.logger import logger
+from models.parsing_models import BulkRemoveRequest
 
 router = APIRouter()
 
@@ -9,20 +13,71 @@ router = APIRouter()
 @router.delete("/remove")
 def delete_vin_from_cache(request: Request) -> Dict[str, Any]:
     """
-    Deletes the vin from the cache, if present, and returns a response indicating success or failure.
+    Deletes the vin from the cache and from the negative cache, if present, and returns a response
+    indicating success or failure.
 
     :param Request request: The FastAPI request object.
     :return: A dictionary containing the vin and the cache deletion status.
     :rtype: dict
-    :raises HTTPException 400: If the VIN is not a 17-character alphanumeric string.
+    :raises HTTPException 400: If the VIN is not 17 characters long or contains I, O or Q.
     """
     vin = request.query_params.get("vin", "")
-    if not len(vin) == 17 or not vin.isalnum():
-        raise HTTPException(
-            status_code=400,
-            detail="VIN should be a 17 characters alpha-numeric string.",
-        )
+    # Only the format is checked, so VINs cached without a valid check digit or model year
+    # code can still be removed.
+    error = validate_vin(vin, strict=False)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     delete_successful = cache.delete(vin)
+    negative_delete_successful = negative_cache.delete(vin)
+    delete_successful = delete_successful or negative_delete_successful
     response = {"Input VIN Requested": vin, "Cache Delete Success?": delete_successful}
 
     return response
+
+
+@router.post("/remove/bulk")
+def delete_vins_from_cache(remove_request: BulkRemoveRequest) -> Dict[str, int]:
+    """
+    Deletes the VINs matching every given criterion of the request from the cache: a VIN list,
+    a VIN prefix such as a WMI, a make, a model, a model year and a fetched-before time. The
+    VINs are deleted with set-based statements, in chunked transactions, and dropped from the
+    in-memory tier. The VINs of a plain VIN list are removed from the negative cache as well.
+
+    :param BulkRemoveRequest remove_request: The request body holding the criteria.
+    :return: The number of VINs deleted from the cache and from the negative cache.
+    :rtype: dict
+    :raises HTTPException 400: If a VIN is not 17 characters long or contains I, O or Q, or
+        the cache backend cannot delete by predicate.
+    :raises HTTPException 500: If the cache cannot be written. The chunks committed before the
+        error stay deleted.
+    """
+    vins = remove_request.vins
+    if vins is not None:
+        errors = {
+            vin: error
+            for vin, error in zip(vins, validate_vins(vins, strict=False))
+            if error
+        }
+        if errors:
+            raise HTTPException(status_code=400, detail=errors)
+    criteria = DeleteCriteria(
+        vins=None if vins is None else frozenset(vins),
+        vin_prefix=remove_request.vin_prefix,
+        make=remove_request.make,
+        model=remove_request.model,
+        model_year=remove_request.model_year,
+        fetched_before=remove_request.fetched_before,
+    )
+    try:
+        deleted = cache.delete_matching(criteria)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception:
+        logger.exception("Encountered exception while deleting vins in bulk.")
+        raise HTTPException(
+            status_code=500, detail="Encountered exception while deleting vins."
+        )
+    return {
+        "deleted": deleted,
+        "negative_deleted": negative_cache.delete_matching(criteria),
+    }
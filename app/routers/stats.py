@@ -0,0 +1,23 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from caching.factory import cache, cache_evictor
+
+router = APIRouter()
+
+
+@router.get("/stats")
+def read_cache_stats() -> Dict[str, Any]:
+    """
+    Returns the state of the cache tiers: the counters of the in-memory tier, and the size,
+    bounds and eviction counters of the SQLite store.
+
+    :return: The stats of the in-memory tier and of the SQLite store, None if the backend is
+        not stored in SQLite.
+    :rtype: Dict[str, Any]
+    """
+    return {
+        "memory_cache": cache.stats(),
+        "sqlite_cache": None if cache_evictor is None else cache_evictor.stats(),
+    }
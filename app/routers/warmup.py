@@ -0,0 +1,91 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException
+
+from app.config import warmup_directory
+from app.warmup import SUPPORTED_FORMATS, WarmupJob
+from caching.factory import cache
+from log.logger import logger
+from models.parsing_models import WarmupRequest
+
+router = APIRouter()
+
+warmup_job: Optional[WarmupJob] = None
+warmup_task: Optional[asyncio.Task] = None
+
+
+@router.post("/warmup", status_code=202)
+async def start_warmup(warmup_request: WarmupRequest) -> Dict[str, Any]:
+    """
+    Starts filling the cache in the background from a VIN list in warmup_directory, defined in
+    config.py. The job runs on the event loop next to the requests, and resumes from the progress
+    saved by a previous job on the same file unless restart is set.
+
+    :param WarmupRequest warmup_request: The request body naming the VIN list.
+    :return: The status of the job.
+    :rtype: dict
+    :raises HTTPException 400: If the path is outside warmup_directory or of an unsupported format.
+    :raises HTTPException 404: If the file does not exist.
+    :raises HTTPException 409: If a warm-up job is already running.
+    """
+    global warmup_job, warmup_task
+
+    if warmup_task is not None and not warmup_task.done():
+        raise HTTPException(status_code=409, detail="A warm-up job is already running.")
+    directory = os.path.realpath(warmup_directory)
+    path = os.path.realpath(os.path.join(directory, warmup_request.path))
+    if os.path.commonpath([directory, path]) != directory:
+        raise HTTPException(
+            status_code=400, detail="The VIN list must be in the warm-up directory."
+        )
+    if not path.lower().endswith(SUPPORTED_FORMATS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"The VIN list must be one of {', '.join(SUPPORTED_FORMATS)} files.",
+        )
+    try:
+        # Writes to the SQLite tier only, so the warm-up does not evict the hot entries of
+        # the in-memory tier.
+        warmup_job = WarmupJob(path, cache.backend)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=404, detail=f"No VIN list found at {warmup_request.path}."
+        )
+    warmup_task = asyncio.ensure_future(warmup_job.run(restart=warmup_request.restart))
+    warmup_task.add_done_callback(log_warmup_result)
+    return warmup_job.status()
+
+
+@router.get("/warmup")
+def read_warmup_status() -> Dict[str, Any]:
+    """
+    Returns the status of the running, or last, warm-up job.
+
+    :return: The status of the job.
+    :rtype: dict
+    :raises HTTPException 404: If no warm-up job was started.
+    """
+    if warmup_job is None:
+        raise HTTPException(status_code=404, detail="No warm-up job was started.")
+    return warmup_job.status()
+
+
+def log_warmup_result(task: asyncio.Task):
+    if task.cancelled():
+        logger.info("Warm-up job cancelled.")
+    elif task.exception() is not None:
+        logger.error("Warm-up job failed.", exc_info=task.exception())
+    else:
+        logger.info(f"Warm-up job finished: {task.result()}")
+
+
+async def cancel_warmup():
+    """
+    Cancels the running warm-up job, if any. Its progress is saved after every batch, so
+    it resumes from the last completed batch when started again.
+    """
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+        await asyncio.gather(warmup_task, return_exceptions=True)
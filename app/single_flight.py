@@ -0,0 +1,51 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into a single in-flight call.
+
+    The first caller for a key starts the call; callers arriving while it is still
+    running await the same result instead of starting their own.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs function for the given key unless a call for that key is already in flight.
+
+        :param key: The key identifying the call.
+        :type key: Hashable
+        :param function: A callable returning the awaitable to run.
+        :type function: Callable[[], Awaitable[Any]]
+        :return: The result of the shared call.
+        :rtype: Any
+        :raises Exception: Any exception raised by the shared call.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+        # Shielded so that a cancelled caller does not cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the number of calls started, callers coalesced and calls in flight.
+
+        :rtype: Dict[str, int]
+        """
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._tasks),
+        }
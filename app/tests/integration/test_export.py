@@ -1,10 +1,10 @@
 import pytest
 from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 from app.main import app
-from app.routers.export import convert_database_to_parquet, DatabaseToParquetError
+from app.routers.export import DatabaseToParquetError
 
 
 client = TestClient(app, raise_server_exceptions=False)
@@ -12,11 +12,9 @@ module_path = "app.routers.export.{}"
 
 
 @pytest.fixture
-def mock_convert_database():
-    with patch(
-        module_path.format("convert_database_to_parquet")
-    ) as mock_convert_database:
-        yield mock_convert_database
+def mock_database_state():
+    with patch(module_path.format("read_database_state")) as mock_database_state:
+        yield mock_database_state
 
 
 @pytest.fixture
@@ -35,18 +33,23 @@ class TestExportCache:
         assert response.headers["Content-Disposition"].startswith(
             "attachment; filename="
         )
-        assert response.content is not None
+        assert response.content.startswith(b"PAR1")
+        assert response.content.endswith(b"PAR1")
 
-    def test_exception(self, mocker, mock_convert_database, mock_logger):
-        mock_object = MagicMock()
-        mock_object.side_effect = DatabaseToParquetError
-        mocker.patch(convert_database_to_parquet).side_effect = DatabaseToParquetError
+    def test_not_modified(self):
+        etag = client.get("/export").headers["ETag"]
+
+        response = client.get("/export", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+    def test_exception(self, mock_database_state, mock_logger):
+        mock_database_state.side_effect = DatabaseToParquetError("conversion failed")
         response = client.get("/export")
-        assert response.content == ""
-        assert (
-            http_exception.value.detail == "Database parquet file has not been found."
-        )
-        assert http_exception.value.status_code == 404
+        assert response.status_code == 500
+        assert response.json() == {"detail": "conversion failed"}
         mock_logger.exception.assert_called_once_with(
-            "Database parquet file has not been found."
+            "Encountered exception while converting database to parquet file."
         )
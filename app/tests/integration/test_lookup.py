@@ -1,10 +1,13 @@
+from datetime import datetime
+
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
 
 
 from app.main import app
-from app.routers.lookup import cache
+from caching.cache_interface import CacheEntry, CacheInterface
+from caching.memory_cache import MemoryCache
 
 module_path = "app.routers.lookup.{}"
 client = TestClient(app)
@@ -12,7 +15,7 @@ client = TestClient(app)
 
 @pytest.fixture
 def mock_cache():
-    with patch(module_path.format("cache")) as mock_cache:
+    with patch(module_path.format("cache"), spec=MemoryCache) as mock_cache:
         yield mock_cache
 
 
@@ -23,19 +26,47 @@ def mock_make_request():
 
 
 class TestLookupVehicleDetails:
-    def test_cached_result(self, mock_cache, mocker):
+    @pytest.mark.parametrize("raw_cache_hits", [False, True])
+    def test_cached_result(self, raw_cache_hits):
         vin = "ABC1234567890DEF0"
-        mock_cache = MagicMock()
-        mock_cache.get.return_value = {
-            "VIN": vin,
-            "Make": "Ford",
-            "Model": "Mustang",
-            "Year": 2021,
-            "Cached Result?": True,
-        }
+        backend = MagicMock(spec=CacheInterface)
+        backend.aget_entry.return_value = CacheEntry(
+            {"Make": "CITROËN", "Model Year": "2021", "Input VIN Requested": vin},
+            datetime.utcnow(),
+        )
+        cache = MemoryCache(backend, max_size=10, ttl=60)
 
-        mocker.patch.object(cache, "get", mock_cache.get)
-        response = client.get(f"/lookup?vin={vin}")
+        with patch(module_path.format("cache"), cache), patch(
+            module_path.format("lookup_raw_cache_hits"), raw_cache_hits
+        ):
+            response = client.get(f"/lookup?vin={vin}")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        # Both modes send the same bytes.
+        assert (
+            response.content
+            == (
+                '{"Make":"CITROËN","Model Year":"2021","Input VIN Requested":'
+                '"ABC1234567890DEF0","Cached Result?":true,"Source":"cache"}'
+            ).encode()
+        )
+
+    def test_cached_result_from_dict(self, mock_cache):
+        vin = "ABC1234567890DEF0"
+        mock_cache.aget_entry.return_value = CacheEntry(
+            {
+                "VIN": vin,
+                "Make": "Ford",
+                "Model": "Mustang",
+                "Year": 2021,
+                "Cached Result?": True,
+            },
+            datetime.utcnow(),
+        )
+
+        with patch(module_path.format("lookup_raw_cache_hits"), False):
+            response = client.get(f"/lookup?vin={vin}")
         assert response.status_code == 200
         assert response.json() == {
             "VIN": vin,
@@ -43,8 +74,9 @@ class TestLookupVehicleDetails:
             "Model": "Mustang",
             "Year": 2021,
             "Cached Result?": True,
+            "Source": "cache",
         }
-        mock_cache.get.assert_called_once_with(vin)
+        mock_cache.aget_entry.assert_awaited_once_with(vin)
 
     def test_invalid_vin(self, mock_cache, mock_make_request):
         vin = "InvalidVIN"
@@ -22,3 +22,14 @@ class TestDeleteVinFromCache:
         assert response.json() == {
             "detail": "VIN should be a 17 characters alpha-numeric string."
         }
+
+
+class TestDeleteVinsFromCache:
+    def test_success(self):
+        response = client.post("/remove/bulk", json={"vins": ["ABC1234567890DEF0"]})
+        assert response.status_code == 200
+        assert response.json() == {"deleted": 0, "negative_deleted": 0}
+
+    def test_no_criteria(self):
+        response = client.post("/remove/bulk", json={})
+        assert response.status_code == 422
@@ -0,0 +1,12 @@
+import pytest
+
+from database.connection import DatabasePool
+from models.database_models import create_tables
+
+
+@pytest.fixture
+def temporary_database(tmp_path):
+    database_pool = DatabasePool(f"sqlite:///{tmp_path}/test.db")
+    create_tables(database_pool.get_engine())
+    yield database_pool
+    database_pool.get_engine().dispose()
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+
+from caching.async_cache import AsyncCache
+from caching.factory import build_cache
+from caching.memory_cache import MemoryCache
+
+
+@pytest.fixture
+def mock_backend():
+    return MagicMock()
+
+
+@pytest.fixture
+def async_cache(mock_backend):
+    async_cache = AsyncCache(mock_backend, max_workers=2)
+    yield async_cache
+    async_cache.close()
+
+
+class TestAsyncCache:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+
+    @pytest.mark.asyncio
+    async def test_aget_runs_off_the_event_loop(self, mock_backend, async_cache):
+        caller_threads = []
+
+        def get(vin):
+            caller_threads.append(threading.current_thread())
+            return {"Make": "PETERBILT"}
+
+        mock_backend.get.side_effect = get
+
+        assert await async_cache.aget(self.valid_vin) == {"Make": "PETERBILT"}
+        assert caller_threads[0] is not threading.current_thread()
+        assert caller_threads[0].name.startswith("cache")
+
+    @pytest.mark.asyncio
+    async def test_async_methods_delegate(self, mock_backend, async_cache):
+        await async_cache.aset(self.valid_vin, {"Make": "PETERBILT"})
+        await async_cache.adelete(self.valid_vin)
+        await async_cache.aget_many(iter([self.valid_vin]))
+        await async_cache.aset_many({self.valid_vin: {"Make": "PETERBILT"}})
+
+        mock_backend.set.assert_called_once_with(self.valid_vin, {"Make": "PETERBILT"})
+        mock_backend.delete.assert_called_once_with(self.valid_vin)
+        mock_backend.get_many.assert_called_once_with([self.valid_vin])
+        mock_backend.set_many.assert_called_once_with(
+            {self.valid_vin: {"Make": "PETERBILT"}}
+        )
+
+    def test_sync_methods_call_backend_directly(self, mock_backend, async_cache):
+        mock_backend.delete.return_value = True
+
+        assert async_cache.delete(self.valid_vin) is True
+        mock_backend.delete.assert_called_once_with(self.valid_vin)
+
+    @pytest.mark.asyncio
+    async def test_memory_tier_in_front(self, mock_backend, async_cache):
+        mock_backend.get.return_value = {"Make": "PETERBILT"}
+        memory_cache = MemoryCache(async_cache, max_size=10, ttl=60)
+
+        assert await memory_cache.aget(self.valid_vin) == {"Make": "PETERBILT"}
+        assert await memory_cache.aget(self.valid_vin) == {"Make": "PETERBILT"}
+        mock_backend.get.assert_called_once_with(self.valid_vin)
+
+
+class TestBuildCache:
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError) as value_error:
+            build_cache("unknown")
+        assert str(value_error.value) == "Unknown cache backend: unknown"
@@ -0,0 +1,94 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.responses import JSONResponse
+
+from caching.cache_interface import CacheEntry
+from caching.codecs import (
+    JsonCodec,
+    StructCodec,
+    decode_entry,
+    encode_response,
+    get_codec,
+)
+
+VIN = "1XPWD40X1ED215307"
+VEHICLE_DETAILS = {
+    "Make": "PETERBILT",
+    "Model": "389",
+    "Model Year": "2014",
+    "Body Class": None,
+    "Input VIN Requested": VIN,
+}
+FETCHED_AT = datetime(2023, 6, 1, 12, 0, 0, 123456)
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("codec", [JsonCodec(), StructCodec()])
+    def test_round_trip(self, codec):
+        data = codec.encode(VIN, VEHICLE_DETAILS, FETCHED_AT, "vpic")
+
+        assert data[:1] == codec.tag
+        assert decode_entry(VIN, data) == CacheEntry(VEHICLE_DETAILS, FETCHED_AT)
+
+    def test_struct_is_smaller_than_json(self):
+        struct_data = StructCodec().encode(VIN, VEHICLE_DETAILS, FETCHED_AT, "vpic")
+        json_data = JsonCodec().encode(VIN, VEHICLE_DETAILS, FETCHED_AT, "vpic")
+
+        assert len(struct_data) < len(json_data) / 2
+
+    def test_struct_unknown_fetch_time(self):
+        data = StructCodec().encode(VIN, VEHICLE_DETAILS, None, "vpic")
+
+        assert decode_entry(VIN, data).fetched_at is None
+
+    def test_struct_non_ascii_values(self):
+        vehicle_details = dict(VEHICLE_DETAILS, Make="CITROËN")
+
+        data = StructCodec().encode(VIN, vehicle_details, FETCHED_AT, "vpic")
+
+        assert decode_entry(VIN, data).value == vehicle_details
+
+    def test_struct_absent_fields(self):
+        vehicle_details = {"Make": "PETERBILT", "Input VIN Requested": VIN}
+
+        data = StructCodec().encode(VIN, vehicle_details, FETCHED_AT, "vpic")
+
+        assert decode_entry(VIN, data).value == vehicle_details
+
+    @pytest.mark.parametrize(
+        "vehicle_details",
+        [dict(VEHICLE_DETAILS, Trim="Day Cab"), {"Make": "PETERBILT"}],
+    )
+    def test_struct_falls_back_to_json(self, vehicle_details):
+        data = StructCodec().encode(VIN, vehicle_details, FETCHED_AT, "vpic")
+
+        assert data[:1] == JsonCodec.tag
+        assert decode_entry(VIN, data).value == vehicle_details
+
+    def test_legacy_json_document(self):
+        data = json.dumps(
+            {
+                "vehicle_details": VEHICLE_DETAILS,
+                "fetched_at": FETCHED_AT.isoformat(),
+                "source": "vpic",
+            }
+        ).encode()
+
+        assert decode_entry(VIN, data) == CacheEntry(VEHICLE_DETAILS, FETCHED_AT)
+
+    def test_malformed_values(self):
+        with pytest.raises(ValueError):
+            decode_entry(VIN, StructCodec.tag + b"\x00")
+        with pytest.raises(ValueError):
+            decode_entry(VIN, b"\x7f")
+
+    def test_unknown_codec(self):
+        with pytest.raises(ValueError):
+            get_codec("msgpack")
+
+    def test_encode_response_matches_json_response(self):
+        vehicle_details = dict(VEHICLE_DETAILS, Make="CITROËN")
+
+        assert encode_response(vehicle_details) == JSONResponse(vehicle_details).body
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import text
+
+from database.connection import DatabasePool, create_database_engine
+
+
+class TestCreateDatabaseEngine:
+    @pytest.mark.parametrize(
+        "profile, journal_mode, synchronous",
+        [("default", "delete", 2), ("balanced", "wal", 1), ("fast", "wal", 0)],
+    )
+    def test_profile_pragmas(self, tmp_path, profile, journal_mode, synchronous):
+        engine = create_database_engine(f"sqlite:///{tmp_path}/test.db", profile)
+        with engine.connect() as connection:
+            assert (
+                connection.execute(text("PRAGMA journal_mode")).scalar() == journal_mode
+            )
+            assert (
+                connection.execute(text("PRAGMA synchronous")).scalar() == synchronous
+            )
+        engine.dispose()
+
+    def test_unknown_profile(self, tmp_path):
+        with pytest.raises(KeyError):
+            create_database_engine(f"sqlite:///{tmp_path}/test.db", "unknown")
+
+
+class TestDatabasePool:
+    def test_pool_options(self, tmp_path):
+        database_pool = DatabasePool(
+            f"sqlite:///{tmp_path}/test.db", "balanced", pool_size=3, max_overflow=0
+        )
+        engine = database_pool.get_engine()
+
+        assert database_pool.get_engine() is engine
+        assert engine.pool.size() == 3
+        with database_pool.get_session() as session:
+            assert session.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        engine.dispose()
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from unittest.mock import patch
+
+from app.main import create_database_tables
+
+from caching.sqlite_cache import SqliteCache
+from database.connection import DatabasePool
+from database.migrations import add_missing_columns
+from models.database_models import Base, Vin, create_tables, migrate_json_vins
+
+
+@pytest.fixture
+def legacy_database(tmp_path):
+    url = f"sqlite:///{tmp_path}/legacy.db"
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE vins (vin VARCHAR(17) NOT NULL, vehicle_details TEXT(255), PRIMARY KEY (vin))"
+            )
+        )
+        connection.execute(
+            text("INSERT INTO vins VALUES (:vin, :vehicle_details)"),
+            {
+                "vin": "1XPWD40X1ED215313",
+                "vehicle_details": json.dumps(VEHICLE_DETAILS),
+            },
+        )
+    engine.dispose()
+    database_pool = DatabasePool(url)
+    yield database_pool
+    database_pool.get_engine().dispose()
+
+
+VEHICLE_DETAILS = {
+    "Make": "PETERBILT",
+    "Model": "388",
+    "Model Year": "2014",
+    "Body Class": "Truck-Tractor",
+    "Input VIN Requested": "1XPWD40X1ED215313",
+}
+
+
+class TestCreateTables:
+    def test_migrates_legacy_rows(self, legacy_database):
+        engine = legacy_database.get_engine()
+
+        create_tables(engine)
+
+        with engine.connect() as connection:
+            row = connection.execute(
+                text(
+                    "SELECT vehicle_details, make, model, model_year, body_class FROM vins"
+                )
+            ).one()
+        assert tuple(row) == (None, "PETERBILT", "388", 2014, "Truck-Tractor")
+        index_names = {index["name"] for index in inspect(engine).get_indexes("vins")}
+        assert {
+            "ix_vins_make_model",
+            "ix_vins_model_year",
+            "ix_vins_fetched_at",
+        } <= index_names
+        assert SqliteCache(legacy_database).get("1XPWD40X1ED215313") == VEHICLE_DETAILS
+
+    def test_migration_is_idempotent(self, legacy_database):
+        engine = legacy_database.get_engine()
+        create_tables(engine)
+
+        assert migrate_json_vins(engine) == 0
+
+    def test_unmigrated_json_rows_stay_readable(self, legacy_database):
+        add_missing_columns(legacy_database.get_engine(), Base.metadata)
+
+        assert SqliteCache(legacy_database).get("1XPWD40X1ED215313") == VEHICLE_DETAILS
+
+    def test_only_legacy_rows_have_no_fetch_time(self, legacy_database):
+        create_tables(legacy_database.get_engine())
+        cache = SqliteCache(legacy_database)
+        cache.set("1XP5DB9X7YN526158", VEHICLE_DETAILS)
+
+        assert cache.get_entry("1XPWD40X1ED215313") == (VEHICLE_DETAILS, None)
+        assert cache.get_entry("1XP5DB9X7YN526158").fetched_at is not None
+        assert cache.get_entry("1XP5DB9X0YN526159") == ({}, None)
+
+
+class TestVin:
+    def test_round_trip(self):
+        vin = Vin(
+            vin="1XPWD40X1ED215313", **Vin.columns_from_vehicle_details(VEHICLE_DETAILS)
+        )
+
+        assert vin.model_year == 2014
+        assert vin.to_vehicle_details() == VEHICLE_DETAILS
+
+    def test_missing_values(self):
+        vin = Vin(vin="1XP5DB9X7YN526158", **Vin.columns_from_vehicle_details({}))
+
+        assert vin.to_vehicle_details() == {
+            "Make": None,
+            "Model": None,
+            "Model Year": None,
+            "Body Class": None,
+            "Input VIN Requested": "1XP5DB9X7YN526158",
+        }
+
+    @pytest.mark.asyncio
+    async def test_tables_are_created_on_startup(self, tmp_path):
+        database_pool = DatabasePool(f"sqlite:///{tmp_path}/test.db")
+
+        with patch("app.main.Database", database_pool):
+            await create_database_tables()
+
+        assert {"vins", "negative_vins"} <= set(
+            inspect(database_pool.get_engine()).get_table_names()
+        )
+        database_pool.get_engine().dispose()
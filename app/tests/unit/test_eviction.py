@@ -0,0 +1,195 @@
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.routers.stats import read_cache_stats
+from caching.eviction import CacheEvictor
+from caching.factory import build_cache_evictor
+from caching.sqlite_cache import LFU, LRU, SqliteCache
+from database.connection import DatabasePool
+from models.database_models import Base, Vin
+
+module_path = "caching.eviction.{}"
+
+VINS = [f"1XPWD40X0ED{serial:06d}" for serial in range(10)]
+
+
+@pytest.fixture
+def sqlite_cache(temporary_database):
+    sqlite_cache = SqliteCache(temporary_database)
+    sqlite_cache.set_many({vin: {"Make": "PETERBILT"} for vin in VINS})
+    return sqlite_cache
+
+
+def read_rows(sqlite_cache):
+    db_session = sqlite_cache.database.get_session()
+    try:
+        return {row.vin: row for row in db_session.query(Vin)}
+    finally:
+        db_session.close()
+
+
+class TestSqliteCacheAccesses:
+    def test_reads_are_written_on_flush(self, sqlite_cache):
+        sqlite_cache.get(VINS[0])
+        sqlite_cache.get_many(VINS[:2])
+        sqlite_cache.get("1XPWD40X0ED999999")
+
+        assert read_rows(sqlite_cache)[VINS[0]].hits == 0
+        assert sqlite_cache.flush_accesses() == 2
+
+        rows = read_rows(sqlite_cache)
+        assert rows[VINS[0]].hits == 2
+        assert rows[VINS[1]].hits == 1
+        assert rows[VINS[0]].last_accessed_at > rows[VINS[2]].last_accessed_at
+        assert sqlite_cache.flush_accesses() == 0
+
+    def test_pending_accesses_are_bounded(self, sqlite_cache):
+        sqlite_cache.max_pending_accesses = 1
+
+        sqlite_cache.record_accesses(VINS[:3])
+        sqlite_cache.record_accesses(VINS[:1])
+
+        assert sqlite_cache.pending_accesses() == 1
+        assert sqlite_cache.dropped_accesses == 2
+
+    def test_rewrites_keep_access_columns(self, sqlite_cache):
+        sqlite_cache.get(VINS[0])
+        sqlite_cache.flush_accesses()
+
+        sqlite_cache.set(VINS[0], {"Make": "KENWORTH"})
+
+        assert read_rows(sqlite_cache)[VINS[0]].hits == 1
+
+
+class TestSqliteCacheEvict:
+    def test_lru_evicts_least_recently_read(self, sqlite_cache):
+        sqlite_cache.get_many(VINS[:7])
+        sqlite_cache.flush_accesses()
+
+        assert sqlite_cache.evict(3, LRU) == 3
+
+        assert set(read_rows(sqlite_cache)) == set(VINS[:7])
+
+    def test_lfu_evicts_least_read(self, sqlite_cache):
+        for _ in range(2):
+            sqlite_cache.get_many(VINS[5:])
+        sqlite_cache.flush_accesses()
+        # Read last, but only once.
+        sqlite_cache.get_many(VINS[:5])
+        sqlite_cache.flush_accesses()
+
+        assert sqlite_cache.evict(5, LFU) == 5
+
+        assert set(read_rows(sqlite_cache)) == set(VINS[5:])
+
+    def test_lfu_keeps_rows_cached_after_reads(self, sqlite_cache):
+        sqlite_cache.get_many(VINS[1:])
+        sqlite_cache.flush_accesses()
+        new_vin = "1XPWD40X0ED000100"
+        sqlite_cache.set(new_vin, {"Make": "PETERBILT"})
+
+        assert read_rows(sqlite_cache)[new_vin].hits == 0
+        assert sqlite_cache.evict(1, LFU) == 1
+
+        assert set(read_rows(sqlite_cache)) == set(VINS[1:] + [new_vin])
+
+    def test_unknown_policy(self, sqlite_cache):
+        with pytest.raises(ValueError):
+            sqlite_cache.evict(1, "fifo")
+
+    def test_get_size(self, sqlite_cache):
+        size = sqlite_cache.get_size()
+
+        assert size["rows"] == len(VINS)
+        assert 0 < size["used_bytes"] <= size["file_bytes"]
+
+    def test_reclaim_space(self, tmp_path):
+        database_pool = DatabasePool(f"sqlite:///{tmp_path}/incremental.db")
+        engine = database_pool.get_engine()
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        Base.metadata.create_all(bind=engine)
+        sqlite_cache = SqliteCache(database_pool)
+        sqlite_cache.set_many(
+            {f"1XPWD40X0ED{serial:06d}": {"Make": "P" * 500} for serial in range(500)}
+        )
+        sqlite_cache.evict(500)
+        free_bytes = sqlite_cache.get_size()["free_bytes"]
+
+        reclaimed = sqlite_cache.reclaim_space(1000)
+
+        assert reclaimed > 0
+        assert sqlite_cache.get_size()["free_bytes"] < free_bytes
+        engine.dispose()
+
+
+class TestCacheEvictor:
+    def test_within_bounds(self, sqlite_cache):
+        evictor = CacheEvictor(sqlite_cache, LRU, max_rows=10)
+
+        assert evictor.run_once() == 0
+
+    def test_max_rows(self, sqlite_cache):
+        evictor = CacheEvictor(sqlite_cache, LRU, max_rows=5, target=0.8)
+        sqlite_cache.get_many(VINS[6:])
+
+        with patch(module_path.format("cache_evictions")) as mock_cache_evictions:
+            assert evictor.run_once() == 6
+
+        assert set(read_rows(sqlite_cache)) == set(VINS[6:])
+        mock_cache_evictions.inc.assert_called_once_with(LRU, amount=6)
+        assert evictor.stats()["size"]["rows"] == 4
+
+    def test_max_bytes(self):
+        evictor = CacheEvictor(MagicMock(), LFU, max_bytes=1000, target=0.5)
+
+        assert evictor.excess_rows({"rows": 10, "used_bytes": 2000}) == 8
+
+    def test_unknown_policy(self, sqlite_cache):
+        with pytest.raises(ValueError):
+            CacheEvictor(sqlite_cache, "fifo")
+
+    def test_failed_runs_are_logged(self):
+        sqlite_cache = MagicMock()
+        sqlite_cache.flush_accesses.side_effect = Exception
+        evictor = CacheEvictor(sqlite_cache, LRU, interval=0.01)
+
+        with patch(module_path.format("logging")) as mock_logging:
+            evictor.start()
+            evictor._stopping.wait(0.05)
+            sqlite_cache.flush_accesses.side_effect = None
+            evictor.stop()
+
+        assert mock_logging.exception.called
+
+
+class TestFactory:
+    def test_no_evictor_for_redis(self):
+        assert build_cache_evictor(MagicMock(), "redis") is None
+
+    def test_async_sqlite_store(self):
+        cache = MagicMock()
+        cache.backend.backend = MagicMock(spec=SqliteCache)
+
+        evictor = build_cache_evictor(cache, "async_sqlite")
+
+        assert evictor.sqlite_cache is cache.backend.backend
+
+
+class TestReadCacheStats:
+    def test_stats(self):
+        with patch("app.routers.stats.cache") as mock_cache, patch(
+            "app.routers.stats.cache_evictor"
+        ) as mock_cache_evictor:
+            stats = read_cache_stats()
+
+        assert stats == {
+            "memory_cache": mock_cache.stats.return_value,
+            "sqlite_cache": mock_cache_evictor.stats.return_value,
+        }
+
+    def test_no_sqlite_store(self):
+        with patch("app.routers.stats.cache"), patch(
+            "app.routers.stats.cache_evictor", None
+        ):
+            assert read_cache_stats()["sqlite_cache"] is None
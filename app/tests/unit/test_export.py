@@ -1,41 +1,47 @@
+import os
+
 import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
 from fastapi import HTTPException
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from app.routers.export import (
     export_cache,
-    convert_database_to_parquet,
+    generate_parquet_chunks,
+    generate_snapshot_chunks,
+    open_snapshot,
+    read_database_state,
+    refresh_snapshot,
     DatabaseToParquetError,
 )
-from app.config import vin_parquet_name, vin_table_name, vin_parquet_path
+from app.config import vin_parquet_name
+from caching.sharded_cache import ShardedSqliteCache
+from caching.sqlite_cache import SqliteCache
+from database.connection import DatabasePool
+from models.database_models import Base, parse_model_year
 
 module_path = "app.routers.export.{}"
 
 
 @pytest.fixture
-def mock_convert_database():
-    with patch(
-        module_path.format("convert_database_to_parquet")
-    ) as mock_convert_database:
-        yield mock_convert_database
-
-
-@pytest.fixture
-def mock_response():
-    with patch(module_path.format("Response")) as mock_response:
-        yield mock_response
+def mock_generate_parquet():
+    with patch(module_path.format("generate_parquet_chunks")) as mock_generate_parquet:
+        yield mock_generate_parquet
 
 
 @pytest.fixture
-def mock_os():
-    with patch(module_path.format("os")) as mock_os:
-        yield mock_os
+def mock_streaming_response():
+    with patch(module_path.format("StreamingResponse")) as mock_streaming_response:
+        yield mock_streaming_response
 
 
 @pytest.fixture
 def mock_database_connection():
-    with patch(module_path.format("Database")) as mock_database_connection:
-        yield mock_database_connection
+    with patch(
+        module_path.format("cache_databases"), [MagicMock()]
+    ) as mock_cache_databases:
+        yield mock_cache_databases[0]
 
 
 @pytest.fixture
@@ -45,48 +51,112 @@ def mock_logger():
 
 
 @pytest.fixture
-def mock_pandas():
-    with patch(module_path.format("pd")) as mock_pandas:
-        yield mock_pandas
+def mock_request():
+    with patch(module_path.format("Request")) as mock_request:
+        mock_request.headers = {}
+        yield mock_request
+
+
+@pytest.fixture
+def mock_snapshot():
+    with patch(module_path.format("read_database_state")) as mock_state, patch(
+        module_path.format("refresh_snapshot")
+    ) as mock_refresh, patch(module_path.format("open_snapshot")) as mock_open:
+        mock_state.return_value = {
+            "version": 7,
+            "rewrite_version": 2,
+            "max_rowids": [9],
+        }
+        mock_refresh.return_value = {"version": 7, "parts": ["part.parquet"]}
+        yield MagicMock(state=mock_state, refresh=mock_refresh, open=mock_open)
 
 
 @pytest.fixture
-def mock_generate():
-    with patch(module_path.format("generate_file_chunks")) as mock_generate:
-        yield mock_generate
+def snapshot_path(tmp_path):
+    snapshot_path = str(tmp_path / "snapshot")
+    with patch(module_path.format("vin_snapshot_path"), snapshot_path):
+        yield snapshot_path
+
+
+@pytest.fixture
+def temporary_database(temporary_database):
+    with patch(module_path.format("cache_databases"), [temporary_database]):
+        yield temporary_database
+
+
+@pytest.fixture
+def shard_databases(tmp_path):
+    shard_databases = [
+        DatabasePool(f"sqlite:///{tmp_path}/shard_{index}.db") for index in range(2)
+    ]
+    for database_pool in shard_databases:
+        Base.metadata.create_all(bind=database_pool.get_engine())
+    with patch(module_path.format("cache_databases"), shard_databases):
+        yield shard_databases
+    for database_pool in shard_databases:
+        database_pool.get_engine().dispose()
+
+
+def read_parquet(content: bytes) -> pq.ParquetFile:
+    return pq.ParquetFile(pa.BufferReader(content))
+
+
+def read_snapshot(manifest) -> pq.ParquetFile:
+    return read_parquet(b"".join(generate_snapshot_chunks(open_snapshot(manifest))))
+
+
+def cache_vins(database, vins):
+    cache = SqliteCache(database)
+    for vin in vins:
+        cache.set(vin, {"Make": "PETERBILT", "Input VIN Requested": vin})
+    return cache
 
 
 class TestExportCache:
-    def test_success(
-        self, mock_convert_database, mock_response, mock_generate, mock_os
-    ):
-        mock_os.path.exists.return_value = True
-        mock_generate.return_value = [b"random_string", b"random_string2"]
-        result = export_cache()
-        mock_convert_database.assert_called_once()
-        assert result == mock_response.return_value
-        mock_response.assert_called_once_with(
-            content=b"random_stringrandom_string2",
+    def test_success(self, mock_request, mock_snapshot, mock_streaming_response):
+        with patch(module_path.format("generate_snapshot_chunks")) as mock_generate:
+            result = export_cache(mock_request)
+
+        assert result == mock_streaming_response.return_value
+        mock_snapshot.refresh.assert_called_once_with(mock_snapshot.state.return_value)
+        mock_snapshot.open.assert_called_once_with(mock_snapshot.refresh.return_value)
+        mock_generate.assert_called_once_with(mock_snapshot.open.return_value)
+        mock_streaming_response.assert_called_once_with(
+            content=mock_generate.return_value,
+            media_type="application/octet-stream",
             headers={
-                "Content-Type": "application/octet-stream",
-                "Content-Disposition": "attachment; filename=vin_cache.parquet",
+                "Content-Disposition": f"attachment; filename={vin_parquet_name}",
+                "ETag": '"7"',
             },
         )
 
-    def test_no_parquet_path(self, mock_generate):
-        with pytest.raises(HTTPException) as not_found_error:
-            mock_generate.side_effect = FileNotFoundError
-            result = export_cache()
-        assert (
-            str(not_found_error.value.detail)
-            == "Database parquet file has not been found."
+    def test_not_modified(self, mock_request, mock_snapshot):
+        mock_request.headers = {"if-none-match": '"7"'}
+
+        result = export_cache(mock_request)
+
+        assert result.status_code == 304
+        assert result.headers["ETag"] == '"7"'
+        mock_snapshot.refresh.assert_not_called()
+
+    def test_snapshot_replaced_concurrently(
+        self, mock_request, mock_snapshot, mock_streaming_response
+    ):
+        mock_snapshot.open.side_effect = [FileNotFoundError, ["part_file"]]
+
+        export_cache(mock_request)
+
+        mock_snapshot.refresh.assert_called_with(
+            mock_snapshot.state.return_value, rebuild=True
         )
-        assert not_found_error.value.status_code == 404
+        assert mock_snapshot.open.call_count == 2
 
-    def test_database_to_parquet_error(self, mock_logger, mock_response, mock_pandas):
+    def test_database_to_parquet_error(
+        self, mock_request, mock_logger, mock_database_connection
+    ):
+        mock_database_connection.get_engine.side_effect = Exception
         with pytest.raises(HTTPException) as conversion_error:
-            mock_pandas.read_sql_query.side_effect = DatabaseToParquetError
-            result = export_cache()
+            export_cache(mock_request)
         mock_logger.exception.assert_called_once_with(
             "Encountered exception while converting database to parquet file."
         )
@@ -96,23 +166,188 @@ class TestExportCache:
         )
         assert conversion_error.value.status_code == 500
 
+    def test_redis_backend(self, mock_request, mock_snapshot):
+        with patch(module_path.format("cache_databases"), []):
+            with pytest.raises(HTTPException) as http_exception:
+                export_cache(mock_request)
+
+        assert http_exception.value.status_code == 501
+        mock_snapshot.state.assert_not_called()
+
+
+class TestRefreshSnapshot:
+    def setup_class(self):
+        self.vins = [f"1XP5DB9X7YN5261{index:02d}" for index in range(6)]
+
+    def test_unchanged_snapshot_is_reused(self, temporary_database, snapshot_path):
+        cache_vins(temporary_database, self.vins[:3])
+        manifest = refresh_snapshot(read_database_state())
+
+        with patch(module_path.format("write_snapshot_part")) as mock_write_part:
+            assert refresh_snapshot(read_database_state()) == manifest
+        mock_write_part.assert_not_called()
 
-class TestConvertDatabaseToParquet:
-    def test_success(self, mock_database_connection, mock_pandas):
-        convert_database_to_parquet()
-        mock_pandas.read_sql_query.assert_called_once_with(
-            f"SELECT * FROM {vin_table_name}",
-            mock_database_connection.get_engine.return_value,
+    def test_new_rows_are_appended(self, temporary_database, snapshot_path):
+        cache_vins(temporary_database, self.vins[:3])
+        first_manifest = refresh_snapshot(read_database_state())
+        cache_vins(temporary_database, self.vins[3:])
+
+        manifest = refresh_snapshot(read_database_state())
+
+        assert manifest["parts"][0] == first_manifest["parts"][0]
+        assert len(manifest["parts"]) == 2
+        table = read_snapshot(manifest).read(use_threads=False)
+        assert table.column("vin").to_pylist() == self.vins
+
+    def test_delete_rebuilds_snapshot(self, temporary_database, snapshot_path):
+        cache = cache_vins(temporary_database, self.vins[:3])
+        refresh_snapshot(read_database_state())
+        cache_vins(temporary_database, self.vins[3:])
+        refresh_snapshot(read_database_state())
+        cache.delete(self.vins[0])
+
+        manifest = refresh_snapshot(read_database_state())
+
+        assert len(manifest["parts"]) == 1
+        assert sorted(os.listdir(snapshot_path)) == sorted(
+            manifest["parts"] + ["manifest.json"]
         )
-        mock_pandas.read_sql_query.return_value.to_parquet.assert_called_once_with(
-            vin_parquet_path
+        table = read_snapshot(manifest).read(use_threads=False)
+        assert table.column("vin").to_pylist() == self.vins[1:]
+
+    def test_format_change_rebuilds_snapshot(self, temporary_database, snapshot_path):
+        cache_vins(temporary_database, self.vins[:3])
+        manifest = refresh_snapshot(read_database_state())
+
+        with patch(module_path.format("snapshot_format"), "another format"):
+            rebuilt_manifest = refresh_snapshot(read_database_state())
+
+        assert rebuilt_manifest["format"] == "another format"
+        assert rebuilt_manifest["parts"] == manifest["parts"]
+        assert read_snapshot(rebuilt_manifest).metadata.num_rows == 3
+
+    def test_too_many_parts_are_compacted(self, temporary_database, snapshot_path):
+        with patch(module_path.format("export_snapshot_max_parts"), 2):
+            for vin in self.vins[:3]:
+                cache_vins(temporary_database, [vin])
+                manifest = refresh_snapshot(read_database_state())
+
+        assert len(manifest["parts"]) == 1
+        assert read_snapshot(manifest).metadata.num_rows == 3
+
+
+class TestShardedExport:
+    def setup_class(self):
+        self.vins = [f"1XP5DB9X7YN5261{index:02d}" for index in range(8)]
+
+    def test_shards_are_merged(self, shard_databases, snapshot_path):
+        cache = ShardedSqliteCache(shard_databases)
+        cache.set_many({vin: {"Make": "PETERBILT"} for vin in self.vins[:4]})
+        first_manifest = refresh_snapshot(read_database_state())
+        cache.set_many({vin: {"Make": "PETERBILT"} for vin in self.vins[4:]})
+
+        database_state = read_database_state()
+        manifest = refresh_snapshot(database_state)
+
+        assert database_state["version"] == cache.get_versions()["version"]
+        assert len(database_state["max_rowids"]) == 2
+        assert manifest["parts"][0] == first_manifest["parts"][0]
+        assert len(manifest["parts"]) == 2
+        table = read_snapshot(manifest).read(use_threads=False)
+        assert sorted(table.column("vin").to_pylist()) == self.vins
+
+    def test_delete_in_one_shard_rebuilds_snapshot(
+        self, shard_databases, snapshot_path
+    ):
+        cache = ShardedSqliteCache(shard_databases)
+        cache.set_many({vin: {"Make": "PETERBILT"} for vin in self.vins})
+        refresh_snapshot(read_database_state())
+        cache.delete(self.vins[0])
+
+        manifest = refresh_snapshot(read_database_state())
+
+        assert len(manifest["parts"]) == 1
+        table = read_snapshot(manifest).read(use_threads=False)
+        assert sorted(table.column("vin").to_pylist()) == self.vins[1:]
+
+
+class TestGenerateParquetChunks:
+    def test_one_row_group_per_batch(self, temporary_database):
+        vins = [f"1XP5DB9X7YN5261{index:02d}" for index in range(5)]
+        cache_vins(temporary_database, vins)
+
+        chunks = list(generate_parquet_chunks(batch_size=2))
+
+        assert len(chunks) > 1
+        parquet_file = read_parquet(b"".join(chunks))
+        assert parquet_file.metadata.num_row_groups == 3
+        table = parquet_file.read(use_threads=False)
+        assert table.column("vin").to_pylist() == vins
+
+    def test_typed_columns(self, temporary_database):
+        cache = SqliteCache(temporary_database)
+        cache.set(
+            "1XPWD40X1ED215313",
+            {
+                "Make": "PETERBILT",
+                "Model": "388",
+                "Model Year": "2014",
+                "Body Class": "Truck-Tractor",
+                "Input VIN Requested": "1XPWD40X1ED215313",
+            },
         )
+        cache.set("1XP5DB9X7YN526158", {"Make": "PETERBILT", "Model Year": None})
 
-    def test_failure(self, mock_database_connection, mock_pandas):
+        parquet_file = read_parquet(b"".join(generate_parquet_chunks()))
+
+        assert parquet_file.schema_arrow.field("model_year").type == pa.int16()
+        assert pa.types.is_dictionary(
+            parquet_file.schema_arrow.field("body_class").type
+        )
+        assert pa.types.is_timestamp(parquet_file.schema_arrow.field("cached_at").type)
+        assert parquet_file.metadata.row_group(0).column(0).compression == "ZSTD"
+        rows = parquet_file.read(use_threads=False).to_pylist()
+        assert rows[0]["model_year"] == 2014
+        assert rows[0]["body_class"] == "Truck-Tractor"
+        assert rows[0]["cached_at"] is not None
+        assert rows[1]["model"] is None
+        assert rows[1]["model_year"] is None
+
+    def test_rowid_range(self, temporary_database):
+        vins = [f"1XP5DB9X7YN5261{index:02d}" for index in range(5)]
+        cache_vins(temporary_database, vins)
+
+        chunks = list(generate_parquet_chunks(after_rowids=[1], until_rowids=[3]))
+
+        table = read_parquet(b"".join(chunks)).read(use_threads=False)
+        assert table.column("vin").to_pylist() == vins[1:3]
+
+    def test_empty_table(self, temporary_database):
+        chunks = list(generate_parquet_chunks())
+
+        assert len(chunks) == 1
+        assert read_parquet(chunks[0]).metadata.num_rows == 0
+
+    def test_failure(self, mock_database_connection):
+        mock_database_connection.get_engine.side_effect = Exception
         with pytest.raises(DatabaseToParquetError) as conversion_error:
-            mock_pandas.read_sql_query.side_effect = Exception
-            convert_database_to_parquet()
+            next(generate_parquet_chunks())
         assert (
             str(conversion_error.value)
             == "Encountered exception while converting database to parquet file."
         )
+
+
+class TestParseModelYear:
+    @pytest.mark.parametrize(
+        "model_year, expected",
+        [
+            ("2014", 2014),
+            (2021, 2021),
+            (None, None),
+            ("", None),
+            ("Not Applicable", None),
+        ],
+    )
+    def test_parse(self, model_year, expected):
+        assert parse_model_year(model_year) == expected
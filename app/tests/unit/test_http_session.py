@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from app.http_session import HttpSession
+
+
+class TestHttpSession:
+    @pytest.mark.asyncio
+    async def test_session_is_shared(self):
+        session = HttpSession.get_session()
+        try:
+            assert HttpSession.get_session() is session
+            assert session.connector.limit > 0
+            assert session.timeout.total is not None
+        finally:
+            await HttpSession.close()
+        assert session.closed
+
+    @pytest.mark.asyncio
+    async def test_closed_session_is_replaced(self):
+        session = HttpSession.get_session()
+        await HttpSession.close()
+        new_session = HttpSession.get_session()
+        try:
+            assert new_session is not session
+            assert not new_session.closed
+        finally:
+            await HttpSession.close()
+
+    def test_new_loop_gets_new_session(self):
+        async def get_session():
+            session = HttpSession.get_session()
+            await HttpSession.close()
+            return session
+
+        first = asyncio.run(get_session())
+        second = asyncio.run(get_session())
+
+        assert first is not second
@@ -0,0 +1,259 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock, patch
+
+from app.importer import ParquetToDatabaseError, import_parquet
+from app.main import app
+from app.routers import importer
+from app.routers.export import build_export_table
+from app.vin_validation import compute_check_digit
+from caching.negative_cache import NegativeCache
+from caching.sqlite_cache import REWRITE_VERSION, VERSION, SqliteCache
+from models.database_models import Vin
+
+client = TestClient(app)
+
+FETCHED_AT = datetime(2023, 6, 1, 12, 0)
+
+
+def make_vin(serial: int) -> str:
+    vin = f"1XPWD40X0ED{serial:06d}"
+    return vin[:8] + compute_check_digit(vin) + vin[9:]
+
+
+VINS = [make_vin(serial) for serial in range(5)]
+
+
+def write_export(path, vins, make="PETERBILT", fetched_at=FETCHED_AT) -> str:
+    rows = [(vin, make, "389", 2014, "Truck", fetched_at) for vin in vins]
+    pq.write_table(build_export_table(rows), str(path), row_group_size=2)
+    return str(path)
+
+
+def read_vins_table(database):
+    db_session = database.get_session()
+    try:
+        return {row.vin: row for row in db_session.query(Vin)}
+    finally:
+        db_session.close()
+
+
+class TestImportParquet:
+    def test_round_trip(self, tmp_path, temporary_database):
+        path = write_export(tmp_path / "vins.parquet", VINS)
+
+        counts = import_parquet(path, temporary_database, batch_size=2)
+
+        assert counts == {"rows": 5, "written": 5, "invalid": 0}
+        rows = read_vins_table(temporary_database)
+        assert set(rows) == set(VINS)
+        assert rows[VINS[0]].to_vehicle_details() == {
+            "Make": "PETERBILT",
+            "Model": "389",
+            "Model Year": "2014",
+            "Body Class": "Truck",
+            "Input VIN Requested": VINS[0],
+        }
+        assert rows[VINS[0]].fetched_at == FETCHED_AT
+        assert rows[VINS[0]].source == "import"
+
+    def test_rows_are_written_in_several_transactions(
+        self, tmp_path, temporary_database
+    ):
+        path = write_export(tmp_path / "vins.parquet", VINS)
+
+        transactions = []
+
+        def import_rows(self, rows, on_conflict):
+            transactions.append([row["vin"] for row in rows])
+            return len(transactions[-1])
+
+        with patch.object(SqliteCache, "import_rows", import_rows):
+            counts = import_parquet(path, temporary_database, transaction_rows=2)
+
+        assert transactions == [VINS[:2], VINS[2:4], VINS[4:]]
+        assert counts["written"] == 5
+
+    def test_invalid_vins_are_skipped(self, tmp_path, temporary_database):
+        path = tmp_path / "vins.parquet"
+        pq.write_table(pa.table({"vin": [VINS[0], "InvalidVIN", None]}), str(path))
+
+        counts = import_parquet(str(path), temporary_database)
+
+        assert counts == {"rows": 3, "written": 1, "invalid": 2}
+        assert read_vins_table(temporary_database)[VINS[0]].make is None
+
+    def test_replace(self, tmp_path, temporary_database):
+        old_path = write_export(tmp_path / "old.parquet", VINS[:2])
+        import_parquet(old_path, temporary_database)
+        path = write_export(tmp_path / "new.parquet", VINS, make="KENWORTH")
+        versions = SqliteCache(temporary_database).get_versions()
+
+        counts = import_parquet(path, temporary_database, on_conflict="replace")
+
+        assert counts["written"] == 5
+        rows = read_vins_table(temporary_database)
+        assert {row.make for row in rows.values()} == {"KENWORTH"}
+        new_versions = SqliteCache(temporary_database).get_versions()
+        assert new_versions[REWRITE_VERSION] == versions[REWRITE_VERSION] + 1
+
+    def test_skip(self, tmp_path, temporary_database):
+        old_path = write_export(tmp_path / "old.parquet", VINS[:2])
+        import_parquet(old_path, temporary_database)
+        path = write_export(tmp_path / "new.parquet", VINS, make="KENWORTH")
+        versions = SqliteCache(temporary_database).get_versions()
+
+        counts = import_parquet(path, temporary_database, on_conflict="skip")
+
+        assert counts["written"] == 3
+        rows = read_vins_table(temporary_database)
+        assert rows[VINS[0]].make == "PETERBILT"
+        assert rows[VINS[4]].make == "KENWORTH"
+        new_versions = SqliteCache(temporary_database).get_versions()
+        assert new_versions[VERSION] == versions[VERSION] + 1
+        assert new_versions[REWRITE_VERSION] == versions[REWRITE_VERSION]
+
+    def test_newer(self, tmp_path, temporary_database):
+        old_path = write_export(tmp_path / "old.parquet", VINS[:2])
+        import_parquet(old_path, temporary_database)
+        import_parquet(
+            write_export(
+                tmp_path / "newer.parquet",
+                VINS[:1],
+                make="KENWORTH",
+                fetched_at=FETCHED_AT + timedelta(days=1),
+            ),
+            temporary_database,
+            on_conflict="newer",
+        )
+        path = write_export(
+            tmp_path / "older.parquet",
+            VINS[1:2],
+            make="KENWORTH",
+            fetched_at=FETCHED_AT - timedelta(days=1),
+        )
+
+        counts = import_parquet(path, temporary_database, on_conflict="newer")
+
+        assert counts["written"] == 0
+        rows = read_vins_table(temporary_database)
+        assert rows[VINS[0]].make == "KENWORTH"
+        assert rows[VINS[1]].make == "PETERBILT"
+
+    def test_imported_vins_leave_the_negative_cache(self, tmp_path, temporary_database):
+        negative_cache = NegativeCache(temporary_database, ttl=None)
+        negative_cache.set(VINS[0])
+        path = write_export(tmp_path / "vins.parquet", VINS)
+
+        import_parquet(path, temporary_database)
+
+        assert negative_cache.get(VINS[0]) is None
+
+    def test_not_a_parquet_file(self, tmp_path, temporary_database):
+        path = tmp_path / "vins.parquet"
+        path.write_bytes(b"vin\n")
+
+        with pytest.raises(ParquetToDatabaseError):
+            import_parquet(str(path), temporary_database)
+
+    def test_no_vin_column(self, tmp_path, temporary_database):
+        path = tmp_path / "vins.parquet"
+        pq.write_table(pa.table({"make": ["PETERBILT"]}), str(path))
+
+        with pytest.raises(ParquetToDatabaseError):
+            import_parquet(str(path), temporary_database)
+
+    def test_unknown_conflict_policy(self, tmp_path, temporary_database):
+        path = write_export(tmp_path / "vins.parquet", VINS)
+
+        with pytest.raises(ParquetToDatabaseError):
+            import_parquet(path, temporary_database, on_conflict="merge")
+
+    def test_cached_at_in_another_time_zone(self, tmp_path, temporary_database):
+        path = tmp_path / "vins.parquet"
+        cached_at = pa.array(
+            [datetime(2023, 6, 1, 7, tzinfo=timezone(timedelta(hours=-5)))],
+            pa.timestamp("us", tz="America/New_York"),
+        )
+        pq.write_table(pa.table({"vin": [VINS[0]], "cached_at": cached_at}), str(path))
+
+        import_parquet(str(path), temporary_database)
+
+        assert read_vins_table(temporary_database)[VINS[0]].fetched_at == FETCHED_AT
+
+
+class TestImportEndpoint:
+    @pytest.fixture
+    def mock_cache(self):
+        with patch.object(importer, "cache") as dummy_cache:
+            yield dummy_cache
+
+    def test_body_is_imported_from_a_temporary_file(self, tmp_path, mock_cache):
+        content = open(write_export(tmp_path / "vins.parquet", VINS), "rb").read()
+        received_rows = []
+
+        def mock_import_parquet(path, databases, on_conflict, negative_cache):
+            received_rows.append(pq.read_table(path).num_rows)
+            return {"rows": 5, "written": 5, "invalid": 0}
+
+        with patch.object(
+            importer, "import_parquet", side_effect=mock_import_parquet
+        ) as mock_import:
+            response = client.post("/import?on_conflict=newer", content=content)
+
+        assert response.status_code == 200
+        assert response.json() == {"rows": 5, "written": 5, "invalid": 0}
+        assert received_rows == [5]
+        assert mock_import.call_args.kwargs == {
+            "on_conflict": "newer",
+            "negative_cache": importer.negative_cache,
+        }
+        assert not os.path.exists(mock_import.call_args.args[0])
+        assert mock_import.call_args.args[1] is importer.cache_databases
+        mock_cache.clear.assert_called_once()
+
+    def test_skip_keeps_the_memory_tier(self, mock_cache):
+        with patch.object(importer, "import_parquet", return_value={}):
+            client.post("/import?on_conflict=skip", content=b"")
+
+        mock_cache.clear.assert_not_called()
+
+    def test_invalid_file(self, mock_cache):
+        response = client.post("/import", content=b"not parquet")
+
+        assert response.status_code == 400
+
+    def test_unknown_conflict_policy(self, mock_cache):
+        response = client.post("/import?on_conflict=merge", content=b"")
+
+        assert response.status_code == 400
+
+    def test_redis_backend(self, mock_cache):
+        with patch.object(importer, "cache_databases", []), patch.object(
+            importer, "import_parquet"
+        ) as mock_import:
+            response = client.post("/import", content=b"")
+
+        assert response.status_code == 501
+        mock_import.assert_not_called()
+        mock_cache.clear.assert_not_called()
+
+    def test_database_error(self, mock_cache):
+        with patch.object(importer, "import_parquet", side_effect=OSError("disk full")):
+            response = client.post("/import", content=b"")
+
+        assert response.status_code == 500
+
+    def test_import_already_running(self, mock_cache):
+        running_lock = MagicMock()
+        running_lock.locked.return_value = True
+
+        with patch.object(importer, "import_lock", running_lock):
+            response = client.post("/import", content=b"")
+
+        assert response.status_code == 409
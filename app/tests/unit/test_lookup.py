@@ -1,37 +1,104 @@
+from datetime import datetime, timedelta
+
 from aiohttp import ClientError, ClientResponseError
 import pytest
-from fastapi import HTTPException
-from unittest.mock import patch
+from fastapi import HTTPException, Response
+from unittest.mock import AsyncMock, MagicMock, patch
 from requests.exceptions import RequestException
 
-from app.routers.lookup import lookup_vehicle_details, make_request
-from app.config import vpic_api_url
+from app.routers.lookup import (
+    lookup_vehicle_details,
+    is_stale,
+    lookup_vehicle_details_batch,
+    make_batch_request,
+    make_request,
+)
+from app.utils import build_batch_response
+from models.parsing_models import BatchLookupRequest
+from app.config import vpic_api_url, vpic_batch_api_url
+from caching.cache_interface import CacheEntry, EncodedEntry
+from caching.codecs import encode_response
+from caching.memory_cache import MemoryCache
+from app.prefix_decoder import PrefixDecoder
+from app.rate_limiter import RateLimiter
+from app.refresher import Refresher
+from app.resilience import (
+    CircuitBreaker,
+    UpstreamError,
+    UpstreamPolicy,
+    UpstreamUnavailableError,
+)
+from caching.negative_cache import NegativeCache
 
 module_path = "app.routers.lookup.{}"
 
 
 @pytest.fixture
 def mock_cache():
-    with patch(module_path.format("cache")) as dummy_cache:
+    with patch(module_path.format("cache"), spec=MemoryCache) as dummy_cache:
         yield dummy_cache
 
 
+@pytest.fixture(autouse=True)
+def mock_negative_cache():
+    with patch(
+        module_path.format("negative_cache"), spec=NegativeCache
+    ) as dummy_negative_cache:
+        dummy_negative_cache.aget.return_value = None
+        dummy_negative_cache.aget_many.return_value = {}
+        yield dummy_negative_cache
+
+
+@pytest.fixture(autouse=True)
+def mock_prefix_decoder():
+    with patch(
+        module_path.format("prefix_decoder"), spec=PrefixDecoder
+    ) as dummy_prefix_decoder:
+        dummy_prefix_decoder.decode.return_value = {}
+        yield dummy_prefix_decoder
+
+
+@pytest.fixture
+def mock_stale_refreshes():
+    with patch(
+        module_path.format("stale_refreshes"), spec=Refresher
+    ) as dummy_stale_refreshes:
+        yield dummy_stale_refreshes
+
+
 @pytest.fixture
 def mock_request():
     with patch(module_path.format("Request")) as mock_request:
         yield mock_request
 
 
-@pytest.fixture
-def mock_response():
-    with patch(module_path.format("Response")) as mock_response:
-        yield mock_response
+@pytest.fixture(autouse=True)
+def mock_vpic_upstream():
+    vpic_upstream = UpstreamPolicy(
+        CircuitBreaker(failure_threshold=100, reset_timeout=30),
+        RateLimiter(None),
+        max_retries=2,
+        backoff=0,
+        backoff_max=0,
+    )
+    with patch(module_path.format("vpic_upstream"), vpic_upstream):
+        yield vpic_upstream
 
 
 @pytest.fixture
 def mock_session():
-    with patch(module_path.format("aiohttp.ClientSession")) as mock_session:
-        yield mock_session
+    with patch(module_path.format("HttpSession")) as mock_session:
+        yield mock_session.get_session.return_value
+
+
+@pytest.fixture
+def mock_response(mock_session):
+    # Only json() is awaited, raise_for_status() is not.
+    response = MagicMock()
+    response.json = AsyncMock()
+    mock_session.get.return_value.__aenter__.return_value = response
+    mock_session.post.return_value.__aenter__.return_value = response
+    yield response
 
 
 @pytest.fixture
@@ -52,6 +119,12 @@ def mock_make_request():
         yield mock_make_request
 
 
+@pytest.fixture
+def mock_make_batch_request():
+    with patch(module_path.format("make_batch_request")) as mock_make_batch_request:
+        yield mock_make_batch_request
+
+
 @pytest.fixture
 def mock_build_response():
     with patch(module_path.format("build_response")) as mock_build_response:
@@ -62,6 +135,12 @@ class TestLookUpVehicleDetails:
     def setup_class(self):
         self.valid_vin = "1XP5DB9X7YN526158"
 
+    @pytest.fixture(autouse=True)
+    def dict_cache_hits(self):
+        with patch(module_path.format("lookup_raw_cache_hits"), False):
+            yield
+
+    @pytest.mark.asyncio
     async def test_vin_less_than_17_chars(self, mock_request):
         with pytest.raises(HTTPException) as http_exception:
             mock_request.query_params.get.return_value = "dummy_vin"
@@ -73,6 +152,7 @@ class TestLookUpVehicleDetails:
             == "VIN should be a 17 characters alpha-numeric string."
         )
 
+    @pytest.mark.asyncio
     async def test_vin_not_alnum(self, mock_request):
         with pytest.raises(HTTPException) as http_exception:
             mock_request.query_params.get.return_value = "-----------------"
@@ -85,15 +165,71 @@ class TestLookUpVehicleDetails:
             == "VIN should be a 17 characters alpha-numeric string."
         )
 
+    @pytest.mark.asyncio
+    async def test_wrong_check_digit(self, mock_cache, mock_request):
+        with pytest.raises(HTTPException) as http_exception, patch(
+            module_path.format("vin_strict_validation"), True
+        ):
+            mock_request.query_params.get.return_value = "1XP5DB9X6YN526158"
+            await lookup_vehicle_details(mock_request)
+
+        assert http_exception.value.status_code == 400
+        assert (
+            http_exception.value.detail
+            == "VIN check digit at position 9 does not match the rest of the VIN."
+        )
+        mock_cache.aget_entry.assert_not_called()
+
+    @pytest.mark.asyncio
     async def test_vin_in_cache(self, mock_cache, mock_request, mock_logger):
         mock_request.query_params.get.return_value = self.valid_vin
-        mock_cache.get.return_value = {"dummy_key": "dummy_val"}
+        mock_cache.aget_entry.return_value = CacheEntry(
+            {"dummy_key": "dummy_val"}, datetime.utcnow()
+        )
         result = await lookup_vehicle_details(mock_request)
 
-        assert result == {"dummy_key": "dummy_val", "Cached Result?": True}
+        assert result == {
+            "dummy_key": "dummy_val",
+            "Cached Result?": True,
+            "Source": "cache",
+        }
+
+        mock_cache.aget_entry.assert_awaited_once_with(self.valid_vin)
+
+    @pytest.mark.asyncio
+    async def test_fresh_vin_is_not_refreshed(
+        self, mock_cache, mock_request, mock_stale_refreshes
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry(
+            {"Make": "PETERBILT"}, datetime.utcnow()
+        )
+
+        await lookup_vehicle_details(mock_request)
 
-        mock_cache.get.assert_called_once_with(self.valid_vin)
+        mock_stale_refreshes.schedule.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_stale_vin_is_served_and_refreshed(
+        self, mock_cache, mock_request, mock_stale_refreshes, mock_make_request
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry(
+            {"Make": "PETERBILT"}, datetime(2000, 1, 1)
+        )
+
+        result = await lookup_vehicle_details(mock_request)
+
+        assert result == {
+            "Make": "PETERBILT",
+            "Cached Result?": True,
+            "Source": "cache",
+        }
+        mock_stale_refreshes.schedule.assert_called_once()
+        assert mock_stale_refreshes.schedule.call_args.args[0] == self.valid_vin
+        mock_make_request.assert_not_called()
+
+    @pytest.mark.asyncio
     async def test_vin_not_in_cache(
         self,
         mock_cache,
@@ -103,66 +239,502 @@ class TestLookUpVehicleDetails:
         mock_build_response,
     ):
         mock_request.query_params.get.return_value = self.valid_vin
-        mock_cache.get.return_value = None
+        mock_cache.aget_entry.return_value = CacheEntry({})
         mock_make_request.return_value = {"dummy_key": "dummy_val"}
         mock_build_response.return_value = {"new_key": "new_val"}
 
         result = await lookup_vehicle_details(mock_request)
 
-        assert result == {"new_key": "new_val", "Cached Result?": False}
-        mock_cache.get.assert_called_once_with(self.valid_vin)
+        assert result == {
+            "new_key": "new_val",
+            "Cached Result?": False,
+            "Source": "vpic",
+        }
+        mock_cache.aget_entry.assert_awaited_once_with(self.valid_vin)
         mock_make_request.assert_called_once_with(self.valid_vin)
-        mock_cache.set.assert_called_once_with(
-            self.valid_vin, mock_build_response.return_value
+        mock_cache.aset_many.assert_awaited_once_with(
+            {self.valid_vin: mock_build_response.return_value}
         )
         mock_logger.debug.assert_any_call(
             f"No vehicle details present in the cache for {self.valid_vin}. Querying the vPIC API."
         )
 
+    @pytest.mark.asyncio
+    async def test_vin_decoded_locally(
+        self, mock_cache, mock_request, mock_prefix_decoder, mock_make_request
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry({})
+        mock_prefix_decoder.decode.return_value = {"Make": "PETERBILT"}
 
-class TestMakeRequest:
+        result = await lookup_vehicle_details(mock_request)
+
+        assert result == {
+            "Make": "PETERBILT",
+            "Cached Result?": False,
+            "Source": "prefix_decoder",
+        }
+        mock_prefix_decoder.decode.assert_called_once_with(self.valid_vin)
+        mock_make_request.assert_not_called()
+        mock_cache.aset_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_vin_not_decodable(
+        self,
+        mock_cache,
+        mock_negative_cache,
+        mock_request,
+        mock_make_request,
+        mock_build_response,
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry({})
+        mock_build_response.return_value = {}
+
+        with pytest.raises(HTTPException) as http_exception:
+            await lookup_vehicle_details(mock_request)
+
+        assert http_exception.value.status_code == 404
+        mock_cache.aset_many.assert_not_called()
+        mock_negative_cache.aset_many.assert_awaited_once()
+        assert list(mock_negative_cache.aset_many.await_args.args[0]) == [
+            self.valid_vin
+        ]
+
+    @pytest.mark.asyncio
+    async def test_upstream_unavailable(
+        self, mock_cache, mock_negative_cache, mock_request, mock_make_request
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry({})
+        mock_make_request.side_effect = UpstreamUnavailableError(
+            "circuit open", retry_after=12.5
+        )
+
+        with pytest.raises(HTTPException) as http_exception:
+            await lookup_vehicle_details(mock_request)
+
+        assert http_exception.value.status_code == 503
+        assert http_exception.value.headers == {"Retry-After": "13"}
+        mock_negative_cache.aset_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_upstream_error(
+        self, mock_cache, mock_negative_cache, mock_request, mock_make_request
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry({})
+        mock_make_request.side_effect = UpstreamError("Service Unavailable", 503)
+
+        with pytest.raises(HTTPException) as http_exception:
+            await lookup_vehicle_details(mock_request)
+
+        assert http_exception.value.status_code == 502
+        mock_negative_cache.aset_many.assert_not_called()
+        mock_cache.aset_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_vin_in_negative_cache(
+        self, mock_cache, mock_negative_cache, mock_request, mock_make_request
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_entry.return_value = CacheEntry({})
+        mock_negative_cache.aget.return_value = datetime.utcnow()
+
+        with pytest.raises(HTTPException) as http_exception:
+            await lookup_vehicle_details(mock_request)
+
+        assert http_exception.value.status_code == 404
+        assert (
+            http_exception.value.detail
+            == f"The API returned no valid values for the inputted vin: {self.valid_vin}"
+        )
+        mock_negative_cache.aget.assert_awaited_once_with(self.valid_vin)
+        mock_make_request.assert_not_called()
+
+
+class TestLookUpVehicleDetailsRawHits:
     def setup_class(self):
         self.valid_vin = "1XP5DB9X7YN526158"
 
-    async def test_client_response_error(
-        self, mock_session, mock_logger, mock_response
+    @pytest.fixture(autouse=True)
+    def raw_cache_hits(self):
+        with patch(module_path.format("lookup_raw_cache_hits"), True):
+            yield
+
+    @pytest.mark.asyncio
+    async def test_vin_in_cache(self, mock_cache, mock_request, mock_stale_refreshes):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_encoded_entry.return_value = EncodedEntry(
+            encode_response({"Make": "PETERBILT"}), datetime.utcnow()
+        )
+
+        response = await lookup_vehicle_details(mock_request)
+
+        assert isinstance(response, Response)
+        assert response.media_type == "application/json"
+        assert response.body == encode_response(
+            {"Make": "PETERBILT", "Cached Result?": True, "Source": "cache"}
+        )
+        mock_cache.aget_encoded_entry.assert_awaited_once_with(self.valid_vin)
+        mock_cache.aget_entry.assert_not_called()
+        mock_stale_refreshes.schedule.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_stale_vin_is_served_and_refreshed(
+        self, mock_cache, mock_request, mock_stale_refreshes
     ):
-        mock_session.return_value.__aenter__.return_value.get.side_effect = (
-            ClientResponseError
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_encoded_entry.return_value = EncodedEntry(
+            encode_response({"Make": "PETERBILT"}), datetime(2000, 1, 1)
         )
+
+        await lookup_vehicle_details(mock_request)
+
+        mock_stale_refreshes.schedule.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_vin_not_in_cache(
+        self, mock_cache, mock_request, mock_make_request, mock_build_response
+    ):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.aget_encoded_entry.return_value = EncodedEntry(None)
+        mock_build_response.return_value = {"Make": "PETERBILT"}
+
+        result = await lookup_vehicle_details(mock_request)
+
+        assert result == {
+            "Make": "PETERBILT",
+            "Cached Result?": False,
+            "Source": "vpic",
+        }
+        mock_make_request.assert_called_once_with(self.valid_vin)
+
+
+class TestIsStale:
+    def test_is_stale(self):
+        now = datetime.utcnow()
+
+        assert not is_stale(now - timedelta(seconds=30), ttl=60)
+        assert is_stale(now - timedelta(seconds=90), ttl=60)
+        assert is_stale(None, ttl=60)
+        assert not is_stale(None, ttl=None)
+
+
+class TestMakeRequest:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+        self.url = vpic_api_url.format(self.valid_vin)
+
+    @pytest.mark.asyncio
+    async def test_success(self, mock_session, mock_response):
+        mock_response.json.return_value = {"Results": [{"Variable": "Make"}]}
+
         result = await make_request(self.valid_vin)
-        assert result == mock_response.return_value
-        mock_response.assert_called_once_with(
-            content=str(
-                "'coroutine' object does not support the asynchronous context manager protocol"
-            ),
-            status_code=500,
+
+        assert result == [{"Variable": "Make"}]
+        mock_session.get.assert_called_once_with(self.url)
+        mock_response.raise_for_status.assert_called_once_with()
+        mock_response.json.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_client_response_error_is_retried(self, mock_session, mock_logger):
+        error = ClientResponseError(
+            MagicMock(real_url=self.url), (), status=503, message="Service Unavailable"
         )
+        mock_session.get.side_effect = error
+
+        with pytest.raises(UpstreamError) as upstream_error:
+            await make_request(self.valid_vin)
+
+        assert upstream_error.value.status == 503
+        assert mock_session.get.call_count == 3
+        mock_logger.exception.assert_called_once_with(
+            f"Encountered exception while making request to {self.url}"
+        )
+
+    @pytest.mark.asyncio
+    async def test_client_error_is_retried(
+        self, mock_session, mock_response, mock_logger
+    ):
+        mock_response.json.return_value = {"Results": [{"Variable": "Make"}]}
+        mock_session.get.side_effect = [
+            ClientError("connection reset"),
+            mock_session.get.return_value,
+        ]
 
-    async def test_client_error(self, mock_session, mock_logger, mock_response):
-        mock_session.return_value.__aenter__.return_value.get.side_effect = ClientError
         result = await make_request(self.valid_vin)
-        assert result == mock_response.return_value
-        mock_response.assert_called_once_with(
-            content=str(
-                "'coroutine' object does not support the asynchronous context manager protocol"
-            ),
-            status_code=500,
+
+        assert result == [{"Variable": "Make"}]
+        assert mock_session.get.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_client_error_status_is_not_retried(self, mock_session, mock_logger):
+        mock_session.get.side_effect = ClientResponseError(
+            MagicMock(real_url=self.url), (), status=400, message="Bad Request"
         )
+
+        with pytest.raises(UpstreamError) as upstream_error:
+            await make_request(self.valid_vin)
+
+        assert upstream_error.value.status == 400
+        mock_session.get.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_exception(self, mock_session, mock_logger):
+        mock_session.get.side_effect = Exception("unexpected")
+
+        with pytest.raises(UpstreamError):
+            await make_request(self.valid_vin)
+
+        mock_session.get.assert_called_once()
         mock_logger.exception.assert_called_once_with(
-            "Encountered exception while making request to https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/1XP5DB9X7YN526158?format=json"
+            f"Encountered exception while making request to {self.url}"
         )
 
-    async def test_exception(self, mock_session, mock_logger, mock_response):
-        mock_session.return_value.__aenter__.return_value.get.side_effect = Exception
-        result = await make_request(self.valid_vin)
-        assert result == mock_response.return_value
-        mock_response.assert_called_once_with(
-            content=str(
-                "'coroutine' object does not support the asynchronous context manager protocol"
-            ),
-            status_code=500,
+    @pytest.mark.asyncio
+    async def test_circuit_open(self, mock_session, mock_logger, mock_vpic_upstream):
+        for _ in range(mock_vpic_upstream.circuit_breaker.failure_threshold):
+            mock_vpic_upstream.circuit_breaker.record_failure()
+
+        with pytest.raises(UpstreamUnavailableError):
+            await make_request(self.valid_vin)
+
+        mock_session.get.assert_not_called()
+
+
+class TestLookUpVehicleDetailsBatch:
+    def setup_class(self):
+        self.cached_vin = "1XPWD40X1ED215313"
+        self.missing_vin = "1XP5DB9X7YN526158"
+        self.unknown_vin = "WMWRH33565TF85309"
+
+    @pytest.mark.asyncio
+    async def test_hits_and_misses(
+        self, mock_cache, mock_negative_cache, mock_make_batch_request
+    ):
+        mock_cache.aget_many_entries.return_value = {
+            self.cached_vin: CacheEntry({"Make": "PETERBILT"}, datetime.utcnow())
+        }
+        mock_make_batch_request.return_value = (
+            {
+                self.missing_vin: {
+                    "VIN": self.missing_vin,
+                    "Make": "PETERBILT",
+                    "Model": "379",
+                    "ModelYear": "2000",
+                    "BodyClass": "",
+                },
+                self.unknown_vin: {"VIN": self.unknown_vin, "Make": "", "Model": ""},
+            },
+            [],
+        )
+        batch_request = BatchLookupRequest(
+            vins=[
+                self.cached_vin,
+                self.missing_vin,
+                self.unknown_vin,
+                "dummy_vin",
+                "1XP5DB9X7YN52615I",
+            ]
+        )
+
+        result = await lookup_vehicle_details_batch(batch_request)
+
+        missing_details = {
+            "Make": "PETERBILT",
+            "Model": "379",
+            "Model Year": "2000",
+            "Body Class": None,
+            "Input VIN Requested": self.missing_vin,
+        }
+        assert result == {
+            "Results": [
+                {"Make": "PETERBILT", "Cached Result?": True, "Source": "cache"},
+                dict(missing_details, **{"Cached Result?": False, "Source": "vpic"}),
+                {
+                    "Input VIN Requested": self.unknown_vin,
+                    "Error": f"The API returned no valid values for the inputted vin: {self.unknown_vin}",
+                },
+                {
+                    "Input VIN Requested": "dummy_vin",
+                    "Error": "VIN should be a 17 characters alpha-numeric string.",
+                },
+                {
+                    "Input VIN Requested": "1XP5DB9X7YN52615I",
+                    "Error": "VIN should not contain the letters I, O or Q.",
+                },
+            ]
+        }
+        mock_cache.aget_many_entries.assert_called_once_with(
+            [self.cached_vin, self.missing_vin, self.unknown_vin]
+        )
+        mock_make_batch_request.assert_called_once_with(
+            [self.missing_vin, self.unknown_vin]
+        )
+        mock_cache.aset_many.assert_awaited_once_with(
+            {self.missing_vin: missing_details}
+        )
+        mock_negative_cache.aset_many.assert_awaited_once()
+        assert list(mock_negative_cache.aset_many.await_args.args[0]) == [
+            self.unknown_vin
+        ]
+
+    @pytest.mark.asyncio
+    async def test_stale_hit_is_served_and_refreshed(
+        self, mock_cache, mock_stale_refreshes
+    ):
+        mock_cache.aget_many_entries.return_value = {
+            self.cached_vin: CacheEntry({"Make": "PETERBILT"}, datetime(2000, 1, 1))
+        }
+        batch_request = BatchLookupRequest(vins=[self.cached_vin])
+
+        result = await lookup_vehicle_details_batch(batch_request)
+
+        assert result == {
+            "Results": [
+                {"Make": "PETERBILT", "Cached Result?": True, "Source": "cache"}
+            ]
+        }
+        mock_stale_refreshes.schedule.assert_called_once()
+        assert mock_stale_refreshes.schedule.call_args.args[0] == self.cached_vin
+
+    @pytest.mark.asyncio
+    async def test_vins_decoded_locally(
+        self, mock_cache, mock_prefix_decoder, mock_make_batch_request
+    ):
+        mock_cache.aget_many_entries.return_value = {}
+        mock_prefix_decoder.decode.side_effect = lambda vin: (
+            {"Make": "PETERBILT"} if vin == self.missing_vin else {}
+        )
+        mock_make_batch_request.return_value = ({}, [self.unknown_vin])
+        batch_request = BatchLookupRequest(vins=[self.missing_vin, self.unknown_vin])
+
+        result = await lookup_vehicle_details_batch(batch_request)
+
+        assert result["Results"][0] == {
+            "Make": "PETERBILT",
+            "Cached Result?": False,
+            "Source": "prefix_decoder",
+        }
+        mock_make_batch_request.assert_called_once_with([self.unknown_vin])
+
+    @pytest.mark.asyncio
+    async def test_negative_cache_hits_are_not_queried(
+        self, mock_cache, mock_negative_cache, mock_make_batch_request
+    ):
+        mock_cache.aget_many_entries.return_value = {}
+        mock_negative_cache.aget_many.return_value = {
+            self.unknown_vin: datetime.utcnow()
+        }
+        mock_make_batch_request.return_value = ({}, [])
+        batch_request = BatchLookupRequest(vins=[self.missing_vin, self.unknown_vin])
+
+        result = await lookup_vehicle_details_batch(batch_request)
+
+        assert [item["Input VIN Requested"] for item in result["Results"]] == [
+            self.missing_vin,
+            self.unknown_vin,
+        ]
+        assert all("Error" in item for item in result["Results"])
+        mock_negative_cache.aget_many.assert_awaited_once_with(
+            [self.missing_vin, self.unknown_vin]
+        )
+        mock_make_batch_request.assert_called_once_with([self.missing_vin])
+
+    @pytest.mark.asyncio
+    async def test_failed_chunks(
+        self, mock_cache, mock_negative_cache, mock_make_batch_request
+    ):
+        mock_cache.aget_many_entries.return_value = {
+            self.cached_vin: CacheEntry({"Make": "PETERBILT"}, datetime.utcnow())
+        }
+        mock_negative_cache.aget_many.return_value = {}
+        mock_make_batch_request.return_value = ({}, [self.missing_vin])
+        batch_request = BatchLookupRequest(vins=[self.cached_vin, self.missing_vin])
+
+        result = await lookup_vehicle_details_batch(batch_request)
+
+        assert result == {
+            "Results": [
+                {"Make": "PETERBILT", "Cached Result?": True, "Source": "cache"},
+                {
+                    "Input VIN Requested": self.missing_vin,
+                    "Error": "The vPIC API is unavailable, try again later.",
+                },
+            ]
+        }
+        mock_negative_cache.aset_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_every_chunk_failed(
+        self, mock_cache, mock_negative_cache, mock_make_batch_request
+    ):
+        mock_cache.aget_many_entries.return_value = {}
+        mock_negative_cache.aget_many.return_value = {}
+        mock_make_batch_request.return_value = (
+            {},
+            [self.missing_vin, self.unknown_vin],
+        )
+        batch_request = BatchLookupRequest(vins=[self.missing_vin, self.unknown_vin])
+
+        with pytest.raises(HTTPException) as exc_info:
+            await lookup_vehicle_details_batch(batch_request)
+
+        assert exc_info.value.status_code == 503
+        mock_cache.aset_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_all_cached(self, mock_cache, mock_make_batch_request):
+        mock_cache.aget_many_entries.return_value = {
+            self.cached_vin: CacheEntry({"Make": "PETERBILT"}, datetime.utcnow())
+        }
+        batch_request = BatchLookupRequest(vins=[self.cached_vin, self.cached_vin])
+
+        result = await lookup_vehicle_details_batch(batch_request)
+
+        assert result == {
+            "Results": [
+                {"Make": "PETERBILT", "Cached Result?": True, "Source": "cache"}
+            ]
+        }
+        mock_make_batch_request.assert_not_called()
+        mock_cache.aset_many.assert_not_called()
+
+
+class TestMakeBatchRequest:
+    @pytest.mark.asyncio
+    async def test_chunks_requests(self, mock_session, mock_response):
+        vins = [f"1XP5DB9X7YN5261{index:02d}" for index in range(120)]
+        mock_response.json.side_effect = [
+            {"Results": [{"VIN": vin} for vin in vins[start : start + 50]]}
+            for start in range(0, 120, 50)
+        ]
+
+        result, failed_vins = await make_batch_request(vins)
+
+        assert list(result) == vins
+        assert failed_vins == []
+        assert mock_session.post.call_count == 3
+        assert mock_response.raise_for_status.call_count == 3
+        mock_session.post.assert_any_call(
+            vpic_batch_api_url, data={"format": "json", "data": ";".join(vins[:50])}
+        )
+
+    @pytest.mark.asyncio
+    async def test_failed_chunk_is_reported(self, mock_session, mock_logger):
+        mock_session.post.side_effect = ClientError("connection reset")
+
+        assert await make_batch_request(["1XP5DB9X7YN526158"]) == (
+            {},
+            ["1XP5DB9X7YN526158"],
         )
         mock_logger.exception.assert_called_once_with(
-            "Encountered exception while making request to https://vpic.nhtsa.dot.gov/api/vehicles/DecodeVin/1XP5DB9X7YN526158?format=json"
+            f"Encountered exception while making request to {vpic_batch_api_url}"
         )
+
+
+class TestBuildBatchResponse:
+    def test_no_values(self):
+        assert build_batch_response({"Make": "", "BodyClass": ""}, "dummy_vin") == {}
+        assert build_batch_response(None, "dummy_vin") == {}
@@ -0,0 +1,237 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from caching.cache_interface import CacheEntry, DeleteCriteria
+from caching.memory_cache import MemoryCache
+
+module_path = "caching.memory_cache.{}"
+
+
+@pytest.fixture
+def mock_backend():
+    return MagicMock()
+
+
+@pytest.fixture
+def mock_time():
+    with patch(module_path.format("time")) as mock_time:
+        mock_time.monotonic.return_value = 1000.0
+        yield mock_time
+
+
+class TestMemoryCache:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+        self.vehicle_details = {"Make": "PETERBILT", "Model": "388"}
+
+    def test_miss_populates_from_backend(self, mock_backend, mock_time):
+        mock_backend.get.return_value = dict(self.vehicle_details)
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        assert memory_cache.get(self.valid_vin) == self.vehicle_details
+        assert memory_cache.get(self.valid_vin) == self.vehicle_details
+
+        mock_backend.get.assert_called_once_with(self.valid_vin)
+        assert memory_cache.hits == 1
+        assert memory_cache.misses == 1
+
+    def test_backend_miss_is_not_stored(self, mock_backend, mock_time):
+        mock_backend.get.return_value = {}
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        assert memory_cache.get(self.valid_vin) == {}
+        assert memory_cache.stats()["size"] == 0
+
+    def test_returned_dict_is_a_copy(self, mock_backend, mock_time):
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        memory_cache.set(self.valid_vin, dict(self.vehicle_details))
+
+        memory_cache.get(self.valid_vin)["Cached Result?"] = True
+
+        assert memory_cache.get(self.valid_vin) == self.vehicle_details
+
+    def test_local_hits_are_recorded_by_backend(self, mock_backend, mock_time):
+        mock_backend.get.return_value = dict(self.vehicle_details)
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        memory_cache.get(self.valid_vin)
+        memory_cache.get(self.valid_vin)
+
+        # The miss was read from the backend, which counts it itself.
+        mock_backend.record_accesses.assert_called_once_with((self.valid_vin,))
+
+    def test_ttl_expiry(self, mock_backend, mock_time):
+        mock_backend.get.return_value = {}
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        memory_cache.set(self.valid_vin, self.vehicle_details)
+
+        mock_time.monotonic.return_value = 1061.0
+
+        assert memory_cache.get(self.valid_vin) == {}
+        mock_backend.get.assert_called_once_with(self.valid_vin)
+
+    def test_lru_eviction(self, mock_backend, mock_time):
+        memory_cache = MemoryCache(mock_backend, max_size=2, ttl=60)
+        memory_cache.set("VIN00000000000001", {"Make": "A"})
+        memory_cache.set("VIN00000000000002", {"Make": "B"})
+        memory_cache.get("VIN00000000000001")
+        memory_cache.set("VIN00000000000003", {"Make": "C"})
+
+        stats = memory_cache.stats()
+        assert stats["size"] == 2
+        assert stats["evictions"] == 1
+        mock_backend.get.return_value = {}
+        assert memory_cache.get("VIN00000000000002") == {}
+        assert memory_cache.get("VIN00000000000001") == {"Make": "A"}
+
+    def test_delete_evicts_and_deletes_from_backend(self, mock_backend, mock_time):
+        mock_backend.get.return_value = {}
+        mock_backend.delete.return_value = True
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        memory_cache.set(self.valid_vin, self.vehicle_details)
+
+        assert memory_cache.delete(self.valid_vin) is True
+        assert memory_cache.get(self.valid_vin) == {}
+        mock_backend.delete.assert_called_once_with(self.valid_vin)
+
+    def test_delete_matching_drops_matching_entries(self, mock_backend, mock_time):
+        mock_backend.delete_matching.return_value = 3
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        memory_cache.set(self.valid_vin, self.vehicle_details)
+        memory_cache.set("WMWRH33565TF85309", {"Make": "MINI"})
+        criteria = DeleteCriteria(make="PETERBILT")
+
+        assert memory_cache.delete_matching(criteria) == 3
+        mock_backend.delete_matching.assert_called_once_with(criteria)
+        mock_backend.get.return_value = {}
+        assert memory_cache.get(self.valid_vin) == {}
+        assert memory_cache.get("WMWRH33565TF85309") == {"Make": "MINI"}
+
+    def test_get_encoded_entry(self, mock_backend, mock_time):
+        fetched_at = datetime(2023, 6, 1)
+        mock_backend.get_entry.return_value = CacheEntry(
+            dict(self.vehicle_details), fetched_at
+        )
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        encoded_entry = memory_cache.get_encoded_entry(self.valid_vin)
+
+        assert encoded_entry == (b'{"Make":"PETERBILT","Model":"388"}', fetched_at)
+        # Later hits hand out the body built on the first one.
+        assert memory_cache.get_encoded_entry(self.valid_vin).body is encoded_entry.body
+        mock_backend.get_entry.assert_called_once_with(self.valid_vin)
+
+    def test_get_encoded_entry_miss(self, mock_backend, mock_time):
+        mock_backend.get_entry.return_value = CacheEntry({})
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        assert memory_cache.get_encoded_entry(self.valid_vin) == (None, None)
+
+    def test_get_entry_keeps_fetch_time(self, mock_backend, mock_time):
+        fetched_at = datetime(2023, 6, 1)
+        mock_backend.get_entry.return_value = CacheEntry(
+            dict(self.vehicle_details), fetched_at
+        )
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        assert memory_cache.get_entry(self.valid_vin) == (
+            self.vehicle_details,
+            fetched_at,
+        )
+        assert memory_cache.get_entry(self.valid_vin) == (
+            self.vehicle_details,
+            fetched_at,
+        )
+        mock_backend.get_entry.assert_called_once_with(self.valid_vin)
+
+    def test_get_entry_without_fetch_time_asks_backend(self, mock_backend, mock_time):
+        fetched_at = datetime(2023, 6, 1)
+        mock_backend.get.return_value = dict(self.vehicle_details)
+        mock_backend.get_entry.return_value = CacheEntry(
+            dict(self.vehicle_details), fetched_at
+        )
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        memory_cache.get(self.valid_vin)
+
+        assert memory_cache.get_entry(self.valid_vin).fetched_at == fetched_at
+        assert memory_cache.get_entry(self.valid_vin).fetched_at == fetched_at
+        mock_backend.get_entry.assert_called_once_with(self.valid_vin)
+
+    @pytest.mark.asyncio
+    async def test_aget_many_entries(self, mock_backend, mock_time):
+        other_vin = "WMWRH33565TF85309"
+        fetched_at = datetime(2023, 6, 1)
+        mock_backend.aget_many_entries = AsyncMock(
+            return_value={other_vin: CacheEntry(dict(self.vehicle_details), fetched_at)}
+        )
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        memory_cache.set(self.valid_vin, self.vehicle_details)
+
+        entries = await memory_cache.aget_many_entries([self.valid_vin, other_vin])
+
+        assert entries.keys() == {self.valid_vin, other_vin}
+        assert entries[other_vin].fetched_at == fetched_at
+        mock_backend.aget_many_entries.assert_awaited_once_with([other_vin])
+        assert memory_cache.get_many_entries([other_vin]) == {
+            other_vin: (self.vehicle_details, fetched_at)
+        }
+
+    def test_set_records_fetch_time(self, mock_backend, mock_time):
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        before = datetime.utcnow()
+        memory_cache.set(self.valid_vin, self.vehicle_details)
+
+        vehicle_details, fetched_at = memory_cache.get_entry(self.valid_vin)
+        assert vehicle_details == self.vehicle_details
+        assert before <= fetched_at <= datetime.utcnow()
+        mock_backend.get_entry.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_delete_during_read_is_not_undone(self, mock_backend, mock_time):
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        read_started = asyncio.Event()
+        finish_read = asyncio.Event()
+
+        async def read_before_delete(vin):
+            read_started.set()
+            await finish_read.wait()
+            return CacheEntry(dict(self.vehicle_details), datetime(2023, 6, 1))
+
+        mock_backend.aget_entry = AsyncMock(side_effect=read_before_delete)
+        mock_backend.adelete = AsyncMock(return_value=True)
+        read = asyncio.ensure_future(memory_cache.aget_entry(self.valid_vin))
+        await read_started.wait()
+        await memory_cache.adelete(self.valid_vin)
+        finish_read.set()
+
+        assert (await read).value == self.vehicle_details
+        assert memory_cache.stats()["size"] == 0
+        assert memory_cache._reads == {}
+
+    @pytest.mark.asyncio
+    async def test_other_vins_are_filled_during_delete(self, mock_backend, mock_time):
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+        mock_backend.aget_many = AsyncMock(
+            return_value={self.valid_vin: dict(self.vehicle_details)}
+        )
+
+        with memory_cache._backend_read(["WMWRH33565TF85309"]):
+            memory_cache.invalidate("WMWRH33565TF85309")
+            await memory_cache.aget_many([self.valid_vin])
+
+        assert memory_cache.get(self.valid_vin) == self.vehicle_details
+
+    def test_clear_during_read_is_not_undone(self, mock_backend, mock_time):
+        memory_cache = MemoryCache(mock_backend, max_size=10, ttl=60)
+
+        def read_before_clear(vin):
+            memory_cache.clear()
+            return dict(self.vehicle_details)
+
+        mock_backend.get.side_effect = read_before_clear
+
+        assert memory_cache.get(self.valid_vin) == self.vehicle_details
+        assert memory_cache.stats()["size"] == 0
@@ -0,0 +1,139 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.main import app
+from caching.cache_interface import EncodedEntry
+from caching.memory_cache import MemoryCache
+from metrics.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    format_server_timing,
+    server_timings,
+    timed,
+)
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+class TestMetrics:
+    def test_counter(self, registry):
+        counter = Counter("requests_total", "Requests.", ("path",), registry=registry)
+
+        counter.inc("/lookup")
+        counter.inc("/lookup", amount=2)
+
+        assert counter.value("/lookup") == 3
+        assert registry.render() == (
+            "# HELP requests_total Requests.\n"
+            "# TYPE requests_total counter\n"
+            'requests_total{path="/lookup"} 3\n'
+        )
+
+    def test_gauge_function(self, registry):
+        Gauge("size", "Size.", registry=registry, function=lambda: 1.5)
+
+        assert registry.render().splitlines()[-1] == "size 1.5"
+
+    def test_histogram(self, registry):
+        histogram = Histogram(
+            "duration_seconds", "Duration.", registry=registry, buckets=(0.1, 1)
+        )
+
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        assert histogram.value() == (3, 5.55)
+        assert registry.render().splitlines()[2:] == [
+            'duration_seconds_bucket{le="0.1"} 1',
+            'duration_seconds_bucket{le="1"} 2',
+            'duration_seconds_bucket{le="+Inf"} 3',
+            "duration_seconds_count 3",
+            "duration_seconds_sum 5.55",
+        ]
+
+    def test_label_escaping(self, registry):
+        counter = Counter("errors_total", "Errors.", ("message",), registry=registry)
+
+        counter.inc('a "quoted"\nvalue')
+
+        assert registry.render().splitlines()[-1] == (
+            'errors_total{message="a \\"quoted\\"\\nvalue"} 1'
+        )
+
+    def test_timed(self, registry):
+        histogram = Histogram("stage_seconds", "Stages.", ("stage",), registry=registry)
+        timings = []
+        token = server_timings.set(timings)
+        try:
+            with timed("cache_get", histogram):
+                pass
+        finally:
+            server_timings.reset(token)
+
+        assert histogram.value("cache_get")[0] == 1
+        assert [stage for stage, _ in timings] == ["cache_get"]
+
+    def test_timed_outside_request(self, registry):
+        histogram = Histogram("stage_seconds", "Stages.", ("stage",), registry=registry)
+
+        with timed("cache_get", histogram):
+            pass
+
+        assert histogram.value("cache_get")[0] == 1
+
+    def test_format_server_timing(self):
+        assert (
+            format_server_timing([("cache_get", 0.0012), ("total", 0.002)])
+            == "cache_get;dur=1.200, total;dur=2.000"
+        )
+
+
+class TestMetricsEndpoint:
+    def test_server_timing_header(self):
+        with patch("app.routers.lookup.cache", spec=MemoryCache) as mock_cache:
+            mock_cache.aget_encoded_entry.return_value = EncodedEntry(
+                b'{"Make":"PETERBILT"}', datetime.utcnow()
+            )
+
+            response = client.get("/lookup?vin=1XPWD40X1ED215313")
+
+        stages = [
+            timing.split(";")[0]
+            for timing in response.headers["Server-Timing"].split(", ")
+        ]
+        assert stages == ["validate", "cache_get", "total"]
+
+    def test_read_metrics(self):
+        client.get("/lookup?vin=InvalidVIN")
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'vin_http_requests_total{method="GET",path="/lookup",status="400"}'
+            in response.text
+        )
+        assert "vin_memory_cache_size" in response.text
+        assert "vin_upstream_flights_in_flight" in response.text
+
+    def test_unknown_paths_share_a_series(self):
+        client.get("/no-such-path")
+
+        response = client.get("/metrics")
+
+        assert (
+            'vin_http_requests_total{method="GET",path="other",status="404"}'
+            in response.text
+        )
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from caching.cache_interface import DeleteCriteria
+from caching.negative_cache import NegativeCache
+from models.database_models import NegativeVin
+
+
+@pytest.fixture
+def negative_cache(temporary_database):
+    return NegativeCache(temporary_database, ttl=60)
+
+
+class TestNegativeCache:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+        self.other_vin = "WMWRH33565TF85309"
+
+    def test_get_missing(self, negative_cache):
+        assert negative_cache.get(self.valid_vin) is None
+
+    def test_set_and_get(self, negative_cache):
+        cached_at = datetime.utcnow()
+
+        negative_cache.set(self.valid_vin, cached_at)
+
+        assert negative_cache.get(self.valid_vin) == cached_at
+
+    def test_expired_entry(self, negative_cache):
+        negative_cache.set(self.valid_vin, datetime.utcnow() - timedelta(seconds=61))
+
+        assert negative_cache.get(self.valid_vin) is None
+        assert negative_cache.get_many([self.valid_vin]) == {}
+
+    def test_set_purges_expired_entries(self, negative_cache, temporary_database):
+        negative_cache.set(self.other_vin, datetime.utcnow() - timedelta(seconds=61))
+
+        negative_cache.set(self.valid_vin)
+
+        with temporary_database.get_session() as db_session:
+            assert [row.vin for row in db_session.query(NegativeVin)] == [
+                self.valid_vin
+            ]
+
+    def test_get_many(self, negative_cache):
+        cached_at = datetime.utcnow()
+        negative_cache.set(self.valid_vin, cached_at)
+
+        assert negative_cache.get_many([self.valid_vin, self.other_vin]) == {
+            self.valid_vin: cached_at
+        }
+
+    def test_set_many(self, negative_cache):
+        cached_at = datetime.utcnow()
+
+        negative_cache.set_many({self.valid_vin: cached_at, self.other_vin: None})
+
+        assert negative_cache.get(self.valid_vin) == cached_at
+        assert negative_cache.get(self.other_vin) is not None
+
+    def test_delete(self, negative_cache):
+        negative_cache.set(self.valid_vin)
+
+        assert negative_cache.delete(self.valid_vin) is True
+        assert negative_cache.delete(self.valid_vin) is False
+        assert negative_cache.get(self.valid_vin) is None
+
+    def test_delete_matching(self, negative_cache):
+        negative_cache.set(self.valid_vin)
+        negative_cache.set(self.other_vin)
+
+        assert negative_cache.delete_matching(DeleteCriteria(make="PETERBILT")) == 0
+        criteria = DeleteCriteria(vins=frozenset([self.valid_vin]))
+        assert negative_cache.delete_matching(criteria) == 1
+        assert negative_cache.get(self.valid_vin) is None
+        assert negative_cache.get(self.other_vin) is not None
@@ -0,0 +1,98 @@
+import pytest
+
+from app.prefix_decoder import PrefixDecoder
+from caching.sqlite_cache import SqliteCache
+from database.connection import DatabasePool
+from models.database_models import create_tables
+
+PETERBILT = {"Make": "PETERBILT", "Model": "379", "Body Class": "Truck-Tractor"}
+
+
+@pytest.fixture
+def prefix_decoder():
+    return PrefixDecoder(min_samples=3, min_share=0.75)
+
+
+class TestPrefixDecoder:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+
+    def observe(self, prefix_decoder, count, vehicle_details=PETERBILT, year="2000"):
+        for _ in range(count):
+            prefix_decoder.observe(
+                self.valid_vin, dict(vehicle_details, **{"Model Year": year})
+            )
+
+    def test_decode(self, prefix_decoder):
+        self.observe(prefix_decoder, 3)
+
+        assert prefix_decoder.decode(self.valid_vin) == {
+            "Make": "PETERBILT",
+            "Model": "379",
+            "Model Year": "2000",
+            "Body Class": "Truck-Tractor",
+            "Input VIN Requested": self.valid_vin,
+        }
+
+    def test_not_enough_samples(self, prefix_decoder):
+        self.observe(prefix_decoder, 2)
+
+        assert prefix_decoder.decode(self.valid_vin) == {}
+
+    def test_not_enough_agreement(self, prefix_decoder):
+        self.observe(prefix_decoder, 2)
+        self.observe(prefix_decoder, 1, dict(PETERBILT, Model="389"))
+
+        assert prefix_decoder.decode(self.valid_vin) == {}
+
+    def test_unknown_prefix(self, prefix_decoder):
+        self.observe(prefix_decoder, 3)
+
+        assert prefix_decoder.decode("WMWRH33565TF85309") == {}
+
+    def test_details_without_make_are_ignored(self, prefix_decoder):
+        self.observe(prefix_decoder, 3, {"Make": None})
+
+        assert prefix_decoder.stats() == {"prefixes": 0}
+
+    def test_model_year_cycle_from_seen_years(self, prefix_decoder):
+        # "Y" stands for 2000 or 2030, "E" for 1984 or 2014.
+        self.observe(prefix_decoder, 3, year="2013")
+
+        assert prefix_decoder.decode("1XP5DB9X7EN526158")["Model Year"] == "2014"
+
+    def test_load_reference(self, prefix_decoder, tmp_path):
+        reference_path = tmp_path / "reference.csv"
+        reference_path.write_text(
+            "prefix,make,model,body_class,model_year,count\n"
+            "1XP5DB9X,PETERBILT,379,Truck-Tractor,2000,10\n"
+        )
+
+        assert prefix_decoder.load_reference(str(reference_path)) == 1
+        assert prefix_decoder.decode(self.valid_vin)["Model"] == "379"
+
+    def test_load_database(self, prefix_decoder, temporary_database):
+        vins = ["1XP5DB9X7YN526158", "1XP5DB9X0YN526159", "1XP5DB9X0YN526160"]
+        SqliteCache(temporary_database).set_many(
+            {vin: dict(PETERBILT, **{"Model Year": "2000"}) for vin in vins}
+        )
+
+        assert prefix_decoder.load_database(temporary_database) == 3
+        assert prefix_decoder.decode(self.valid_vin)["Make"] == "PETERBILT"
+
+    def test_load_every_database(self, prefix_decoder, tmp_path):
+        database_pools = [
+            DatabasePool(f"sqlite:///{tmp_path}/shard_{index}.db") for index in range(3)
+        ]
+        vins = ["1XP5DB9X7YN526158", "1XP5DB9X0YN526159", "1XP5DB9X0YN526160"]
+        for database_pool, vin in zip(database_pools, vins):
+            create_tables(database_pool.get_engine())
+            SqliteCache(database_pool).set(
+                vin, dict(PETERBILT, **{"Model Year": "2000"})
+            )
+
+        prefix_decoder.load(database_pools)
+
+        assert prefix_decoder.decode(self.valid_vin)["Make"] == "PETERBILT"
+        for database_pool in database_pools:
+            database_pool.get_engine().dispose()
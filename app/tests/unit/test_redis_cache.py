@@ -0,0 +1,217 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from benchmarks.fake_redis import start_server
+from caching.async_cache import AsyncCache
+from caching.codecs import JsonCodec, StructCodec
+from caching.factory import build_cache, build_invalidation_subscriber
+from caching.memory_cache import MemoryCache
+from caching.redis_cache import InvalidationSubscriber, RedisCache
+from caching.resp_client import RespClient, RespError, encode_command
+
+module_path = "caching.redis_cache.{}"
+
+VIN = "1XPWD40X1ED215307"
+VEHICLE_DETAILS = {"Make": "PETERBILT", "Input VIN Requested": VIN}
+
+
+@pytest.fixture
+def fake_redis():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server, fake_redis, port = asyncio.run_coroutine_threadsafe(
+        start_server(), loop
+    ).result()
+    fake_redis.port = port
+    yield fake_redis
+
+    async def shutdown():
+        server.close()
+        handlers = asyncio.all_tasks() - {asyncio.current_task()}
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def client(fake_redis):
+    client = RespClient("127.0.0.1", fake_redis.port, timeout=1)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def redis_cache(client):
+    return RedisCache(client, invalidation_channel="invalidations")
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestRespClient:
+    def test_encode_command(self):
+        assert encode_command(("SET", "key", 1)) == (
+            b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$1\r\n1\r\n"
+        )
+
+    def test_pipeline(self, client):
+        replies = client.pipeline(
+            [("SET", "key", "value"), ("GET", "key"), ("GET", "missing"), ("NOPE",)]
+        )
+
+        assert replies[:3] == ["OK", b"value", None]
+        assert isinstance(replies[3], RespError)
+
+    def test_error_reply_is_raised(self, client):
+        with pytest.raises(RespError):
+            client.execute("NOPE")
+
+    def test_connections_are_reused(self, client):
+        client.execute("PING")
+        client.execute("PING")
+
+        assert len(client._idle) == 1
+
+
+class TestRedisCache:
+    def test_set_and_get(self, redis_cache):
+        redis_cache.set(VIN, VEHICLE_DETAILS)
+
+        entry = redis_cache.get_entry(VIN)
+
+        assert entry.value == VEHICLE_DETAILS
+        assert entry.fetched_at is not None
+        assert redis_cache.get(VIN) == VEHICLE_DETAILS
+
+    def test_missing_vin(self, redis_cache):
+        assert redis_cache.get(VIN) == {}
+
+    def test_ttl(self, fake_redis, client):
+        RedisCache(client, ttl=60).set(VIN, VEHICLE_DETAILS)
+
+        assert fake_redis.data[f"vin:{VIN}".encode()][1] is not None
+
+    def test_codec(self, fake_redis, client):
+        RedisCache(client, codec=StructCodec()).set(VIN, VEHICLE_DETAILS)
+
+        assert fake_redis.data[f"vin:{VIN}".encode()][0][:1] == StructCodec.tag
+        # Values stay readable after switching codecs.
+        assert RedisCache(client, codec=JsonCodec()).get(VIN) == VEHICLE_DETAILS
+
+    def test_get_many_is_pipelined(self, fake_redis, redis_cache):
+        vins = [f"{VIN[:-1]}{digit}" for digit in range(5)]
+        redis_cache.set_many({vin: VEHICLE_DETAILS for vin in vins[:3]})
+        commands = fake_redis.commands
+
+        with patch(module_path.format("MGET_CHUNK_SIZE"), 2), patch.object(
+            redis_cache.client, "pipeline", wraps=redis_cache.client.pipeline
+        ) as mock_pipeline:
+            vehicle_details = redis_cache.get_many(vins)
+
+        assert set(vehicle_details) == set(vins[:3])
+        mock_pipeline.assert_called_once()
+        assert fake_redis.commands - commands == 3
+
+    def test_delete_publishes_the_vin(self, fake_redis, client, redis_cache):
+        redis_cache.set(VIN, VEHICLE_DETAILS)
+        invalidated = []
+        subscriber = InvalidationSubscriber(
+            RespClient("127.0.0.1", fake_redis.port),
+            "invalidations",
+            invalidated.append,
+        )
+        subscriber.start()
+        assert subscriber.wait_subscribed(timeout=2)
+
+        assert redis_cache.delete(VIN) is True
+        assert redis_cache.delete(VIN) is False
+        assert wait_for(lambda: len(invalidated) == 2)
+        subscriber.stop()
+
+        assert invalidated == [VIN, VIN]
+        assert redis_cache.get(VIN) == {}
+
+    def test_unreachable_server_is_a_miss(self):
+        client = RespClient("127.0.0.1", 1, timeout=0.1)
+        redis_cache = RedisCache(client)
+
+        with patch(module_path.format("logging")) as mock_logging:
+            assert redis_cache.get(VIN) == {}
+            assert redis_cache.get_many([VIN]) == {}
+            redis_cache.set(VIN, VEHICLE_DETAILS)
+            assert redis_cache.delete(VIN) is False
+
+        assert mock_logging.exception.call_count == 4
+
+
+class TestInvalidationSubscriber:
+    def test_reconnects_after_failure(self, fake_redis):
+        on_reconnect = MagicMock()
+        subscriber = InvalidationSubscriber(
+            RespClient("127.0.0.1", fake_redis.port),
+            "invalidations",
+            MagicMock(),
+            on_reconnect=on_reconnect,
+            retry_delay=0.01,
+        )
+
+        with patch(module_path.format("logging")):
+            subscriber.start()
+            assert subscriber.wait_subscribed(timeout=2)
+            # Drop the subscription as if the server had gone away.
+            subscriber._connection.shutdown()
+            assert wait_for(lambda: on_reconnect.called)
+            subscriber.stop()
+
+    def test_memory_tier_is_invalidated(self, fake_redis, client):
+        memory_cache = MemoryCache(
+            RedisCache(client, invalidation_channel="invalidations"),
+            max_size=10,
+            ttl=60,
+        )
+        other_worker = RedisCache(
+            RespClient("127.0.0.1", fake_redis.port),
+            invalidation_channel="invalidations",
+        )
+        subscriber = InvalidationSubscriber(
+            RespClient("127.0.0.1", fake_redis.port),
+            "invalidations",
+            memory_cache.invalidate,
+        )
+        subscriber.start()
+        assert subscriber.wait_subscribed(timeout=2)
+        memory_cache.set(VIN, VEHICLE_DETAILS)
+
+        other_worker.delete(VIN)
+
+        assert wait_for(lambda: memory_cache.get(VIN) == {})
+        subscriber.stop()
+
+
+class TestFactory:
+    def test_redis_backend(self):
+        cache = build_cache("redis")
+
+        assert isinstance(cache, MemoryCache)
+        assert isinstance(cache.backend, AsyncCache)
+        assert isinstance(cache.backend.backend, RedisCache)
+        subscriber = build_invalidation_subscriber(cache, "redis")
+        assert isinstance(subscriber, InvalidationSubscriber)
+        cache.backend.close()
+
+    def test_no_subscriber_for_local_backends(self):
+        assert build_invalidation_subscriber(MagicMock(), "async_sqlite") is None
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.refresher import Refresher
+from app.resilience import UpstreamUnavailableError
+from app.routers.lookup import refresh_cached
+from caching.memory_cache import MemoryCache
+
+module_path = "app.routers.lookup.{}"
+
+
+@pytest.fixture
+def mock_cache():
+    with patch(module_path.format("cache"), spec=MemoryCache) as dummy_cache:
+        yield dummy_cache
+
+
+@pytest.fixture
+def mock_make_request():
+    with patch(module_path.format("make_request")) as mock_make_request:
+        yield mock_make_request
+
+
+class TestRefresher:
+    @pytest.mark.asyncio
+    async def test_one_refresh_per_key(self):
+        refresher = Refresher(max_concurrency=4)
+        release = asyncio.Event()
+        function = AsyncMock(side_effect=release.wait)
+
+        assert refresher.schedule("key", function) is True
+        assert refresher.schedule("key", function) is True
+        await asyncio.sleep(0)
+        release.set()
+        await refresher.close()
+        await asyncio.sleep(0)
+
+        function.assert_called_once()
+        assert refresher.stats() == {"started": 1, "skipped": 0, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_refreshes_beyond_max_concurrency_are_skipped(self):
+        refresher = Refresher(max_concurrency=2)
+        release = asyncio.Event()
+        function = AsyncMock(side_effect=release.wait)
+
+        scheduled = [refresher.schedule(key, function) for key in range(3)]
+        await asyncio.sleep(0)
+
+        assert scheduled == [True, True, False]
+        assert refresher.stats() == {"started": 2, "skipped": 1, "in_flight": 2}
+        release.set()
+        await refresher.close()
+
+    @pytest.mark.asyncio
+    async def test_exception_is_logged(self):
+        refresher = Refresher(max_concurrency=2)
+        function = AsyncMock(side_effect=ValueError("upstream failed"))
+
+        with patch("app.refresher.logger") as mock_logger:
+            refresher.schedule("key", function)
+            await refresher.close()
+            await asyncio.sleep(0)
+
+        mock_logger.error.assert_called_once()
+        assert refresher.stats()["in_flight"] == 0
+
+
+class TestRefreshCached:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+
+    @pytest.mark.asyncio
+    async def test_refreshed_details_are_cached(self, mock_cache, mock_make_request):
+        mock_make_request.return_value = [{"Variable": "Make", "Value": "PETERBILT"}]
+
+        await refresh_cached(self.valid_vin)
+
+        mock_cache.aset.assert_awaited_once_with(
+            self.valid_vin,
+            {"Make": "PETERBILT", "Input VIN Requested": self.valid_vin},
+        )
+
+    @pytest.mark.asyncio
+    async def test_stale_details_are_kept(self, mock_cache, mock_make_request):
+        mock_make_request.return_value = []
+
+        await refresh_cached(self.valid_vin)
+
+        mock_cache.aset.assert_not_called()
+        mock_cache.adelete.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_stale_details_are_kept_when_upstream_fails(
+        self, mock_cache, mock_make_request
+    ):
+        mock_make_request.side_effect = UpstreamUnavailableError(
+            "circuit open", retry_after=30
+        )
+
+        await refresh_cached(self.valid_vin)
+
+        mock_cache.aset.assert_not_called()
@@ -1,8 +1,17 @@
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from fastapi import HTTPException
+from pydantic import ValidationError
 from unittest.mock import patch
 
-from app.routers.remove import delete_vin_from_cache
+from app.routers.remove import delete_vin_from_cache, delete_vins_from_cache
+from app.vin_validation import validate_vin
+from caching.cache_interface import DeleteCriteria
+from caching.sqlite_cache import REWRITE_VERSION, SqliteCache
+from database.connection import DatabasePool
+from models.database_models import Base
+from models.parsing_models import BulkRemoveRequest
 
 module_path = "app.routers.remove.{}"
 
@@ -13,6 +22,12 @@ def mock_cache():
         yield dummy_cache
 
 
+@pytest.fixture
+def mock_negative_cache():
+    with patch(module_path.format("negative_cache")) as dummy_negative_cache:
+        yield dummy_negative_cache
+
+
 @pytest.fixture
 def mock_request():
     with patch(module_path.format("Request")) as mock_request:
@@ -34,13 +49,192 @@ class TestDeleteVinFromCache:
             == "VIN should be a 17 characters alpha-numeric string."
         )
 
-    def test_delete_success(self, mock_request, mock_cache):
+    def test_delete_success(self, mock_request, mock_cache, mock_negative_cache):
         mock_request.query_params.get.return_value = self.valid_vin
         result = delete_vin_from_cache(mock_request)
         mock_cache.delete.assert_called_once_with(
             mock_request.query_params.get.return_value
         )
+        mock_negative_cache.delete.assert_called_once_with(
+            mock_request.query_params.get.return_value
+        )
         assert result == {
             "Input VIN Requested": mock_request.query_params.get.return_value,
             "Cache Delete Success?": mock_cache.delete.return_value,
         }
+
+    def test_check_digit_is_not_checked(
+        self, mock_request, mock_cache, mock_negative_cache
+    ):
+        # Cached before VINs were validated, with a wrong check digit.
+        mock_request.query_params.get.return_value = "1XPWD40X1ED215313"
+        assert validate_vin("1XPWD40X1ED215313", strict=True) is not None
+
+        result = delete_vin_from_cache(mock_request)
+
+        assert result["Input VIN Requested"] == "1XPWD40X1ED215313"
+        mock_cache.delete.assert_called_once_with("1XPWD40X1ED215313")
+
+    def test_delete_negative_entry(self, mock_request, mock_cache, mock_negative_cache):
+        mock_request.query_params.get.return_value = self.valid_vin
+        mock_cache.delete.return_value = False
+        mock_negative_cache.delete.return_value = True
+
+        result = delete_vin_from_cache(mock_request)
+
+        assert result == {
+            "Input VIN Requested": self.valid_vin,
+            "Cache Delete Success?": True,
+        }
+
+
+class TestDeleteVinsFromCache:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+
+    def test_vin_list(self, mock_cache, mock_negative_cache):
+        mock_cache.delete_matching.return_value = 1
+        mock_negative_cache.delete_matching.return_value = 0
+
+        result = delete_vins_from_cache(BulkRemoveRequest(vins=[self.valid_vin]))
+
+        criteria = DeleteCriteria(vins=frozenset([self.valid_vin]))
+        mock_cache.delete_matching.assert_called_once_with(criteria)
+        mock_negative_cache.delete_matching.assert_called_once_with(criteria)
+        assert result == {"deleted": 1, "negative_deleted": 0}
+
+    def test_predicate(self, mock_cache, mock_negative_cache):
+        fetched_before = datetime(2023, 6, 1, 7, tzinfo=timezone(timedelta(hours=-5)))
+
+        delete_vins_from_cache(
+            BulkRemoveRequest(
+                vin_prefix="1XP", model_year=2014, fetched_before=fetched_before
+            )
+        )
+
+        mock_cache.delete_matching.assert_called_once_with(
+            DeleteCriteria(
+                vin_prefix="1XP",
+                model_year=2014,
+                fetched_before=datetime(2023, 6, 1, 12),
+            )
+        )
+
+    def test_check_digits_are_not_checked(self, mock_cache, mock_negative_cache):
+        vins = [self.valid_vin, "1LPWD40X1ED215111"]
+
+        delete_vins_from_cache(BulkRemoveRequest(vins=vins))
+
+        mock_cache.delete_matching.assert_called_once_with(
+            DeleteCriteria(vins=frozenset(vins))
+        )
+
+    def test_invalid_vins(self, mock_cache):
+        with pytest.raises(HTTPException) as http_exception:
+            delete_vins_from_cache(
+                BulkRemoveRequest(vins=[self.valid_vin, "InvalidVIN"])
+            )
+
+        assert http_exception.value.status_code == 400
+        assert list(http_exception.value.detail) == ["InvalidVIN"]
+        mock_cache.delete_matching.assert_not_called()
+
+    def test_no_criteria(self):
+        with pytest.raises(ValidationError):
+            BulkRemoveRequest()
+
+    def test_predicate_not_supported(self, mock_cache, mock_negative_cache):
+        mock_cache.delete_matching.side_effect = NotImplementedError("VIN lists only.")
+
+        with pytest.raises(HTTPException) as http_exception:
+            delete_vins_from_cache(BulkRemoveRequest(make="PETERBILT"))
+
+        assert http_exception.value.status_code == 400
+        mock_negative_cache.delete_matching.assert_not_called()
+
+    def test_database_error(self, mock_cache, mock_negative_cache):
+        mock_cache.delete_matching.side_effect = OSError("disk full")
+
+        with pytest.raises(HTTPException) as http_exception:
+            delete_vins_from_cache(BulkRemoveRequest(make="PETERBILT"))
+
+        assert http_exception.value.status_code == 500
+
+
+class TestSqliteCacheDeleteMatching:
+    @pytest.fixture
+    def sqlite_cache(self, tmp_path):
+        database_pool = DatabasePool(f"sqlite:///{tmp_path}/test.db")
+        Base.metadata.create_all(bind=database_pool.get_engine())
+        sqlite_cache = SqliteCache(database_pool)
+        sqlite_cache.set_many(
+            {
+                f"1XPWD40X0ED{serial:06d}": {
+                    "Make": "PETERBILT",
+                    "Model Year": "2014" if serial % 2 else "2015",
+                }
+                for serial in range(10)
+            }
+        )
+        sqlite_cache.set("WMWRH33565TF85309", {"Make": "MINI", "Model Year": "2005"})
+        yield sqlite_cache
+        database_pool.get_engine().dispose()
+
+    def test_vin_list(self, sqlite_cache):
+        vins = frozenset(f"1XPWD40X0ED00000{serial}" for serial in range(4))
+        versions = sqlite_cache.get_versions()
+
+        deleted = sqlite_cache.delete_matching(DeleteCriteria(vins=vins), chunk_size=2)
+
+        assert deleted == 4
+        assert sqlite_cache.get("1XPWD40X0ED000000") == {}
+        assert sqlite_cache.get("1XPWD40X0ED000004") != {}
+        new_versions = sqlite_cache.get_versions()
+        assert new_versions[REWRITE_VERSION] == versions[REWRITE_VERSION] + 2
+
+    def test_unknown_vins(self, sqlite_cache):
+        versions = sqlite_cache.get_versions()
+
+        deleted = sqlite_cache.delete_matching(
+            DeleteCriteria(vins=frozenset(["UNKNOWN"]))
+        )
+
+        assert deleted == 0
+        assert sqlite_cache.get_versions() == versions
+
+    def test_vin_list_and_predicate(self, sqlite_cache):
+        vins = frozenset(["1XPWD40X0ED000000", "1XPWD40X0ED000001"])
+
+        deleted = sqlite_cache.delete_matching(
+            DeleteCriteria(vins=vins, model_year=2014)
+        )
+
+        assert deleted == 1
+        assert sqlite_cache.get("1XPWD40X0ED000000") != {}
+
+    def test_predicate_in_chunks(self, sqlite_cache):
+        with patch.object(
+            sqlite_cache, "_delete_chunk", wraps=sqlite_cache._delete_chunk
+        ) as mock_delete_chunk:
+            deleted = sqlite_cache.delete_matching(
+                DeleteCriteria(vin_prefix="1XP", model_year=2014), chunk_size=2
+            )
+
+        assert deleted == 5
+        assert mock_delete_chunk.call_count == 3
+        assert sqlite_cache.get("1XPWD40X0ED000000") != {}
+        assert sqlite_cache.get("WMWRH33565TF85309") != {}
+
+    def test_fetched_before(self, sqlite_cache):
+        assert (
+            sqlite_cache.delete_matching(
+                DeleteCriteria(fetched_before=datetime.utcnow() - timedelta(days=1))
+            )
+            == 0
+        )
+        assert (
+            sqlite_cache.delete_matching(
+                DeleteCriteria(fetched_before=datetime.utcnow() + timedelta(days=1))
+            )
+            == 11
+        )
@@ -0,0 +1,231 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+from aiohttp import ClientError, ClientResponseError
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.rate_limiter import RateLimiter
+from app.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    UpstreamError,
+    UpstreamPolicy,
+    UpstreamUnavailableError,
+    parse_retry_after,
+)
+
+module_path = "app.resilience.{}"
+
+
+@pytest.fixture
+def mock_time():
+    with patch(module_path.format("time")) as mock_time:
+        mock_time.monotonic.return_value = 1000.0
+        yield mock_time
+
+
+def build_policy(circuit_breaker=None, rate_limiter=None, **options):
+    return UpstreamPolicy(
+        circuit_breaker or CircuitBreaker(failure_threshold=3, reset_timeout=30),
+        rate_limiter or RateLimiter(None),
+        max_retries=options.pop("max_retries", 2),
+        backoff=0,
+        backoff_max=0,
+        **options,
+    )
+
+
+def build_response_error(status, headers):
+    return ClientResponseError(
+        MagicMock(), (), status=status, message="", headers=headers
+    )
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self, mock_time):
+        circuit_breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        circuit_breaker.record_success()
+        circuit_breaker.record_failure()
+        circuit_breaker.record_failure()
+        assert circuit_breaker.state == CLOSED
+        circuit_breaker.record_failure()
+
+        assert circuit_breaker.state == OPEN
+        assert circuit_breaker.opened == 1
+        assert circuit_breaker.allow() is False
+        mock_time.monotonic.return_value = 1012.0
+        assert circuit_breaker.retry_after() == 18.0
+
+    def test_half_open_lets_a_single_probe_through(self, mock_time):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        circuit_breaker.record_failure()
+        mock_time.monotonic.return_value = 1030.0
+
+        assert circuit_breaker.allow() is True
+        assert circuit_breaker.state == HALF_OPEN
+        assert circuit_breaker.allow() is False
+        circuit_breaker.record_success()
+
+        assert circuit_breaker.state == CLOSED
+        assert circuit_breaker.allow() is True
+
+    def test_failed_probe_reopens(self, mock_time):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        circuit_breaker.record_failure()
+        mock_time.monotonic.return_value = 1030.0
+        circuit_breaker.allow()
+
+        circuit_breaker.record_failure()
+
+        assert circuit_breaker.state == OPEN
+        assert circuit_breaker.opened == 2
+        assert circuit_breaker.retry_after() == 30.0
+
+    def test_released_probe_can_be_taken_again(self, mock_time):
+        circuit_breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        circuit_breaker.record_failure()
+        mock_time.monotonic.return_value = 1030.0
+        circuit_breaker.allow()
+
+        circuit_breaker.release()
+
+        assert circuit_breaker.allow() is True
+
+
+class TestUpstreamPolicy:
+    @pytest.mark.asyncio
+    async def test_retries_until_success(self):
+        attempt = AsyncMock(side_effect=[asyncio.TimeoutError(), "result"])
+
+        assert await build_policy().call("decode", attempt) == "result"
+        assert attempt.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=10, reset_timeout=30)
+        attempt = AsyncMock(side_effect=ClientError("connection reset"))
+
+        with pytest.raises(UpstreamError):
+            await build_policy(circuit_breaker).call("decode", attempt)
+
+        assert attempt.await_count == 3
+        assert circuit_breaker.failures == 3
+
+    @pytest.mark.asyncio
+    async def test_fails_fast_once_the_circuit_opens(self):
+        circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        attempt = AsyncMock(side_effect=ClientError("connection reset"))
+
+        with pytest.raises(UpstreamUnavailableError) as upstream_error:
+            await build_policy(circuit_breaker).call("decode", attempt)
+
+        assert attempt.await_count == 2
+        assert upstream_error.value.retry_after > 0
+
+    @pytest.mark.asyncio
+    async def test_fails_fast_when_rate_limited(self):
+        rate_limiter = RateLimiter(rate=1, burst=1)
+        policy = build_policy(rate_limiter=rate_limiter, rate_limit_max_wait=0.5)
+        attempt = AsyncMock(return_value="result")
+
+        assert await policy.call("decode", attempt) == "result"
+        with pytest.raises(UpstreamUnavailableError):
+            await policy.call("decode", attempt)
+
+        assert attempt.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_backoff_delay_is_capped(self):
+        policy = UpstreamPolicy(
+            CircuitBreaker(failure_threshold=3, reset_timeout=30),
+            RateLimiter(None),
+            max_retries=5,
+            backoff=0.2,
+            backoff_max=1,
+        )
+
+        assert all(0 <= policy.backoff_delay(retry) <= 1 for retry in range(10))
+        assert all(0 <= policy.backoff_delay(0) <= 0.2 for _ in range(10))
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_honoured(self):
+        policy = UpstreamPolicy(
+            CircuitBreaker(failure_threshold=3, reset_timeout=30),
+            RateLimiter(None),
+            max_retries=2,
+            backoff=0.2,
+            backoff_max=5,
+        )
+        attempt = AsyncMock(
+            side_effect=[
+                build_response_error(429, {"Retry-After": "3"}),
+                build_response_error(429, {"Retry-After": "120"}),
+                "result",
+            ]
+        )
+
+        with patch(module_path.format("asyncio.sleep")) as mock_sleep:
+            assert await policy.call("decode", attempt) == "result"
+
+        assert [call.args[0] for call in mock_sleep.await_args_list] == [3.0, 5]
+
+
+class TestParseRetryAfter:
+    def test_seconds(self):
+        assert parse_retry_after(build_response_error(429, {"Retry-After": "2"})) == 2.0
+
+    def test_http_date(self):
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+        error = build_response_error(
+            429, {"Retry-After": format_datetime(retry_at, usegmt=True)}
+        )
+
+        assert 55 < parse_retry_after(error) <= 60
+
+    def test_no_delay(self):
+        assert parse_retry_after(build_response_error(429, {})) is None
+        assert (
+            parse_retry_after(build_response_error(429, {"Retry-After": "soon"}))
+            is None
+        )
+        assert (
+            parse_retry_after(build_response_error(503, {"Retry-After": "2"})) is None
+        )
+        assert parse_retry_after(ClientError("connection reset")) is None
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_burst(self):
+        rate_limiter = RateLimiter(rate=10, burst=3)
+
+        with patch("app.rate_limiter.time") as mock_time, patch(
+            "app.rate_limiter.asyncio.sleep", new_callable=AsyncMock
+        ) as mock_sleep:
+            mock_time.monotonic.return_value = 100.0
+            for _ in range(4):
+                assert await rate_limiter.acquire() is True
+
+        assert [call.args[0] for call in mock_sleep.await_args_list] == pytest.approx(
+            [0.1]
+        )
+
+    @pytest.mark.asyncio
+    async def test_max_wait(self):
+        rate_limiter = RateLimiter(rate=10, burst=1)
+
+        with patch("app.rate_limiter.time") as mock_time, patch(
+            "app.rate_limiter.asyncio.sleep", new_callable=AsyncMock
+        ):
+            mock_time.monotonic.return_value = 100.0
+            assert await rate_limiter.acquire(max_wait=0.15) is True
+            assert await rate_limiter.acquire(max_wait=0.15) is True
+            assert await rate_limiter.acquire(max_wait=0.15) is False
+            assert rate_limiter.retry_after() == pytest.approx(0.2)
@@ -0,0 +1,197 @@
+import pyarrow.parquet as pq
+import pytest
+from unittest.mock import MagicMock, patch
+
+from app.importer import import_parquet
+from app.routers.export import build_export_table
+from app.vin_validation import compute_check_digit
+from caching.cache_interface import DeleteCriteria
+from caching.eviction import CacheEvictor
+from caching.factory import (
+    build_cache,
+    build_cache_databases,
+    build_shard_databases,
+)
+from caching.negative_cache import NegativeCache
+from caching.sharded_cache import ShardedSqliteCache
+from caching.sqlite_cache import LRU, VERSION, SqliteCache
+from models.database_models import Vin
+
+VINS = [f"1XPWD40X0ED{serial:06d}" for serial in range(20)]
+VEHICLE_DETAILS = {"Make": "PETERBILT", "Model Year": "2014"}
+
+
+@pytest.fixture
+def shard_databases(tmp_path):
+    shard_databases = build_shard_databases(
+        [f"sqlite:///{tmp_path}/shard_{index}.db" for index in range(3)]
+    )
+    yield shard_databases
+    for database_pool in shard_databases:
+        database_pool.get_engine().dispose()
+
+
+@pytest.fixture
+def sharded_cache(shard_databases):
+    sharded_cache = ShardedSqliteCache(shard_databases)
+    sharded_cache.set_many({vin: VEHICLE_DETAILS for vin in VINS})
+    return sharded_cache
+
+
+def count_rows(database):
+    db_session = database.get_session()
+    try:
+        return db_session.query(Vin).count()
+    finally:
+        db_session.close()
+
+
+class TestShardedSqliteCache:
+    def test_vins_are_spread_across_shards(self, shard_databases, sharded_cache):
+        rows = [count_rows(database) for database in shard_databases]
+
+        assert sum(rows) == len(VINS)
+        assert all(rows)
+        for vin in VINS:
+            assert sharded_cache.get_shard(vin).get(vin)["Make"] == "PETERBILT"
+
+    def test_set_and_get(self, sharded_cache):
+        vin = "WMWRH33565TF85309"
+        sharded_cache.set(vin, {"Make": "MINI"})
+
+        assert sharded_cache.get(vin)["Make"] == "MINI"
+        assert sharded_cache.get_entry(vin).fetched_at is not None
+        assert sharded_cache.get("1XPWD40X0ED999999") == {}
+
+    def test_get_many(self, sharded_cache):
+        vehicle_details = sharded_cache.get_many(VINS[:5] + ["1XPWD40X0ED999999"])
+
+        assert set(vehicle_details) == set(VINS[:5])
+        assert vehicle_details[VINS[0]]["Model Year"] == "2014"
+
+    def test_get_many_entries(self, sharded_cache):
+        entries = sharded_cache.get_many_entries(VINS[:5] + ["1XPWD40X0ED999999"])
+
+        assert set(entries) == set(VINS[:5])
+        assert entries[VINS[0]].value["Model Year"] == "2014"
+        assert all(entry.fetched_at is not None for entry in entries.values())
+
+    def test_delete(self, sharded_cache):
+        assert sharded_cache.delete(VINS[0]) is True
+
+        assert sharded_cache.get(VINS[0]) == {}
+
+    def test_delete_matching(self, sharded_cache):
+        vins = frozenset(VINS[:4])
+
+        assert sharded_cache.delete_matching(DeleteCriteria(vins=vins)) == 4
+        assert sharded_cache.delete_matching(DeleteCriteria(make="PETERBILT")) == 16
+
+        assert sharded_cache.get_many(VINS) == {}
+
+    def test_writes_leave_the_negative_cache(self, shard_databases, temporary_database):
+        negative_cache = NegativeCache(temporary_database, ttl=3600)
+        for vin in VINS[:3]:
+            negative_cache.set(vin)
+        sharded_cache = ShardedSqliteCache(
+            shard_databases, negative_cache=negative_cache
+        )
+
+        sharded_cache.set(VINS[0], VEHICLE_DETAILS)
+        sharded_cache.set_many({VINS[1]: VEHICLE_DETAILS})
+
+        assert negative_cache.get(VINS[0]) is None
+        assert negative_cache.get(VINS[1]) is None
+        assert negative_cache.get(VINS[2]) is not None
+
+    def test_import_rows_in_chunks(self, shard_databases, temporary_database):
+        negative_cache = NegativeCache(temporary_database, ttl=3600)
+        negative_cache.set(VINS[0])
+        sharded_cache = ShardedSqliteCache(
+            shard_databases, negative_cache=negative_cache
+        )
+        rows = [{"vin": vin, "make": "PETERBILT"} for vin in VINS]
+
+        with patch.object(
+            SqliteCache,
+            "import_rows",
+            autospec=True,
+            side_effect=SqliteCache.import_rows,
+        ) as import_rows:
+            written = sharded_cache.import_rows(iter(rows), chunk_size=2)
+
+        assert written == len(VINS)
+        assert all(len(call.args[1]) <= 2 for call in import_rows.call_args_list)
+        assert sharded_cache.get_many(VINS).keys() == set(VINS)
+        assert negative_cache.get(VINS[0]) is None
+
+    def test_versions_are_summed(self, sharded_cache):
+        versions = sharded_cache.get_versions()
+
+        sharded_cache.set("WMWRH33565TF85309", {"Make": "MINI"})
+
+        assert sharded_cache.get_versions()[VERSION] == versions[VERSION] + 1
+
+    def test_evictor_bounds_all_shards(self, shard_databases, sharded_cache):
+        evictor = CacheEvictor(sharded_cache, LRU, max_rows=10, target=1.0)
+
+        assert evictor.run_once() == 10
+
+        size = sharded_cache.get_size()
+        assert size["rows"] == 10
+        assert size["shards"] == 3
+
+    def test_no_shards(self):
+        with pytest.raises(ValueError):
+            ShardedSqliteCache([])
+
+
+class TestShardedImport:
+    def test_rows_go_to_the_shard_of_their_vin(self, tmp_path, shard_databases):
+        vins = [vin[:8] + compute_check_digit(vin) + vin[9:] for vin in VINS[:5]]
+        rows = [(vin, "PETERBILT", "389", 2014, "Truck", None) for vin in vins]
+        path = str(tmp_path / "vins.parquet")
+        pq.write_table(build_export_table(rows), path)
+
+        counts = import_parquet(path, shard_databases)
+
+        assert counts["written"] == 5
+        sharded_cache = ShardedSqliteCache(shard_databases)
+        for vin in vins:
+            assert sharded_cache.get_shard(vin).get(vin)["Make"] == "PETERBILT"
+
+    def test_imported_vins_leave_the_negative_cache(
+        self, tmp_path, shard_databases, temporary_database
+    ):
+        vin = VINS[0][:8] + compute_check_digit(VINS[0]) + VINS[0][9:]
+        path = str(tmp_path / "vins.parquet")
+        pq.write_table(
+            build_export_table([(vin, "PETERBILT", "389", 2014, "Truck", None)]), path
+        )
+        negative_cache = NegativeCache(temporary_database, ttl=3600)
+        negative_cache.set(vin)
+        assert negative_cache.get(vin) is not None
+
+        import_parquet(path, shard_databases, negative_cache=negative_cache)
+
+        assert negative_cache.get(vin) is None
+
+
+class TestFactory:
+    def test_cache_databases(self, shard_databases):
+        cache = MagicMock()
+        cache.backend.backend = ShardedSqliteCache(shard_databases)
+
+        assert build_cache_databases(cache, "sharded_sqlite") == shard_databases
+        assert len(build_cache_databases(cache, "async_sqlite")) == 1
+        assert build_cache_databases(cache, "redis") == []
+
+    def test_cache_clears_the_negative_cache(self, shard_databases):
+        negative_cache = MagicMock()
+
+        with patch(
+            "caching.factory.build_shard_databases", return_value=shard_databases
+        ):
+            cache = build_cache("sharded_sqlite", negative_cache=negative_cache)
+
+        assert cache.backend.backend.negative_cache is negative_cache
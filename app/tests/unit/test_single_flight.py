@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.routers.lookup import fetch_and_cache, upstream_flights
+from app.single_flight import SingleFlight
+from caching.memory_cache import MemoryCache
+
+module_path = "app.routers.lookup.{}"
+
+
+@pytest.fixture
+def mock_cache():
+    with patch(module_path.format("cache"), spec=MemoryCache) as dummy_cache:
+        yield dummy_cache
+
+
+@pytest.fixture
+def mock_make_request():
+    with patch(module_path.format("make_request")) as mock_make_request:
+        yield mock_make_request
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_coalesced(self):
+        single_flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def function():
+            calls.append(1)
+            return await release.wait()
+
+        callers = [
+            asyncio.ensure_future(single_flight.do("key", function)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*callers)
+
+        assert results == [True] * 5
+        assert len(calls) == 1
+        assert single_flight.stats() == {"leaders": 1, "coalesced": 4, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_sequential_calls_are_not_coalesced(self):
+        single_flight = SingleFlight()
+        function = AsyncMock(return_value="result")
+
+        assert await single_flight.do("key", function) == "result"
+        await asyncio.sleep(0)
+        assert await single_flight.do("key", function) == "result"
+
+        assert function.call_count == 2
+        assert single_flight.coalesced == 0
+
+    @pytest.mark.asyncio
+    async def test_exception_is_shared(self):
+        single_flight = SingleFlight()
+        function = AsyncMock(side_effect=ValueError("upstream failed"))
+
+        results = await asyncio.gather(
+            single_flight.do("key", function),
+            single_flight.do("key", function),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(result, ValueError) for result in results)
+        function.assert_called_once()
+
+
+class TestFetchAndCache:
+    def setup_class(self):
+        self.valid_vin = "1XP5DB9X7YN526158"
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_fetch(
+        self, mock_cache, mock_make_request
+    ):
+        async def make_request(vin):
+            await asyncio.sleep(0)
+            return [{"Variable": "Make", "Value": "PETERBILT"}]
+
+        mock_make_request.side_effect = make_request
+        results = await asyncio.gather(
+            *(
+                upstream_flights.do(
+                    self.valid_vin, lambda: fetch_and_cache(self.valid_vin)
+                )
+                for _ in range(3)
+            )
+        )
+
+        expected = {"Make": "PETERBILT", "Input VIN Requested": self.valid_vin}
+        assert results == [expected] * 3
+        mock_make_request.assert_called_once_with(self.valid_vin)
+        mock_cache.aset_many.assert_awaited_once_with({self.valid_vin: expected})
+
+    @pytest.mark.asyncio
+    async def test_no_details_are_not_cached(self, mock_cache, mock_make_request):
+        mock_make_request.return_value = []
+
+        assert await fetch_and_cache(self.valid_vin) == {}
+        mock_cache.aset_many.assert_not_called()
@@ -0,0 +1,69 @@
+import pytest
+
+from app.vin_validation import (
+    FORBIDDEN_LETTERS,
+    INVALID_CHECK_DIGIT,
+    INVALID_FORMAT,
+    INVALID_MODEL_YEAR,
+    compute_check_digit,
+    decode_model_year,
+    validate_vin,
+    validate_vins,
+)
+
+CASES = [
+    ("1XP5DB9X7YN526158", None),
+    ("WMWRH33565TF85309", None),
+    ("1xp5db9x7yn526158", None),
+    ("1M8GDM9AXKP042788", None),
+    ("1XP5DB9X7YN52615", INVALID_FORMAT),
+    ("1XP5DB9X7YN5261588", INVALID_FORMAT),
+    ("1XP5DB9X7YN52615-", INVALID_FORMAT),
+    ("1XP5DB9X7YN52615é", INVALID_FORMAT),
+    ("1XP5DB9X7YN52615I", FORBIDDEN_LETTERS),
+    ("1XP5DB9X7YN5261O8", FORBIDDEN_LETTERS),
+    ("1XP5DB9X7UN526158", INVALID_MODEL_YEAR),
+    ("1XP5DB9X6YN526158", INVALID_CHECK_DIGIT),
+    ("ABC1234567890DEF0", INVALID_CHECK_DIGIT),
+]
+
+
+class TestValidateVin:
+    @pytest.mark.parametrize("vin,error", CASES)
+    def test_validate_vin(self, vin, error):
+        assert validate_vin(vin, strict=True) == error
+
+    def test_not_strict(self):
+        assert validate_vin("1XP5DB9X6UN526158", strict=False) is None
+        assert validate_vin("1XP5DB9X7YN52615I", strict=False) == FORBIDDEN_LETTERS
+
+
+class TestValidateVins:
+    def test_matches_validate_vin(self):
+        vins = [vin for vin, _ in CASES]
+
+        assert validate_vins(vins, strict=True) == [error for _, error in CASES]
+
+    def test_not_strict(self):
+        vins = [vin for vin, _ in CASES]
+
+        assert validate_vins(vins, strict=False) == [
+            validate_vin(vin, strict=False) for vin in vins
+        ]
+
+    def test_empty(self):
+        assert validate_vins([]) == []
+        assert validate_vins(["short"]) == [INVALID_FORMAT]
+
+
+class TestComputeCheckDigit:
+    def test_check_digit(self):
+        assert compute_check_digit("1XP5DB9X7YN526158") == "7"
+        assert compute_check_digit("1M8GDM9A0KP042788") == "X"
+
+
+class TestDecodeModelYear:
+    def test_decode_model_year(self):
+        assert decode_model_year("1XP5DB9X7YN526158") == 2000
+        assert decode_model_year("5YJSA1E14FF087599") == 2015
+        assert decode_model_year("1M8GDM9AXKP042788") == 1989
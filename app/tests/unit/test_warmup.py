@@ -0,0 +1,277 @@
+import json
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.main import app
+from app.prefix_decoder import PrefixDecoder
+from app.rate_limiter import RateLimiter
+from app.routers import warmup
+from app.vin_validation import compute_check_digit
+from app.warmup import WarmupJob, read_vins
+from caching.sqlite_cache import SqliteCache
+
+module_path = "app.warmup.{}"
+client = TestClient(app)
+
+
+def make_vin(serial: int) -> str:
+    vin = f"1XPWD40X0ED{serial:06d}"
+    return vin[:8] + compute_check_digit(vin) + vin[9:]
+
+
+VINS = [make_vin(serial) for serial in range(5)]
+
+
+@pytest.fixture
+def mock_cache():
+    dummy_cache = MagicMock(spec=SqliteCache)
+    dummy_cache.get_many.return_value = {}
+    return dummy_cache
+
+
+@pytest.fixture
+def mock_make_batch_chunk_request():
+    async def make_batch_chunk_request(vins):
+        return {vin: {"VIN": vin, "Make": "PETERBILT", "Model": "389"} for vin in vins}
+
+    with patch(
+        module_path.format("make_batch_chunk_request"),
+        side_effect=make_batch_chunk_request,
+    ) as mock_make_batch_chunk_request:
+        yield mock_make_batch_chunk_request
+
+
+@pytest.fixture(autouse=True)
+def mock_prefix_decoder():
+    with patch(
+        module_path.format("prefix_decoder"), spec=PrefixDecoder
+    ) as dummy_prefix_decoder:
+        yield dummy_prefix_decoder
+
+
+@pytest.fixture
+def vins_path(tmp_path):
+    path = tmp_path / "vins.csv"
+    path.write_text("vin\n" + "\n".join(VINS) + "\n")
+    return str(path)
+
+
+class TestReadVins:
+    def test_csv_with_header(self, tmp_path):
+        path = tmp_path / "vins.csv"
+        path.write_text("make,vin\nPETERBILT, 1XPWD40X7ED215313 \nFORD,\n")
+
+        assert list(read_vins(str(path))) == ["1XPWD40X7ED215313"]
+
+    def test_csv_without_header(self, tmp_path):
+        path = tmp_path / "vins.csv"
+        path.write_text("1XPWD40X7ED215313\n1XP5DB9X7YN526158\n")
+
+        assert list(read_vins(str(path))) == ["1XPWD40X7ED215313", "1XP5DB9X7YN526158"]
+
+    def test_jsonl(self, tmp_path):
+        path = tmp_path / "vins.jsonl"
+        path.write_text(
+            '"1XPWD40X7ED215313"\n\n{"Input VIN Requested": "1XP5DB9X7YN526158"}\n'
+        )
+
+        assert list(read_vins(str(path))) == ["1XPWD40X7ED215313", "1XP5DB9X7YN526158"]
+
+    def test_export_parquet(self, tmp_path):
+        path = tmp_path / "vin_cache.parquet"
+        table = pa.table({"vin": ["1XPWD40X7ED215313"], "make": ["PETERBILT"]})
+        pq.write_table(table, str(path))
+
+        assert list(read_vins(str(path))) == ["1XPWD40X7ED215313"]
+
+    def test_unsupported_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            read_vins(str(tmp_path / "vins.txt"))
+
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_calls_are_spaced_out(self):
+        rate_limiter = RateLimiter(rate=10)
+
+        with patch("app.rate_limiter.time") as mock_time, patch(
+            "app.rate_limiter.asyncio.sleep", new_callable=AsyncMock
+        ) as mock_sleep:
+            mock_time.monotonic.return_value = 100.0
+            for _ in range(3):
+                await rate_limiter.acquire()
+
+        assert [call.args[0] for call in mock_sleep.await_args_list] == pytest.approx(
+            [0.1, 0.2]
+        )
+
+
+class TestWarmupJob:
+    @pytest.mark.asyncio
+    async def test_run(self, vins_path, mock_cache, mock_make_batch_chunk_request):
+        with open(vins_path, "a") as vins_file:
+            vins_file.write(f"InvalidVIN\n{VINS[0]}\n")
+        mock_cache.get_many.side_effect = [
+            {VINS[1]: {"Make": "PETERBILT"}},
+            {},
+            {VINS[0]: {"Make": "PETERBILT"}},
+        ]
+
+        status = await WarmupJob(vins_path, mock_cache, batch_size=3).run()
+
+        assert status["state"] == "done"
+        assert status["done"] is True
+        assert status["offset"] == 7
+        assert status["cached"] == 4
+        assert status["skipped"] == 2
+        assert status["invalid"] == 1
+        assert mock_cache.set_many.call_count == 2
+        assert set(mock_cache.set_many.call_args_list[0].args[0]) == {
+            VINS[0],
+            VINS[2],
+        }
+        with open(f"{vins_path}.warmup.json") as progress_file:
+            assert json.load(progress_file)["offset"] == 7
+
+    @pytest.mark.asyncio
+    async def test_resumes_from_saved_progress(
+        self, vins_path, mock_cache, mock_make_batch_chunk_request
+    ):
+        job = WarmupJob(vins_path, mock_cache, batch_size=10)
+        job.progress["offset"] = 3
+        job.save_progress()
+
+        status = await WarmupJob(vins_path, mock_cache, batch_size=10).run()
+
+        assert status["offset"] == 5
+        mock_make_batch_chunk_request.assert_called_once_with(VINS[3:])
+
+    @pytest.mark.asyncio
+    async def test_changed_file_starts_over(
+        self, vins_path, mock_cache, mock_make_batch_chunk_request
+    ):
+        job = WarmupJob(vins_path, mock_cache, batch_size=10)
+        job.progress["offset"] = 3
+        job.save_progress()
+        with open(vins_path, "a") as vins_file:
+            vins_file.write(f"{make_vin(5)}\n")
+
+        await WarmupJob(vins_path, mock_cache, batch_size=10).run()
+
+        mock_make_batch_chunk_request.assert_called_once_with(VINS + [make_vin(5)])
+
+    @pytest.mark.asyncio
+    async def test_failed_requests(self, vins_path, mock_cache):
+        with patch(
+            module_path.format("make_batch_chunk_request"), return_value=None
+        ) as mock_make_batch_chunk_request:
+            status = await WarmupJob(vins_path, mock_cache).run()
+
+        assert status["state"] == "failed"
+        assert status["done"] is False
+        assert status["offset"] == 0
+        assert status["failed"] == 5
+        assert status["cached"] == 0
+        mock_make_batch_chunk_request.assert_called_once()
+        mock_cache.set_many.assert_called_once_with({})
+
+    @pytest.mark.asyncio
+    async def test_resume_retries_failed_requests(
+        self, vins_path, mock_cache, mock_make_batch_chunk_request
+    ):
+        decode = mock_make_batch_chunk_request.side_effect
+
+        async def fail_after_first_batch(vins):
+            return await decode(vins) if VINS[0] in vins else None
+
+        mock_make_batch_chunk_request.side_effect = fail_after_first_batch
+        status = await WarmupJob(vins_path, mock_cache, batch_size=3).run()
+
+        assert status["state"] == "failed"
+        assert status["offset"] == 3
+        assert status["cached"] == 3
+        assert status["failed"] == 2
+        with open(f"{vins_path}.warmup.json") as progress_file:
+            assert json.load(progress_file)["offset"] == 3
+
+        mock_make_batch_chunk_request.reset_mock()
+        mock_make_batch_chunk_request.side_effect = decode
+        status = await WarmupJob(vins_path, mock_cache, batch_size=3).run()
+
+        assert status["state"] == "done"
+        assert status["offset"] == 5
+        assert status["cached"] == 5
+        mock_make_batch_chunk_request.assert_called_once_with(VINS[3:])
+
+    @pytest.mark.asyncio
+    async def test_sqlite_cache_is_called_off_the_event_loop(
+        self, vins_path, temporary_database, mock_make_batch_chunk_request
+    ):
+        sqlite_cache = SqliteCache(temporary_database)
+        event_loop_thread = threading.get_ident()
+        cache_threads = set()
+
+        def record_thread(method):
+            def call(*args, **kwargs):
+                cache_threads.add(threading.get_ident())
+                return method(*args, **kwargs)
+
+            return call
+
+        with patch.object(
+            sqlite_cache, "get_many", record_thread(sqlite_cache.get_many)
+        ), patch.object(sqlite_cache, "set_many", record_thread(sqlite_cache.set_many)):
+            status = await WarmupJob(vins_path, sqlite_cache).run()
+
+        assert status["cached"] == 5
+        assert event_loop_thread not in cache_threads
+        assert set(sqlite_cache.get_many(VINS)) == set(VINS)
+
+
+class TestWarmupEndpoint:
+    @pytest.fixture(autouse=True)
+    def reset_job(self, tmp_path):
+        with patch.object(warmup, "warmup_directory", str(tmp_path)), patch.object(
+            warmup, "warmup_job", None
+        ), patch.object(warmup, "warmup_task", None):
+            yield
+
+    def test_start_and_read_status(self, vins_path):
+        with patch.object(warmup.WarmupJob, "run", new_callable=AsyncMock):
+            response = client.post("/warmup", json={"path": "vins.csv"})
+
+            assert response.status_code == 202
+            assert response.json()["state"] == "pending"
+            assert client.get("/warmup").json()["path"] == vins_path
+
+    def test_path_outside_directory(self):
+        response = client.post("/warmup", json={"path": "../vins.csv"})
+
+        assert response.status_code == 400
+
+    def test_unsupported_format(self):
+        response = client.post("/warmup", json={"path": "vins.txt"})
+
+        assert response.status_code == 400
+
+    def test_missing_file(self):
+        response = client.post("/warmup", json={"path": "missing.csv"})
+
+        assert response.status_code == 404
+
+    def test_job_already_running(self, vins_path):
+        running_task = MagicMock()
+        running_task.done.return_value = False
+
+        with patch.object(warmup, "warmup_task", running_task):
+            response = client.post("/warmup", json={"path": "vins.csv"})
+
+        assert response.status_code == 409
+
+    def test_no_job_started(self):
+        assert client.get("/warmup").status_code == 404
@@ -27,3 +27,39 @@ def build_response(vehicle_object: List[Dict[str, Any]], vin: str) -> Dict[str,
     vehicle_details["Input VIN Requested"] = vin
 
     return vehicle_details
+
+
+# Maps the flat DecodeVINValuesBatch keys onto the variable names returned by DecodeVin.
+BATCH_RESULT_KEYS = {
+    "Make": "Make",
+    "Model": "Model",
+    "ModelYear": "Model Year",
+    "BodyClass": "Body Class",
+}
+
+
+def build_batch_response(batch_result: Dict[str, Any], vin: str) -> Dict[str, Any]:
+    """
+    Parses a single result of the vPIC batch API into the shape produced by build_response.
+
+    :param batch_result: One entry of the "Results" list returned by DecodeVINValuesBatch.
+    :type batch_result: Dict[str, Any]
+    :param vin: The VIN for which the vehicle details are fetched.
+    :type vin: str
+    :return: A dictionary containing the parsed vehicle details.
+    :rtype: Dict[str, Any]
+    """
+    if not batch_result:
+        return {}
+    vehicle_details = dict()
+    for batch_key, key in BATCH_RESULT_KEYS.items():
+        if batch_key in batch_result:
+            # The batch API reports missing values as empty strings, DecodeVin as nulls.
+            vehicle_details[key] = batch_result[batch_key] or None
+
+    if not any(vehicle_details.values()):
+        return {}
+
+    vehicle_details["Input VIN Requested"] = vin
+
+    return vehicle_details
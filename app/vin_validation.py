@@ -0,0 +1,169 @@
+import string
+from operator import mul
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.config import vin_strict_validation
+
+VIN_LENGTH = 17
+CHECK_DIGIT_INDEX = 8
+MODEL_YEAR_INDEX = 9
+
+INVALID_FORMAT = "VIN should be a 17 characters alpha-numeric string."
+FORBIDDEN_LETTERS = "VIN should not contain the letters I, O or Q."
+INVALID_MODEL_YEAR = "VIN has an invalid model year code at position 10."
+INVALID_CHECK_DIGIT = (
+    "VIN check digit at position 9 does not match the rest of the VIN."
+)
+
+# Values the characters of a VIN are transliterated to for the check digit computation.
+# I, O and Q are left out, as they are not allowed in VINs.
+TRANSLITERATION = {
+    **{digit: int(digit) for digit in string.digits},
+    **dict(zip("ABCDEFGH", range(1, 9))),
+    **dict(zip("JKLMN", range(1, 6))),
+    "P": 7,
+    "R": 9,
+    **dict(zip("STUVWXYZ", range(2, 10))),
+}
+TRANSLITERATION.update(
+    {letter.lower(): value for letter, value in list(TRANSLITERATION.items())}
+)
+WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+CHECK_DIGITS = "0123456789X"
+
+# Model year codes, in the order of the 30 year cycle starting in 1980 (and again in 2010).
+MODEL_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"
+MODEL_YEARS = {code: 1980 + index for index, code in enumerate(MODEL_YEAR_CODES)}
+MODEL_YEARS.update({code.lower(): year for code, year in list(MODEL_YEARS.items())})
+
+# Lookup tables indexed by character code, for validating many VINs at once.
+# -1 marks the characters that are not allowed in a VIN.
+TRANSLITERATION_TABLE = np.full(256, -1, dtype=np.int16)
+for character, value in TRANSLITERATION.items():
+    TRANSLITERATION_TABLE[ord(character)] = value
+for character in "IOQioq":
+    TRANSLITERATION_TABLE[ord(character)] = -2
+MODEL_YEAR_TABLE = np.zeros(256, dtype=bool)
+for character in MODEL_YEARS:
+    MODEL_YEAR_TABLE[ord(character)] = True
+CHECK_DIGIT_TABLE = np.frombuffer(CHECK_DIGITS.encode(), dtype=np.uint8)
+WEIGHT_VECTOR = np.array(WEIGHTS, dtype=np.int32)
+
+
+def validate_vin(vin: str, strict: bool = vin_strict_validation) -> Optional[str]:
+    """
+    Checks the structure of a VIN without any I/O.
+
+    :param vin: The VIN to check.
+    :type vin: str
+    :param strict: Also check the model year code and the check digit, which are mandatory
+        for vehicles sold in North America.
+    :type strict: bool
+    :return: The reason the VIN is invalid, or None if it is valid.
+    :rtype: Optional[str]
+    """
+    if len(vin) != VIN_LENGTH:
+        return INVALID_FORMAT
+    try:
+        values = [TRANSLITERATION[character] for character in vin]
+    except KeyError:
+        if vin.isalnum() and vin.isascii():
+            return FORBIDDEN_LETTERS
+        return INVALID_FORMAT
+    if not strict:
+        return None
+    if vin[MODEL_YEAR_INDEX] not in MODEL_YEARS:
+        return INVALID_MODEL_YEAR
+    check_digit = CHECK_DIGITS[sum(map(mul, values, WEIGHTS)) % 11]
+    if vin[CHECK_DIGIT_INDEX].upper() != check_digit:
+        return INVALID_CHECK_DIGIT
+    return None
+
+
+def validate_vins(
+    vins: Sequence[str], strict: bool = vin_strict_validation
+) -> List[Optional[str]]:
+    """
+    Checks the structure of several VINs at once, with the same rules as validate_vin.
+
+    :param vins: The VINs to check.
+    :type vins: Sequence[str]
+    :param strict: Also check the model year codes and the check digits.
+    :type strict: bool
+    :return: The reason each VIN is invalid, or None for the valid ones, in order.
+    :rtype: List[Optional[str]]
+    """
+    errors = [None] * len(vins)
+    candidates = []
+    for index, vin in enumerate(vins):
+        if len(vin) == VIN_LENGTH and vin.isascii():
+            candidates.append(index)
+        else:
+            errors[index] = INVALID_FORMAT
+    if not candidates:
+        return errors
+
+    encoded = "".join(vins[index] for index in candidates).encode("ascii")
+    characters = np.frombuffer(encoded, dtype=np.uint8).reshape(-1, VIN_LENGTH)
+    values = TRANSLITERATION_TABLE[characters]
+    invalid_format = (values == -1).any(axis=1)
+    forbidden_letters = ~invalid_format & (values == -2).any(axis=1)
+    if strict:
+        well_formed = ~(invalid_format | forbidden_letters)
+        invalid_model_year = (
+            well_formed & ~MODEL_YEAR_TABLE[characters[:, MODEL_YEAR_INDEX]]
+        )
+        check_digits = CHECK_DIGIT_TABLE[(values @ WEIGHT_VECTOR) % 11]
+        # Lower case letters are 32 above their upper case counterparts.
+        given_check_digits = characters[:, CHECK_DIGIT_INDEX]
+        given_check_digits = np.where(
+            given_check_digits >= ord("a"), given_check_digits - 32, given_check_digits
+        )
+        invalid_check_digit = (
+            well_formed & ~invalid_model_year & (given_check_digits != check_digits)
+        )
+
+    for position, index in enumerate(candidates):
+        if invalid_format[position]:
+            errors[index] = INVALID_FORMAT
+        elif forbidden_letters[position]:
+            errors[index] = FORBIDDEN_LETTERS
+        elif strict and invalid_model_year[position]:
+            errors[index] = INVALID_MODEL_YEAR
+        elif strict and invalid_check_digit[position]:
+            errors[index] = INVALID_CHECK_DIGIT
+    return errors
+
+
+def compute_check_digit(vin: str) -> str:
+    """
+    Computes the check digit of a VIN, ignoring the character at position 9.
+
+    :param vin: A 17 characters VIN without I, O or Q.
+    :type vin: str
+    :return: The check digit, "0" to "9" or "X".
+    :rtype: str
+    :raises KeyError: If the VIN contains a character that is not allowed.
+    """
+    values = [TRANSLITERATION[character] for character in vin]
+    return CHECK_DIGITS[sum(map(mul, values, WEIGHTS)) % 11]
+
+
+def decode_model_year(vin: str) -> Optional[int]:
+    """
+    Decodes the model year from position 10 of a VIN.
+
+    The code repeats every 30 years. For passenger cars, trucks and buses, a letter at
+    position 7 marks the cycle starting in 2010 and a digit the one starting in 1980.
+
+    :param vin: A valid VIN.
+    :type vin: str
+    :return: The model year, or None if position 10 is not a model year code.
+    :rtype: Optional[int]
+    """
+    model_year = MODEL_YEARS.get(vin[MODEL_YEAR_INDEX])
+    if model_year is not None and vin[6].isalpha():
+        model_year += 30
+    return model_year
@@ -0,0 +1,358 @@
+"""
+Fills the cache from a list of VINs, so the first requests after a deploy or a cache wipe
+do not all go to the vPIC API.
+
+Usage: python -m app.warmup VINS_FILE [--concurrency N] [--rate N] [--batch-size N] [--restart]
+"""
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional
+
+import pyarrow.parquet as pq
+
+from app.config import (
+    vpic_batch_size,
+    warmup_batch_size,
+    warmup_concurrency,
+    warmup_rate,
+)
+from app.http_session import HttpSession
+from app.prefix_decoder import prefix_decoder
+from app.rate_limiter import RateLimiter
+from app.routers.lookup import make_batch_chunk_request
+from app.utils import build_batch_response
+from app.vin_validation import validate_vins
+from caching.cache_interface import CacheInterface
+from caching.factory import cache
+from database.connection import Database
+from log.logger import logger
+from metrics.metrics import server_timings, warmup_vins
+from models.database_models import create_tables
+
+SUPPORTED_FORMATS = (".csv", ".jsonl", ".parquet")
+# Columns, or JSON keys, holding the VIN. "vin" is the column of the /export output.
+VIN_COLUMNS = ("vin", "VIN", "Input VIN Requested")
+PARQUET_BATCH_SIZE = 10000
+
+
+def read_vins(path: str) -> Iterator[str]:
+    """
+    Reads the VINs from a CSV, JSONL or parquet file, in order.
+
+    CSV files either have a header with one of the VIN_COLUMNS or hold the VIN in their first
+    column. JSONL lines are either VIN strings or objects with one of the VIN_COLUMNS keys.
+    Parquet files, such as the /export output, must have one of the VIN_COLUMNS columns.
+
+    :param path: The path of the file.
+    :type path: str
+    :return: An iterator over the VINs, stripped of surrounding whitespace.
+    :rtype: Iterator[str]
+    :raises ValueError: If the file format is not supported or no VIN column is found.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return read_csv_vins(path)
+    elif extension == ".jsonl":
+        return read_jsonl_vins(path)
+    elif extension == ".parquet":
+        return read_parquet_vins(path)
+    raise ValueError(
+        f"Unsupported VIN list format: {extension}, expected one of {SUPPORTED_FORMATS}."
+    )
+
+
+def read_csv_vins(path: str) -> Iterator[str]:
+    with open(path, newline="") as vins_file:
+        rows = csv.reader(vins_file)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [column for column in VIN_COLUMNS if column in header]
+        if columns:
+            index = header.index(columns[0])
+        else:
+            index = 0
+            rows = itertools.chain([header], rows)
+        for row in rows:
+            if len(row) > index and row[index].strip():
+                yield row[index].strip()
+
+
+def read_jsonl_vins(path: str) -> Iterator[str]:
+    with open(path) as vins_file:
+        for line in vins_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict):
+                record = next(
+                    (record[column] for column in VIN_COLUMNS if column in record), None
+                )
+            if isinstance(record, str) and record.strip():
+                yield record.strip()
+
+
+def read_parquet_vins(path: str) -> Iterator[str]:
+    parquet_file = pq.ParquetFile(path)
+    columns = [column for column in VIN_COLUMNS if column in parquet_file.schema.names]
+    if not columns:
+        raise ValueError(
+            f"No VIN column found in {path}, expected one of {VIN_COLUMNS}."
+        )
+    for batch in parquet_file.iter_batches(
+        batch_size=PARQUET_BATCH_SIZE, columns=columns[:1]
+    ):
+        for vin in batch.column(0).to_pylist():
+            if vin and vin.strip():
+                yield vin.strip()
+
+
+class WarmupJob:
+    """
+    Fills the cache with the vehicle details of the VINs listed in a file.
+
+    The VINs are processed batch_size at a time: the invalid and already cached ones are
+    skipped, the others are decoded through the vPIC batch API, with at most concurrency
+    requests in flight and rate started per second, and inserted in a single transaction.
+    The progress is saved next to the file after every batch, so an interrupted job
+    resumes where it stopped.
+
+    If a request to the vPIC API fails, the job stops in the "failed" state with its
+    progress saved at the start of the batch, so resuming it retries the VINs of that batch.
+    Those decoded by the other requests of the batch are skipped then, as they are cached.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache: CacheInterface,
+        concurrency: int = warmup_concurrency,
+        rate: Optional[float] = warmup_rate,
+        batch_size: int = warmup_batch_size,
+        progress_path: Optional[str] = None,
+    ):
+        self.path = path
+        self.cache = cache
+        self.concurrency = concurrency
+        self.rate_limiter = RateLimiter(rate)
+        self.batch_size = batch_size
+        self.progress_path = progress_path or f"{path}.warmup.json"
+        self.state = "pending"
+        self.error = None
+        self.progress = self.new_progress()
+
+    def new_progress(self) -> Dict[str, Any]:
+        stat = os.stat(self.path)
+        return {
+            "source": {"size": stat.st_size, "mtime": stat.st_mtime},
+            "offset": 0,
+            "cached": 0,
+            "skipped": 0,
+            "invalid": 0,
+            "undecoded": 0,
+            "failed": 0,
+            "done": False,
+        }
+
+    def load_progress(self):
+        """
+        Resumes from the saved progress, unless the file changed since it was saved.
+        """
+        try:
+            with open(self.progress_path) as progress_file:
+                progress = json.load(progress_file)
+        except FileNotFoundError:
+            return
+        if progress.get("source") == self.progress["source"]:
+            self.progress = progress
+        else:
+            logger.info(f"{self.path} changed since the last warm-up, starting over.")
+
+    def save_progress(self):
+        directory = os.path.dirname(os.path.abspath(self.progress_path))
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(file_descriptor, "w") as progress_file:
+            json.dump(self.progress, progress_file)
+        os.replace(temporary_path, self.progress_path)
+
+    async def run(self, restart: bool = False) -> Dict[str, Any]:
+        """
+        Runs the job until every VIN of the file has been processed, or a request to the
+        vPIC API fails.
+
+        :param restart: Ignore the saved progress and start from the first VIN.
+        :type restart: bool
+        :return: The status of the job.
+        :rtype: Dict[str, Any]
+        :raises Exception: Any exception reading the file or writing the cache.
+        """
+        # Started from a request, but runs past its response, so reports no timings.
+        server_timings.set(None)
+        self.state = "running"
+        loop = asyncio.get_running_loop()
+        try:
+            if not restart:
+                self.load_progress()
+            vins = itertools.islice(read_vins(self.path), self.progress["offset"], None)
+            while True:
+                # Reading the file blocks, so it is kept off the event loop.
+                batch = await loop.run_in_executor(
+                    None, list, itertools.islice(vins, self.batch_size)
+                )
+                if not batch:
+                    break
+                failed = await self.process_batch(batch)
+                if failed:
+                    # The offset stays at the start of the batch, so that resuming the job
+                    # retries the VINs that were not decoded.
+                    await loop.run_in_executor(None, self.save_progress)
+                    self.state = "failed"
+                    self.error = (
+                        f"The vPIC API is unavailable, {failed} VINs were not decoded. "
+                        f"Resume the job to retry them."
+                    )
+                    return self.status()
+                self.progress["offset"] += len(batch)
+                await loop.run_in_executor(None, self.save_progress)
+            self.progress["done"] = True
+            await loop.run_in_executor(None, self.save_progress)
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "cancelled"
+            raise
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            raise
+        return self.status()
+
+    async def process_batch(self, vins: List[str]) -> int:
+        """
+        Decodes and caches the VINs of a batch that are valid and not cached yet.
+
+        :param vins: The VINs of the batch.
+        :type vins: List[str]
+        :return: The number of VINs whose request to the vPIC API failed.
+        :rtype: int
+        """
+        valid_vins = []
+        for vin, error in zip(vins, validate_vins(vins)):
+            if error:
+                self.count("invalid")
+            else:
+                valid_vins.append(vin)
+        distinct_vins = list(dict.fromkeys(valid_vins))
+        self.count("skipped", len(valid_vins) - len(distinct_vins))
+        valid_vins = distinct_vins
+
+        # The cache may only have blocking methods, such as SqliteCache, so it is called
+        # off the event loop.
+        loop = asyncio.get_running_loop()
+        cached_vins = await loop.run_in_executor(None, self.cache.get_many, valid_vins)
+        self.count("skipped", len(cached_vins))
+        missing_vins = [vin for vin in valid_vins if vin not in cached_vins]
+        if not missing_vins:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def decode_chunk(chunk: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+            async with semaphore:
+                await self.rate_limiter.acquire()
+                return await make_batch_chunk_request(chunk)
+
+        chunks = [
+            missing_vins[start : start + vpic_batch_size]
+            for start in range(0, len(missing_vins), vpic_batch_size)
+        ]
+        batch_results = {}
+        failed_vins = set()
+        chunk_results = await asyncio.gather(*map(decode_chunk, chunks))
+        for chunk, results in zip(chunks, chunk_results):
+            if results is None:
+                failed_vins.update(chunk)
+            else:
+                batch_results.update(results)
+        self.count("failed", len(failed_vins))
+
+        fetched_details = {}
+        for vin in missing_vins:
+            if vin in failed_vins:
+                continue
+            vehicle_details = build_batch_response(batch_results.get(vin), vin)
+            if vehicle_details:
+                fetched_details[vin] = vehicle_details
+            else:
+                self.count("undecoded")
+        await loop.run_in_executor(None, self.cache.set_many, fetched_details)
+        self.count("cached", len(fetched_details))
+        for vin, vehicle_details in fetched_details.items():
+            prefix_decoder.observe(vin, vehicle_details)
+        return len(failed_vins)
+
+    def count(self, result: str, amount: int = 1):
+        if amount:
+            self.progress[result] += amount
+            warmup_vins.inc(result, amount=amount)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Returns the state and progress of the job.
+
+        :rtype: Dict[str, Any]
+        """
+        status = {"path": self.path, "state": self.state, "error": self.error}
+        status.update(
+            (key, value) for key, value in self.progress.items() if key != "source"
+        )
+        return status
+
+
+async def warm_up(path: str, restart: bool = False, **options) -> Dict[str, Any]:
+    """
+    Runs a warm-up job writing to the SQLite tier of the cache, then closes the HTTP session.
+
+    :param path: The path of the VIN list.
+    :type path: str
+    :param restart: Ignore the saved progress and start from the first VIN.
+    :type restart: bool
+    :return: The status of the job.
+    :rtype: Dict[str, Any]
+    """
+    try:
+        return await WarmupJob(path, cache.backend, **options).run(restart=restart)
+    finally:
+        await HttpSession.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="CSV, JSONL or parquet file listing the VINs.")
+    parser.add_argument("--concurrency", type=int, default=warmup_concurrency)
+    parser.add_argument("--rate", type=float, default=warmup_rate)
+    parser.add_argument("--batch-size", type=int, default=warmup_batch_size)
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore the saved progress."
+    )
+    arguments = parser.parse_args()
+    create_tables(Database.get_engine())
+    status = asyncio.run(
+        warm_up(
+            arguments.path,
+            restart=arguments.restart,
+            concurrency=arguments.concurrency,
+            rate=arguments.rate,
+            batch_size=arguments.batch_size,
+        )
+    )
+    print(json.dumps(status, indent=2))
+
+
+if __name__ == "__main__":
+    main()
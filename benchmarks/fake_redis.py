@@ -0,0 +1,166 @@
+"""
+Local stand-in for a Redis server, used by the tests and to try the shared cache backend out
+with several workers on one machine.
+
+Speaks the Redis serialization protocol and implements the commands used by the cache:
+PING, AUTH, SELECT, GET, SET (with EX), MGET, DEL, FLUSHDB, PUBLISH and SUBSCRIBE. Keys live
+in memory, in a single database.
+
+Usage (from the repository root):
+    python -m benchmarks.fake_redis --port 6379
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class FakeRedis:
+    """
+    The keys and channel subscribers shared by the connections of the server.
+    """
+
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.commands = 0
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, command: List[bytes], writer: asyncio.StreamWriter) -> Any:
+        self.commands += 1
+        name, arguments = command[0].upper(), command[1:]
+        if name == b"PING":
+            return "PONG"
+        if name in (b"AUTH", b"SELECT"):
+            return "OK"
+        if name == b"GET":
+            return self.get(arguments[0])
+        if name == b"MGET":
+            return [self.get(key) for key in arguments]
+        if name == b"SET":
+            expires_at = None
+            if len(arguments) == 4 and arguments[2].upper() == b"EX":
+                expires_at = time.monotonic() + int(arguments[3])
+            self.data[arguments[0]] = (arguments[1], expires_at)
+            return "OK"
+        if name == b"DEL":
+            deleted = 0
+            for key in arguments:
+                if self.get(key) is not None:
+                    del self.data[key]
+                    deleted += 1
+            return deleted
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return "OK"
+        if name == b"PUBLISH":
+            channel, message = arguments
+            subscribers = self.subscribers.get(channel, set())
+            for subscriber in subscribers:
+                subscriber.write(encode_reply([b"message", channel, message]))
+            return len(subscribers)
+        if name == b"SUBSCRIBE":
+            replies = []
+            for count, channel in enumerate(arguments, start=1):
+                self.subscribers.setdefault(channel, set()).add(writer)
+                replies.append(encode_reply([b"subscribe", channel, count]))
+            return Raw(b"".join(replies))
+        return Error(f"ERR unknown command '{name.decode()}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await read_command(reader)
+                if command is None:
+                    break
+                writer.write(encode_reply(self.execute(command, writer)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for subscribers in self.subscribers.values():
+                subscribers.discard(writer)
+            writer.close()
+
+
+class Raw(bytes):
+    """
+    A reply that is already encoded.
+    """
+
+
+class Error(str):
+    """
+    An error reply.
+    """
+
+
+async def read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Inline command, e.g. typed in telnet.
+        return line.split()
+    command = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        command.append((await reader.readexactly(length + 2))[:-2])
+    return command
+
+
+def encode_reply(reply: Any) -> bytes:
+    if isinstance(reply, Raw):
+        return bytes(reply)
+    if isinstance(reply, Error):
+        return b"-%s\r\n" % reply.encode()
+    if isinstance(reply, str):
+        return b"+%s\r\n" % reply.encode()
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(map(encode_reply, reply))
+
+
+async def start_server(
+    host: str = "127.0.0.1", port: int = 0
+) -> Tuple[asyncio.AbstractServer, FakeRedis, int]:
+    """
+    Starts the fake Redis server on the running event loop.
+
+    :param port: The port to listen on, 0 picks a free one.
+    :type port: int
+    :return: The server, to close it with, its keys and subscribers, and the bound port.
+    :rtype: Tuple[asyncio.AbstractServer, FakeRedis, int]
+    """
+    fake_redis = FakeRedis()
+    server = await asyncio.start_server(fake_redis.handle, host, port)
+    return server, fake_redis, server.sockets[0].getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+
+    async def serve():
+        server, _, port = await start_server(args.host, args.port)
+        print(f"Listening on {args.host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Local stand-in for the vPIC API, used by the load tests.
+
+Serves the DecodeVin and DecodeVINValuesBatch endpoints with made-up vehicle details.
+Every request is delayed by the configured latency, and fails with a 500 response with
+the configured probability.
+
+Usage (from the repository root):
+    python -m benchmarks.fake_vpic --port 8081 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+from typing import Any, Dict, List, Tuple
+
+from aiohttp import web
+
+MAKES = ["PETERBILT", "MINI", "FORD", "TOYOTA", "HONDA"]
+BODY_CLASSES = [
+    "Truck-Tractor",
+    "Hatchback/Liftback/Notchback",
+    "Pickup",
+    "Sedan/Saloon",
+]
+
+
+def decode(vin: str) -> Dict[str, str]:
+    """
+    Returns made-up vehicle details that only depend on the VIN.
+
+    :param vin: The VIN to decode.
+    :type vin: str
+    :return: The vehicle details, keyed like the DecodeVINValuesBatch results.
+    :rtype: Dict[str, str]
+    """
+    seed = sum(map(ord, vin))
+    return {
+        "Make": MAKES[seed % len(MAKES)],
+        "Model": f"MODEL {seed % 100}",
+        "ModelYear": str(1990 + seed % 35),
+        "BodyClass": BODY_CLASSES[seed % len(BODY_CLASSES)],
+    }
+
+
+def decode_variables(vin: str) -> List[Dict[str, Any]]:
+    vehicle_details = decode(vin)
+    return [
+        {"Variable": "Make", "Value": vehicle_details["Make"]},
+        {"Variable": "Model", "Value": vehicle_details["Model"]},
+        {"Variable": "Model Year", "Value": vehicle_details["ModelYear"]},
+        {"Variable": "Body Class", "Value": vehicle_details["BodyClass"]},
+    ]
+
+
+def create_app(latency: float = 0.0, error_rate: float = 0.0) -> web.Application:
+    """
+    Creates the fake vPIC application.
+
+    :param latency: The seconds every request waits before it is answered.
+    :type latency: float
+    :param error_rate: The probability, between 0 and 1, of answering with a 500 response.
+    :type error_rate: float
+    :return: The aiohttp application.
+    :rtype: web.Application
+    """
+    stats = {"requests": 0, "errors": 0}
+
+    async def respond(results: List[Dict[str, Any]]) -> web.Response:
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            raise web.HTTPInternalServerError()
+        return web.json_response({"Count": len(results), "Results": results})
+
+    async def decode_vin(request: web.Request) -> web.Response:
+        return await respond(decode_variables(request.match_info["vin"]))
+
+    async def decode_vin_values_batch(request: web.Request) -> web.Response:
+        form = await request.post()
+        vins = [vin for vin in form.get("data", "").split(";") if vin]
+        return await respond([dict(decode(vin), VIN=vin) for vin in vins])
+
+    app = web.Application()
+    app["stats"] = stats
+    app.router.add_get("/api/vehicles/DecodeVin/{vin}", decode_vin)
+    app.router.add_post("/api/vehicles/DecodeVINValuesBatch/", decode_vin_values_batch)
+    return app
+
+
+async def start_server(
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> Tuple[web.AppRunner, str]:
+    """
+    Starts the fake vPIC API on the running event loop.
+
+    :param port: The port to listen on, 0 picks a free one.
+    :type port: int
+    :return: The runner, to clean the server up with, and the base URL of the server.
+    :rtype: Tuple[web.AppRunner, str]
+    """
+    runner = web.AppRunner(create_app(latency, error_rate), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_host, bound_port = runner.addresses[0][:2]
+    return runner, f"http://{bound_host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(args.latency, args.error_rate), host=args.host, port=args.port
+    )
+
+
+if __name__ == "__main__":
+    main()
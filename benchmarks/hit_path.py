@@ -0,0 +1,192 @@
+"""
+Compares the CPU cost of /lookup cache hits served as raw JSON bodies with the ones built as
+a dict and encoded by FastAPI.
+
+Both modes serve the same VINs from the in-memory tier. Requests are sent one at a time
+straight to the ASGI app, on a single event loop, so the work measured is the work of the
+app and its middleware on one core. HTTP parsing by the server is left out, and costs the
+same in both modes.
+
+Usage (from the repository root):
+    python -m benchmarks.hit_path --requests 20000 --vins 1000 --rounds 5
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+from unittest.mock import patch
+
+from app.main import app
+from app.routers import lookup
+from benchmarks.load_test import generate_vins, git_commit
+from benchmarks.sqlite_profiles import vehicle_details
+from caching.cache_interface import CacheEntry, CacheInterface
+from caching.memory_cache import MemoryCache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "hit_path.json")
+MODES = {"dict": False, "raw": True}
+
+
+class DictCache(CacheInterface):
+    """
+    Backing cache holding the vehicle details in a dict, so that misses of the in-memory
+    tier cost nothing either. Everything is fetched now, so no hit is stale and refreshed
+    from the vPIC API.
+    """
+
+    def __init__(self, items: Dict[str, dict]):
+        self.items = items
+        self.fetched_at = datetime.datetime.utcnow()
+
+    def get(self, vin: str) -> dict:
+        return self.get_entry(vin).value
+
+    def get_entry(self, vin: str) -> CacheEntry:
+        return CacheEntry(dict(self.items.get(vin, {})), self.fetched_at)
+
+    def set(self, vin: str, vehicle_details: dict):
+        self.items[vin] = vehicle_details
+
+    def delete(self, vin: str) -> bool:
+        return self.items.pop(vin, None) is not None
+
+
+async def get(path: str, query_string: str) -> Tuple[int, bytes]:
+    """
+    Sends a GET request to the ASGI app, as uvicorn would.
+
+    :return: The status and body of the response.
+    :rtype: Tuple[int, bytes]
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"hit-path")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("hit-path", 80),
+    }
+    status = 0
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        else:
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(body)
+
+
+async def measure(vins: List[str], requests: int) -> Dict[str, Any]:
+    """
+    Looks up the VINs in turn, requests times in total.
+
+    :rtype: Dict[str, Any]
+    """
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    statuses = set()
+    for index in range(requests):
+        status, _ = await get("/lookup", f"vin={vins[index % len(vins)]}")
+        statuses.add(status)
+    wall_seconds = time.perf_counter() - wall_started
+    cpu_seconds = time.process_time() - cpu_started
+    return {
+        "requests": requests,
+        "wall_seconds": round(wall_seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "requests_per_second": round(requests / wall_seconds, 1),
+        "requests_per_cpu_second": round(requests / cpu_seconds, 1),
+        "microseconds_per_request": round(cpu_seconds / requests * 1e6, 2),
+        "statuses": sorted(statuses),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    vins = generate_vins("HTPATH", args.vins)
+    cache = MemoryCache(
+        DictCache({vin: vehicle_details(vin) for vin in vins}),
+        max_size=len(vins),
+        ttl=24 * 60 * 60,
+    )
+    results = {mode: [] for mode in MODES}
+    bodies = {}
+    with patch.object(lookup, "cache", cache):
+        for mode, raw_cache_hits in MODES.items():
+            with patch.object(lookup, "lookup_raw_cache_hits", raw_cache_hits):
+                # Loads the in-memory tier, and the bodies kept with it in raw mode.
+                for vin in vins:
+                    bodies.setdefault(mode, []).append(
+                        (await get("/lookup", f"vin={vin}"))[1]
+                    )
+        # Rounds alternate between the modes, so both see the same machine load.
+        for _ in range(args.rounds):
+            for mode, raw_cache_hits in MODES.items():
+                with patch.object(lookup, "lookup_raw_cache_hits", raw_cache_hits):
+                    results[mode].append(await measure(vins, args.requests))
+
+    best = {
+        mode: max(rounds, key=lambda result: result["requests_per_cpu_second"])
+        for mode, rounds in results.items()
+    }
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "parameters": vars(args),
+        "identical_bodies": bodies["dict"] == bodies["raw"],
+        "best": best,
+        "speedup": round(
+            best["raw"]["requests_per_cpu_second"]
+            / best["dict"]["requests_per_cpu_second"],
+            2,
+        ),
+        "rounds": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--vins", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+    output = args.__dict__.pop("output")
+
+    results = asyncio.run(run(args))
+
+    print(f"{'mode':<6} {'req/s':>10} {'req/cpu s':>10} {'us/req':>8}")
+    for mode, result in results["best"].items():
+        print(
+            f"{mode:<6} {result['requests_per_second']:>10} "
+            f"{result['requests_per_cpu_second']:>10} "
+            f"{result['microseconds_per_request']:>8}"
+        )
+    print(
+        f"speedup: {results['speedup']}x, "
+        f"identical bodies: {results['identical_bodies']}"
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Measures the latency and throughput of /lookup, /lookup/batch, /remove and /export.
+
+The app is driven in-process through its ASGI interface at a fixed concurrency, against a
+fresh database and the local vPIC stand-in from benchmarks.fake_vpic. Lookups are measured
+on a cold cache (misses reaching the fake vPIC API), on the in-memory tier, on the
+SQLite tier and for VINs rejected by validation. /export is measured for a growing number of cached rows, both when the
+snapshot has to be built and when it is served as is.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --requests 2000 --concurrency 32 --latency 0.02
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+import httpx
+import pyarrow as pa
+
+from app.config import (
+    async_cache_workers,
+    memory_cache_max_size,
+    memory_cache_ttl,
+    negative_cache_ttl,
+    prefix_decoder_min_samples,
+    prefix_decoder_min_share,
+    vpic_circuit_failure_threshold,
+    vpic_circuit_reset_timeout,
+    vpic_max_retries,
+    vpic_retry_backoff,
+    vpic_retry_backoff_max,
+)
+from app.http_session import HttpSession
+from app.main import app
+from app.prefix_decoder import PrefixDecoder
+from app.rate_limiter import RateLimiter
+from app.resilience import CircuitBreaker, UpstreamPolicy
+from app.routers import export, lookup, remove
+from app.vin_validation import compute_check_digit
+from benchmarks.fake_vpic import start_server
+from benchmarks.sqlite_profiles import vehicle_details
+from caching.async_cache import AsyncCache
+from caching.memory_cache import MemoryCache
+from caching.negative_cache import NegativeCache
+from caching.sqlite_cache import SqliteCache
+from database.connection import DatabasePool
+from models.database_models import create_tables
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "load_test.json")
+
+# (method, url, json body)
+Call = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def generate_vins(prefix: str, count: int) -> List[str]:
+    """
+    Generates VINs that pass validation: the prefix padded to 8 characters, the check digit,
+    the model year code "Y" and a 7 digits serial number.
+    """
+    vins = []
+    for index in range(count):
+        vin = f"{prefix:0<8}0Y{index:07d}"
+        vins.append(vin[:8] + compute_check_digit(vin) + vin[9:])
+    return vins
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(
+    name: str, latencies: List[float], seconds: float, statuses: Counter
+) -> Dict[str, Any]:
+    percentiles = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else latencies * 99
+    )
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "seconds": round(seconds, 4),
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient, name: str, calls: List[Call], concurrency: int
+) -> Dict[str, Any]:
+    """
+    Sends the calls with at most concurrency of them in flight and summarizes their latency.
+
+    :param name: The scenario name reported in the results.
+    :type name: str
+    :param calls: The (method, url, json body) of every request.
+    :type calls: List[Call]
+    :param concurrency: The number of requests in flight at a time.
+    :type concurrency: int
+    :rtype: Dict[str, Any]
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async def send(method: str, url: str, body: Optional[Dict[str, Any]]):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(*call) for call in calls))
+    return summarize(name, latencies, time.perf_counter() - started, statuses)
+
+
+async def measure_export(
+    client: httpx.AsyncClient, name: str, rows: int, headers: Dict[str, str] = None
+) -> Dict[str, Any]:
+    """
+    Downloads /export once, recording its duration, size and peak memory.
+
+    Python allocations are traced with tracemalloc; pyarrow allocates outside of it, so the
+    peak of its memory pool is reported as well. That peak is process wide and never goes
+    down, which is why cache sizes are measured in increasing order.
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    async with client.stream("GET", "/export", headers=headers) as response:
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+    seconds = time.perf_counter() - started
+    python_peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "scenario": name,
+        "rows": rows,
+        "status": response.status_code,
+        "seconds": round(seconds, 4),
+        "bytes": size,
+        "python_peak_bytes": python_peak_bytes,
+        "arrow_peak_bytes": pa.default_memory_pool().max_memory(),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    vpic_server, vpic_url = await start_server(args.latency, args.error_rate)
+    with tempfile.TemporaryDirectory() as directory, ExitStack() as patches:
+        database_pool = DatabasePool(
+            f"sqlite:///{directory}/load_test.db",
+            pool_size=async_cache_workers,
+            max_overflow=0,
+        )
+        create_tables(database_pool.get_engine())
+        sqlite_cache = SqliteCache(database_pool)
+        backing_cache = AsyncCache(sqlite_cache, async_cache_workers)
+        cache = MemoryCache(backing_cache, memory_cache_max_size, memory_cache_ttl)
+        negative_cache = AsyncCache(
+            NegativeCache(database_pool, negative_cache_ttl), async_cache_workers
+        )
+
+        api_url = f"{vpic_url}/api/vehicles/"
+        # Same retries and circuit breaker as the app, but no outbound rate limit, which
+        # would otherwise cap the throughput of the miss scenarios.
+        vpic_upstream = UpstreamPolicy(
+            CircuitBreaker(vpic_circuit_failure_threshold, vpic_circuit_reset_timeout),
+            RateLimiter(None),
+            max_retries=vpic_max_retries,
+            backoff=vpic_retry_backoff,
+            backoff_max=vpic_retry_backoff_max,
+        )
+        for target, attribute, value in [
+            (lookup, "cache", cache),
+            (lookup, "negative_cache", negative_cache),
+            (
+                lookup,
+                "prefix_decoder",
+                PrefixDecoder(prefix_decoder_min_samples, prefix_decoder_min_share),
+            ),
+            (lookup, "vpic_upstream", vpic_upstream),
+            (lookup, "vpic_api_url", api_url + "DecodeVin/{}?format=json"),
+            (lookup, "vpic_batch_api_url", api_url + "DecodeVINValuesBatch/"),
+            (remove, "cache", cache),
+            (remove, "negative_cache", negative_cache),
+            (export, "cache_databases", [database_pool]),
+            (export, "vin_snapshot_path", os.path.join(directory, "snapshot")),
+        ]:
+            patches.enter_context(patch.object(target, attribute, value))
+
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load-test"
+        ) as client:
+            vins = generate_vins("LDTEST", args.requests)
+            lookups = [("GET", f"/lookup?vin={vin}", None) for vin in vins]
+            scenarios = [await drive(client, "lookup_miss", lookups, args.concurrency)]
+            scenarios.append(
+                await drive(client, "lookup_hit_memory", lookups, args.concurrency)
+            )
+            cache.clear()
+            scenarios.append(
+                await drive(client, "lookup_hit_sqlite", lookups, args.concurrency)
+            )
+
+            # Rejected by validation, without touching the cache or the vPIC API.
+            invalid_vins = [
+                vin[:8] + ("1" if vin[8] == "0" else "0") + vin[9:] for vin in vins
+            ]
+            invalid_lookups = [
+                ("GET", f"/lookup?vin={vin}", None) for vin in invalid_vins
+            ]
+            scenarios.append(
+                await drive(client, "lookup_invalid", invalid_lookups, args.concurrency)
+            )
+
+            batch_vins = generate_vins("BATCH", args.requests)
+            batches = [
+                (
+                    "POST",
+                    "/lookup/batch",
+                    {"vins": batch_vins[start : start + args.batch_size]},
+                )
+                for start in range(0, len(batch_vins), args.batch_size)
+            ]
+            scenarios.append(
+                await drive(client, "lookup_batch_miss", batches, args.concurrency)
+            )
+
+            removals = [("DELETE", f"/remove?vin={vin}", None) for vin in vins]
+            scenarios.append(await drive(client, "remove", removals, args.concurrency))
+
+            exports = []
+            cached_rows = len(sqlite_cache.get_many(batch_vins))
+            for rows in sorted(args.export_rows):
+                if rows > cached_rows:
+                    export_vins = generate_vins("EXPRT", rows)[cached_rows - rows :]
+                    for start in range(0, len(export_vins), 10000):
+                        sqlite_cache.set_many(
+                            {
+                                vin: vehicle_details(vin)
+                                for vin in export_vins[start : start + 10000]
+                            }
+                        )
+                    cached_rows = rows
+                exports.append(await measure_export(client, "export_build", rows))
+                export_result = await measure_export(client, "export_snapshot", rows)
+                exports.append(export_result)
+                etag = f'"{sqlite_cache.get_versions()["version"]}"'
+                exports.append(
+                    await measure_export(
+                        client, "export_not_modified", rows, {"If-None-Match": etag}
+                    )
+                )
+
+        await HttpSession.close()
+        backing_cache.close()
+        negative_cache.close()
+        database_pool.get_engine().dispose()
+
+    vpic_stats = dict(vpic_server.app["stats"])
+    await vpic_server.cleanup()
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "parameters": vars(args),
+        "scenarios": scenarios,
+        "export": exports,
+        "fake_vpic": vpic_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds the fake vPIC API waits."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of failed vPIC requests."
+    )
+    parser.add_argument("--export-rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+    output = args.__dict__.pop("output")
+    # One log line per request would dominate the measurements.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = asyncio.run(run(args))
+
+    print(f"{'scenario':<20} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for result in results["scenarios"]:
+        print(
+            f"{result['scenario']:<20} {result['requests_per_second']:>10} "
+            f"{result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}"
+        )
+    print(
+        f"{'export':<20} {'rows':>10} {'seconds':>9} {'bytes':>12} {'arrow peak':>12}"
+    )
+    for result in results["export"]:
+        print(
+            f"{result['scenario']:<20} {result['rows']:>10} {result['seconds']:>9} "
+            f"{result['bytes']:>12} {result['arrow_peak_bytes']:>12}"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
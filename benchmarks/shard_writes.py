@@ -0,0 +1,138 @@
+"""
+Measures write throughput of the sharded SQLite cache as the number of shards grows.
+
+For every shard count, fresh database files are created and several processes, standing in
+for uvicorn workers, write distinct VINs through ShardedSqliteCache.set, one commit per VIN
+as on the lookup path. A single shard is the layout of the "async_sqlite" backend, where
+every writer waits for the lock of the one file.
+
+Usage (from the repository root):
+    python -m benchmarks.shard_writes --shards 1 2 4 8 --workers 8 --rows 1000 --profile durable
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks.load_test import git_commit
+from benchmarks.sqlite_profiles import generate_vins, vehicle_details
+from caching.factory import build_shard_databases
+from caching.sharded_cache import ShardedSqliteCache
+from database.config import DATABASE_PROFILE, DATABASE_PROFILES
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "shard_writes.json")
+
+
+def shard_urls(directory: str, shards: int) -> List[str]:
+    return [f"sqlite:///{directory}/shard_{index}.db" for index in range(shards)]
+
+
+def write_vins(urls: List[str], profile: str, vins: List[str], start, results):
+    """
+    Writes the VINs one commit at a time once every worker is ready, and reports the time
+    it took.
+    """
+    shard_databases = build_shard_databases(urls, profile)
+    cache = ShardedSqliteCache(shard_databases)
+    start.wait()
+    started = time.perf_counter()
+    for vin in vins:
+        cache.set(vin, vehicle_details(vin))
+    results.put((started, time.perf_counter()))
+    for database_pool in shard_databases:
+        database_pool.get_engine().dispose()
+
+
+def benchmark_shards(
+    shards: int, workers: int, rows: int, profile: str
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        urls = shard_urls(directory, shards)
+        # Creates the tables once, rather than in every worker at the same time.
+        for database_pool in build_shard_databases(urls, profile):
+            database_pool.get_engine().dispose()
+        vins = generate_vins(workers * rows)
+        start = multiprocessing.Barrier(workers)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=write_vins,
+                args=(
+                    urls,
+                    profile,
+                    vins[index * rows : (index + 1) * rows],
+                    start,
+                    results,
+                ),
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        timings = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        shard_databases = build_shard_databases(urls, profile)
+        written = ShardedSqliteCache(shard_databases).get_size()["rows"]
+        for database_pool in shard_databases:
+            database_pool.get_engine().dispose()
+
+    seconds = max(finished for _, finished in timings) - min(
+        started for started, _ in timings
+    )
+    return {
+        "shards": shards,
+        "workers": workers,
+        "rows": workers * rows,
+        "written": written,
+        "seconds": round(seconds, 3),
+        "writes_per_second": round(workers * rows / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000, help="VINs per worker.")
+    parser.add_argument(
+        "--profile", default=DATABASE_PROFILE, choices=DATABASE_PROFILES
+    )
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    results = [
+        benchmark_shards(shards, args.workers, args.rows, args.profile)
+        for shards in args.shards
+    ]
+
+    baseline = results[0]["writes_per_second"]
+    print(f"{'shards':>6} {'writes/s':>12} {'speedup':>8}")
+    for result in results:
+        print(
+            f"{result['shards']:>6} {result['writes_per_second']:>12} "
+            f"{result['writes_per_second'] / baseline:>7.2f}x"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "profile": args.profile,
+                "cpus": os.cpu_count(),
+                "results": results,
+            },
+            output,
+            indent=2,
+        )
+
+
+if __name__ == "__main__":
+    main()
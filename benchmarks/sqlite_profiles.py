@@ -0,0 +1,103 @@
+"""
+Compares read and write throughput of the vins table across the SQLite engine profiles.
+
+Every profile gets a fresh database file. Writes go through SqliteCache.set, one commit
+per VIN as on the lookup path, and reads through SqliteCache.get.
+
+Usage (from the repository root):
+    python -m benchmarks.sqlite_profiles --rows 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from caching.sqlite_cache import SqliteCache
+from database.config import DATABASE_PROFILES
+from database.connection import DatabasePool
+from models.database_models import Base
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "sqlite_profiles.json")
+
+
+def generate_vins(count: int) -> List[str]:
+    return [f"BENCH{index:012d}" for index in range(count)]
+
+
+def vehicle_details(vin: str) -> Dict[str, Any]:
+    return {
+        "Make": "PETERBILT",
+        "Model": "388",
+        "Model Year": "2014",
+        "Body Class": "Truck-Tractor",
+        "Input VIN Requested": vin,
+    }
+
+
+def run_parallel(function: Callable, items: List[Any], threads: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(function, items))
+    return time.perf_counter() - started
+
+
+def benchmark_profile(profile: str, rows: int, threads: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        database_pool = DatabasePool(
+            f"sqlite:///{directory}/benchmark.db", profile, pool_size=threads
+        )
+        Base.metadata.create_all(bind=database_pool.get_engine())
+        cache = SqliteCache(database_pool)
+        vins = generate_vins(rows)
+
+        write_seconds = run_parallel(
+            lambda vin: cache.set(vin, vehicle_details(vin)), vins, threads
+        )
+        read_vins = random.sample(vins, len(vins))
+        read_seconds = run_parallel(cache.get, read_vins, threads)
+        database_pool.get_engine().dispose()
+
+    return {
+        "profile": profile,
+        "rows": rows,
+        "threads": threads,
+        "writes_per_second": round(rows / write_seconds, 1),
+        "reads_per_second": round(rows / read_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(DATABASE_PROFILES),
+        choices=DATABASE_PROFILES,
+    )
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    results = [
+        benchmark_profile(profile, args.rows, args.threads) for profile in args.profiles
+    ]
+
+    print(f"{'profile':<10} {'writes/s':>12} {'reads/s':>12}")
+    for result in results:
+        print(
+            f"{result['profile']:<10} {result['writes_per_second']:>12} {result['reads_per_second']:>12}"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
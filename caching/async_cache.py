@@ -0,0 +1,81 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, Iterable
+
+from caching.cache_interface import CacheEntry, CacheInterface, DeleteCriteria
+
+
+class AsyncCache(CacheInterface):
+    """
+    Runs the blocking calls of another cache on a dedicated thread pool.
+
+    The async methods hand the call over to the pool and await it, so the event loop
+    keeps serving other requests while a query or commit is in progress. The sync
+    methods call the wrapped cache directly, for callers that already run off the loop.
+    """
+
+    def __init__(self, backend: CacheInterface, max_workers: int):
+        self.backend = backend
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="cache"
+        )
+
+    def get(self, vin: str) -> dict:
+        return self.backend.get(vin)
+
+    def get_entry(self, vin: str) -> CacheEntry:
+        return self.backend.get_entry(vin)
+
+    def set(self, vin: str, vehicle_details: dict):
+        return self.backend.set(vin, vehicle_details)
+
+    def delete(self, vin: str) -> bool:
+        return self.backend.delete(vin)
+
+    def get_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        return self.backend.get_many(vins)
+
+    def get_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        return self.backend.get_many_entries(vins)
+
+    def set_many(self, items: Dict[str, dict]):
+        return self.backend.set_many(items)
+
+    def delete_matching(self, criteria: DeleteCriteria) -> int:
+        return self.backend.delete_matching(criteria)
+
+    def record_accesses(self, vins: Iterable[str]):
+        self.backend.record_accesses(vins)
+
+    async def aget(self, vin: str) -> dict:
+        return await self._run(self.backend.get, vin)
+
+    async def aget_entry(self, vin: str) -> CacheEntry:
+        return await self._run(self.backend.get_entry, vin)
+
+    async def aset(self, vin: str, vehicle_details: dict):
+        return await self._run(self.backend.set, vin, vehicle_details)
+
+    async def adelete(self, vin: str) -> bool:
+        return await self._run(self.backend.delete, vin)
+
+    async def aget_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        return await self._run(self.backend.get_many, list(vins))
+
+    async def aget_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        return await self._run(self.backend.get_many_entries, list(vins))
+
+    async def aset_many(self, items: Dict[str, dict]):
+        return await self._run(self.backend.set_many, items)
+
+    def close(self):
+        """
+        Shuts the thread pool down once the calls already submitted have finished.
+        """
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, function, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(function, *args))
@@ -1,4 +1,78 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional
+
+
+class CacheEntry(NamedTuple):
+    """
+    A cached value along with the time it was fetched, None when unknown.
+    """
+
+    value: dict
+    fetched_at: Optional[datetime] = None
+
+
+class EncodedEntry(NamedTuple):
+    """
+    A cached value serialized as a JSON response body, None when not cached, along with the
+    time it was fetched.
+    """
+
+    body: Optional[bytes]
+    fetched_at: Optional[datetime] = None
+
+
+class DeleteCriteria(NamedTuple):
+    """
+    Selects the cached VINs removed by a bulk delete. A VIN is removed when it matches every
+    criterion that is not None.
+    """
+
+    vins: Optional[FrozenSet[str]] = None
+    # E.g. a world manufacturer identifier.
+    vin_prefix: Optional[str] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    model_year: Optional[int] = None
+    # Naive UTC, like fetched_at.
+    fetched_before: Optional[datetime] = None
+
+    def has_predicate(self) -> bool:
+        """
+        Tells whether a criterion other than the VIN list is set.
+
+        :rtype: bool
+        """
+        return any(criterion is not None for criterion in self[1:])
+
+    def matches(
+        self, vin: str, vehicle_details: dict, fetched_at: Optional[datetime]
+    ) -> bool:
+        """
+        Tells whether a cached VIN matches the criteria. A VIN of unknown fetch time is
+        taken to be fetched before fetched_before.
+
+        :rtype: bool
+        """
+        if self.vins is not None and vin not in self.vins:
+            return False
+        if self.vin_prefix is not None and not vin.startswith(self.vin_prefix):
+            return False
+        if self.make is not None and vehicle_details.get("Make") != self.make:
+            return False
+        if self.model is not None and vehicle_details.get("Model") != self.model:
+            return False
+        if self.model_year is not None and vehicle_details.get("Model Year") != str(
+            self.model_year
+        ):
+            return False
+        if (
+            self.fetched_before is not None
+            and fetched_at is not None
+            and fetched_at >= self.fetched_before
+        ):
+            return False
+        return True
 
 
 class CacheInterface(ABC):
@@ -13,3 +87,57 @@ class CacheInterface(ABC):
     @abstractmethod
     def delete(key):
         pass
+
+    def get_entry(self, key) -> CacheEntry:
+        return CacheEntry(self.get(key))
+
+    def get_many(self, keys):
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value:
+                values[key] = value
+        return values
+
+    def get_many_entries(self, keys) -> Dict[Any, CacheEntry]:
+        entries = {}
+        for key in keys:
+            entry = self.get_entry(key)
+            if entry.value:
+                entries[key] = entry
+        return entries
+
+    def set_many(self, items):
+        for key, value in items.items():
+            self.set(key, value)
+
+    def delete_matching(self, criteria: DeleteCriteria) -> int:
+        if criteria.vins is None or criteria.has_predicate():
+            raise NotImplementedError(
+                f"{type(self).__name__} only deletes VIN lists in bulk."
+            )
+        return sum(self.delete(key) for key in criteria.vins)
+
+    def record_accesses(self, keys):
+        pass
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aget_entry(self, key) -> CacheEntry:
+        return self.get_entry(key)
+
+    async def aset(self, key, value):
+        return self.set(key, value)
+
+    async def adelete(self, key):
+        return self.delete(key)
+
+    async def aget_many(self, keys):
+        return self.get_many(keys)
+
+    async def aget_many_entries(self, keys) -> Dict[Any, CacheEntry]:
+        return self.get_many_entries(keys)
+
+    async def aset_many(self, items):
+        return self.set_many(items)
@@ -0,0 +1,220 @@
+import json
+import struct
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from caching.cache_interface import CacheEntry
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class Codec(ABC):
+    """
+    Serializes a cached VIN, its vehicle details, the time they were fetched and where they
+    came from, for the caches storing values as bytes.
+
+    Each codec starts its values with its own tag byte, so decode_entry reads the values
+    of every codec, whichever one is configured now.
+    """
+
+    name: str
+    tag: bytes
+
+    @abstractmethod
+    def encode(
+        self,
+        vin: str,
+        vehicle_details: Dict[str, Any],
+        fetched_at: Optional[datetime],
+        source: str,
+    ) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, vin: str, data: bytes) -> CacheEntry:
+        pass
+
+
+class JsonCodec(Codec):
+    """
+    Stores a JSON document holding the vehicle details, the time they were fetched and
+    their source. The format values were stored in before codecs were configurable.
+    """
+
+    name = "json"
+    tag = b"{"
+
+    def encode(
+        self,
+        vin: str,
+        vehicle_details: Dict[str, Any],
+        fetched_at: Optional[datetime],
+        source: str,
+    ) -> bytes:
+        return json.dumps(
+            {
+                "vehicle_details": vehicle_details,
+                "fetched_at": None if fetched_at is None else fetched_at.isoformat(),
+                "source": source,
+            },
+            separators=(",", ":"),
+        ).encode()
+
+    def decode(self, vin: str, data: bytes) -> CacheEntry:
+        document = json.loads(data)
+        fetched_at = document.get("fetched_at")
+        return CacheEntry(
+            document.get("vehicle_details") or {},
+            None if fetched_at is None else datetime.fromisoformat(fetched_at),
+        )
+
+
+class StructCodec(Codec):
+    """
+    Stores the vehicle details in a fixed-field binary layout: the tag, the fetch time in
+    microseconds since the epoch (-1 when unknown), then the make, model, model year, body
+    class and source, each as a 2-byte length and UTF-8 bytes, or a length marking it null
+    or absent. The VIN is the key, so "Input VIN Requested" is not stored.
+
+    Vehicle details with other fields than the ones produced by build_response do not fit
+    the layout, and are stored with the JSON codec instead.
+    """
+
+    name = "struct"
+    tag = b"\x01"
+    fields = ("Make", "Model", "Model Year", "Body Class")
+    # Lengths of a field that is None, and of one the vehicle details do not have.
+    null = 0xFFFF
+    absent = 0xFFFE
+
+    def __init__(self, fallback: Codec = JsonCodec()):
+        self.fallback = fallback
+
+    def encode(
+        self,
+        vin: str,
+        vehicle_details: Dict[str, Any],
+        fetched_at: Optional[datetime],
+        source: str,
+    ) -> bytes:
+        if not self.fits(vin, vehicle_details):
+            return self.fallback.encode(vin, vehicle_details, fetched_at, source)
+        parts = [self.tag, struct.pack("<q", to_microseconds(fetched_at))]
+        values = [vehicle_details.get(field, self) for field in self.fields] + [source]
+        for value in values:
+            if value is self:
+                parts.append(struct.pack("<H", self.absent))
+            elif value is None:
+                parts.append(struct.pack("<H", self.null))
+            else:
+                value = value.encode()
+                parts.append(struct.pack("<H", len(value)))
+                parts.append(value)
+        return b"".join(parts)
+
+    def decode(self, vin: str, data: bytes) -> CacheEntry:
+        try:
+            (microseconds,) = struct.unpack_from("<q", data, 1)
+            offset = 9
+            values = []
+            for _ in range(len(self.fields) + 1):
+                (length,) = struct.unpack_from("<H", data, offset)
+                offset += 2
+                if length == self.null:
+                    values.append(None)
+                elif length == self.absent:
+                    values.append(self)
+                else:
+                    values.append(data[offset : offset + length].decode())
+                    offset += length
+        except struct.error as e:
+            raise ValueError(f"Truncated {self.name} value.") from e
+        vehicle_details = {
+            field: value
+            for field, value in zip(self.fields, values)
+            if value is not self
+        }
+        vehicle_details["Input VIN Requested"] = vin
+        return CacheEntry(vehicle_details, from_microseconds(microseconds))
+
+    def fits(self, vin: str, vehicle_details: Dict[str, Any]) -> bool:
+        if vehicle_details.get("Input VIN Requested") != vin:
+            return False
+        for field, value in vehicle_details.items():
+            if field == "Input VIN Requested":
+                continue
+            if field not in self.fields:
+                return False
+            elif value is not None and (
+                not isinstance(value, str) or len(value.encode()) >= self.absent
+            ):
+                return False
+        return True
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), StructCodec())}
+CODECS_BY_TAG = {codec.tag: codec for codec in CODECS.values()}
+
+
+def get_codec(name: str) -> Codec:
+    """
+    Returns the codec of the given name.
+
+    :param name: The name of the codec, one of "json" or "struct".
+    :type name: str
+    :rtype: Codec
+    :raises ValueError: If the codec name is unknown.
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown cache codec: {name}")
+
+
+def decode_entry(vin: str, data: bytes) -> CacheEntry:
+    """
+    Decodes a value stored by any codec, picked by its tag byte.
+
+    :param vin: The VIN the value is stored for.
+    :type vin: str
+    :param data: The stored value.
+    :type data: bytes
+    :rtype: CacheEntry
+    :raises ValueError: If the value is malformed or of an unknown codec.
+    """
+    codec = CODECS_BY_TAG.get(data[:1])
+    if codec is None:
+        raise ValueError(f"Unknown cache value tag: {data[:1]!r}")
+    return codec.decode(vin, data)
+
+
+def encode_response(vehicle_details: Dict[str, Any]) -> bytes:
+    """
+    Serializes vehicle details into the JSON body FastAPI would send for them, so they can
+    be sent as they are.
+
+    :param vehicle_details: The vehicle details.
+    :type vehicle_details: Dict[str, Any]
+    :rtype: bytes
+    """
+    # The settings of starlette's JSONResponse.
+    return json.dumps(
+        vehicle_details,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode()
+
+
+def to_microseconds(fetched_at: Optional[datetime]) -> int:
+    if fetched_at is None:
+        return -1
+    return (fetched_at - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(microseconds: int) -> Optional[datetime]:
+    if microseconds < 0:
+        return None
+    return EPOCH + timedelta(microseconds=microseconds)
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from caching.sqlite_cache import EVICTION_POLICIES, SqliteCache
+from metrics.metrics import cache_evictions
+
+
+class CacheEvictor:
+    """
+    Keeps the SQLite cache within max_rows rows and max_bytes bytes from a daemon thread.
+
+    Every interval seconds, the reads counted by the cache are written to its rows, then,
+    if a bound is exceeded, the rows picked by the policy are evicted until the cache is
+    down to target times the bound, so that the next run has some headroom. The pages freed
+    are then returned to the file system, vacuum_pages at most per run.
+
+    A ShardedSqliteCache is bounded as a whole, the same way.
+    """
+
+    def __init__(
+        self,
+        sqlite_cache: SqliteCache,
+        policy: str,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        target: float = 0.9,
+        interval: float = 60,
+        vacuum_pages: int = 1000,
+    ):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(
+                f"Unknown eviction policy: {policy}, expected one of "
+                f"{EVICTION_POLICIES}."
+            )
+        self.sqlite_cache = sqlite_cache
+        self.policy = policy
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.target = target
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.runs = 0
+        self.evicted = 0
+        self.reclaimed_pages = 0
+        self.last_run_at = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cache-eviction", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the evictions and waits for the thread to finish, writing the reads counted
+        since the last run.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.sqlite_cache.flush_accesses()
+
+    def run_once(self) -> int:
+        """
+        Writes the counted reads, then evicts rows if the cache exceeds a bound.
+
+        :return: The number of evicted rows.
+        :rtype: int
+        """
+        self.sqlite_cache.flush_accesses()
+        size = self.sqlite_cache.get_size()
+        excess = self.excess_rows(size)
+        evicted = 0
+        if excess > 0:
+            evicted = self.sqlite_cache.evict(excess, self.policy)
+            self.evicted += evicted
+            cache_evictions.inc(self.policy, amount=evicted)
+            logging.info(
+                "Evicted rows from the cache.",
+                extra={"evicted": evicted, "policy": self.policy},
+            )
+        self.reclaimed_pages += self.sqlite_cache.reclaim_space(self.vacuum_pages)
+        self.runs += 1
+        self.last_run_at = time.time()
+        return evicted
+
+    def excess_rows(self, size: Dict[str, int]) -> int:
+        """
+        Returns the number of rows to evict to bring the cache down to target times its
+        bounds, or 0 if no bound is exceeded. The bytes taken by a row are estimated from
+        the used pages of the file.
+
+        :param size: The size of the cache, as returned by SqliteCache.get_size.
+        :type size: Dict[str, int]
+        :rtype: int
+        """
+        rows = size["rows"]
+        excess = 0
+        if self.max_rows is not None and rows > self.max_rows:
+            excess = rows - int(self.max_rows * self.target)
+        used_bytes = size["used_bytes"]
+        if self.max_bytes is not None and rows and used_bytes > self.max_bytes:
+            row_bytes = used_bytes / rows
+            excess_bytes = used_bytes - self.max_bytes * self.target
+            excess = max(excess, int(excess_bytes / row_bytes) + 1)
+        return min(excess, rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the settings and counters of the evictor, along with the current size of
+        the cache.
+
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "policy": self.policy,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "target": self.target,
+            "interval": self.interval,
+            "runs": self.runs,
+            "evicted": self.evicted,
+            "reclaimed_pages": self.reclaimed_pages,
+            "pending_accesses": self.sqlite_cache.pending_accesses(),
+            "dropped_accesses": self.sqlite_cache.dropped_accesses,
+            "last_run_at": self.last_run_at,
+            "size": self.sqlite_cache.get_size(),
+        }
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception("Encountered exception while evicting cache rows.")
@@ -0,0 +1,220 @@
+from typing import List, Optional
+
+from app.config import (
+    async_cache_workers,
+    cache_backend,
+    cache_eviction_interval,
+    cache_eviction_policy,
+    cache_eviction_target,
+    cache_max_bytes,
+    cache_max_rows,
+    cache_vacuum_pages,
+    memory_cache_max_size,
+    memory_cache_ttl,
+    negative_cache_ttl,
+    negative_cache_workers,
+    redis_codec,
+    redis_db,
+    redis_host,
+    redis_invalidation_channel,
+    redis_key_prefix,
+    redis_password,
+    redis_port,
+    redis_timeout,
+    redis_ttl,
+)
+from caching.async_cache import AsyncCache
+from caching.cache_interface import CacheInterface
+from caching.codecs import get_codec
+from caching.eviction import CacheEvictor
+from caching.memory_cache import MemoryCache
+from caching.negative_cache import NegativeCache
+from caching.redis_cache import InvalidationSubscriber, RedisCache
+from caching.resp_client import RespClient
+from caching.sharded_cache import ShardedSqliteCache
+from caching.sqlite_cache import SqliteCache, cache as sqlite_cache
+from database.config import DATABASE_PROFILE, DATABASE_SHARD_URLS, DATABASE_URL
+from database.connection import DatabasePool, database
+from models.database_models import create_tables
+
+
+def build_cache(
+    backend: str = cache_backend, negative_cache: Optional[CacheInterface] = None
+) -> CacheInterface:
+    """
+    Builds the cache used by the routers: the in-memory tier in front of the configured backend.
+
+    :param backend: The name of the backing cache, one of "sqlite", "async_sqlite",
+        "sharded_sqlite" or "redis".
+    :type backend: str
+    :param negative_cache: The negative cache the "sharded_sqlite" backend removes the VINs
+        it writes from, as the shards do not hold it.
+    :type negative_cache: Optional[CacheInterface]
+    :return: The cache.
+    :rtype: CacheInterface
+    :raises ValueError: If the backend name is unknown.
+    """
+    if backend == "sqlite":
+        backing_cache = sqlite_cache
+    elif backend == "async_sqlite":
+        database_pool = DatabasePool(
+            DATABASE_URL, pool_size=async_cache_workers, max_overflow=0
+        )
+        backing_cache = AsyncCache(SqliteCache(database_pool), async_cache_workers)
+    elif backend == "sharded_sqlite":
+        backing_cache = AsyncCache(
+            ShardedSqliteCache(build_shard_databases(), negative_cache=negative_cache),
+            async_cache_workers,
+        )
+    elif backend == "redis":
+        redis_cache = RedisCache(
+            build_redis_client(),
+            key_prefix=redis_key_prefix,
+            ttl=redis_ttl,
+            invalidation_channel=redis_invalidation_channel,
+            codec=get_codec(redis_codec),
+        )
+        backing_cache = AsyncCache(redis_cache, async_cache_workers)
+    else:
+        raise ValueError(f"Unknown cache backend: {backend}")
+    return MemoryCache(backing_cache, memory_cache_max_size, memory_cache_ttl)
+
+
+def build_negative_cache(backend: str = cache_backend) -> CacheInterface:
+    """
+    Builds the cache of the VINs the vPIC API returned no vehicle details for. It stays in
+    the local database with the "redis" backend, as its entries are short-lived.
+
+    :param backend: The name of the backing cache, one of "sqlite", "async_sqlite",
+        "sharded_sqlite" or "redis".
+    :type backend: str
+    :return: The negative cache.
+    :rtype: CacheInterface
+    :raises ValueError: If the backend name is unknown.
+    """
+    if backend == "sqlite":
+        return NegativeCache(database, negative_cache_ttl)
+    elif backend in ("async_sqlite", "sharded_sqlite", "redis"):
+        database_pool = DatabasePool(
+            DATABASE_URL, pool_size=negative_cache_workers, max_overflow=0
+        )
+        return AsyncCache(
+            NegativeCache(database_pool, negative_cache_ttl), negative_cache_workers
+        )
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+def build_shard_databases(
+    urls: List[str] = DATABASE_SHARD_URLS, profile: str = DATABASE_PROFILE
+) -> List[DatabasePool]:
+    """
+    Builds a database engine per shard of the "sharded_sqlite" backend, and creates the
+    tables of the shards.
+
+    :param urls: The database urls of the shards.
+    :type urls: List[str]
+    :param profile: The name of the SQLite profile of the shards.
+    :type profile: str
+    :rtype: List[DatabasePool]
+    """
+    databases = [
+        DatabasePool(url, profile, pool_size=async_cache_workers) for url in urls
+    ]
+    for database_pool in databases:
+        create_tables(database_pool.get_engine())
+    return databases
+
+
+def build_cache_databases(
+    cache: CacheInterface, backend: str = cache_backend
+) -> List[DatabasePool]:
+    """
+    Returns the databases holding the vins table, read by /export and written by /import:
+    the shards with the "sharded_sqlite" backend, none with the "redis" backend, whose
+    entries are not stored in SQLite, and the application database otherwise.
+
+    :param cache: The cache built by build_cache.
+    :type cache: CacheInterface
+    :param backend: The name of the backing cache.
+    :type backend: str
+    :rtype: List[DatabasePool]
+    """
+    if backend == "sharded_sqlite":
+        return cache.backend.backend.databases
+    elif backend == "redis":
+        return []
+    return [database]
+
+
+def build_redis_client() -> RespClient:
+    return RespClient(
+        redis_host,
+        redis_port,
+        db=redis_db,
+        password=redis_password,
+        timeout=redis_timeout,
+        max_idle_connections=async_cache_workers,
+    )
+
+
+def build_invalidation_subscriber(
+    cache: CacheInterface, backend: str = cache_backend
+) -> Optional[InvalidationSubscriber]:
+    """
+    Builds the listener dropping the VINs removed by other workers from the in-memory tier
+    of the cache. Only the "redis" backend is shared between workers.
+
+    :param cache: The cache built by build_cache.
+    :type cache: CacheInterface
+    :param backend: The name of the backing cache.
+    :type backend: str
+    :return: The listener, or None if the backend is not shared.
+    :rtype: Optional[InvalidationSubscriber]
+    """
+    if backend != "redis" or redis_invalidation_channel is None:
+        return None
+    return InvalidationSubscriber(
+        build_redis_client(),
+        redis_invalidation_channel,
+        on_invalidate=cache.invalidate,
+        # Removals published while disconnected were missed.
+        on_reconnect=cache.clear,
+    )
+
+
+def build_cache_evictor(
+    cache: CacheInterface, backend: str = cache_backend
+) -> Optional[CacheEvictor]:
+    """
+    Builds the background job keeping the SQLite store of the cache within its bounds. The
+    "redis" backend bounds itself, with its maxmemory policy and redis_ttl.
+
+    :param cache: The cache built by build_cache.
+    :type cache: CacheInterface
+    :param backend: The name of the backing cache.
+    :type backend: str
+    :return: The evictor, or None if the backend is not stored in SQLite.
+    :rtype: Optional[CacheEvictor]
+    """
+    if backend == "sqlite":
+        store = cache.backend
+    elif backend in ("async_sqlite", "sharded_sqlite"):
+        store = cache.backend.backend
+    else:
+        return None
+    return CacheEvictor(
+        store,
+        cache_eviction_policy,
+        max_rows=cache_max_rows,
+        max_bytes=cache_max_bytes,
+        target=cache_eviction_target,
+        interval=cache_eviction_interval,
+        vacuum_pages=cache_vacuum_pages,
+    )
+
+
+negative_cache = build_negative_cache()
+cache = build_cache(negative_cache=negative_cache)
+invalidation_subscriber = build_invalidation_subscriber(cache)
+cache_evictor = build_cache_evictor(cache)
+cache_databases = build_cache_databases(cache)
@@ -0,0 +1,456 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from caching.cache_interface import (
+    CacheEntry,
+    CacheInterface,
+    DeleteCriteria,
+    EncodedEntry,
+)
+from caching.codecs import encode_response
+
+
+class MemoryCache(CacheInterface):
+    """
+    Bounded in-process cache placed in front of another cache.
+
+    Entries are evicted in least recently used order once max_size is reached and
+    expire ttl seconds after they were stored. Reads that miss fall through to the
+    backing cache and populate this tier. The JSON response body of an entry is kept along
+    with it once asked for, so repeated hits are served without serializing it again.
+
+    A VIN deleted or invalidated while it is read from the backing cache is not put back
+    in memory by that read, which may have returned the vehicle details from before.
+    """
+
+    def __init__(self, backend: CacheInterface, max_size: int, ttl: float):
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation. A read of the backing cache fills memory only if
+        # neither its VIN nor the whole tier were invalidated since the read started.
+        self._generation = 0
+        self._cleared_generation = 0
+        self._reads = Counter()
+        self._invalidated_generations = {}
+
+    def get(self, vin: str) -> dict:
+        """
+        Retrieves the vehicle details for the provided VIN, falling back to the backing cache.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: A copy of the vehicle details, or an empty dictionary if not cached.
+        :rtype: dict
+        """
+        vehicle_details = self._get_local(vin)
+        if vehicle_details is not None:
+            return vehicle_details
+
+        with self._backend_read((vin,)) as generation:
+            vehicle_details = self.backend.get(vin)
+            if vehicle_details:
+                self._set_local(vin, vehicle_details, generation=generation)
+        return vehicle_details
+
+    def get_entry(self, vin: str) -> CacheEntry:
+        """
+        Retrieves the vehicle details for the provided VIN along with the time they were
+        fetched, falling back to the backing cache when they are not in memory or were
+        loaded into memory without their fetch time.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: A copy of the vehicle details, empty if not cached, and their fetch time.
+        :rtype: CacheEntry
+        """
+        entry = self._get_local_entry(vin)
+        if entry is not None and entry.fetched_at is not None:
+            return entry
+
+        with self._backend_read((vin,)) as generation:
+            entry = self.backend.get_entry(vin)
+            if entry.value:
+                self._set_local(
+                    vin, entry.value, entry.fetched_at, generation=generation
+                )
+        return entry
+
+    def set(self, vin: str, vehicle_details: dict):
+        """
+        Sets the vehicle details for the provided VIN in the backing cache and in memory.
+
+        :param vin: The VIN for which to set the vehicle details.
+        :type vin: str
+        :param vehicle_details: The vehicle details to be stored in the cache.
+        :type vehicle_details: dict
+        """
+        self.backend.set(vin, vehicle_details)
+        self._set_local(vin, vehicle_details, datetime.utcnow())
+
+    def get_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        """
+        Retrieves the vehicle details for several VINs, asking the backing cache only
+        for the VINs that are not held in memory.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: Copies of the vehicle details keyed by VIN, for the cached VINs.
+        :rtype: Dict[str, dict]
+        """
+        found, missing = self._get_many_local(vins)
+        if missing:
+            with self._backend_read(missing) as generation:
+                for vin, vehicle_details in self.backend.get_many(missing).items():
+                    self._set_local(vin, vehicle_details, generation=generation)
+                    found[vin] = vehicle_details
+        return found
+
+    def get_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        """
+        Retrieves the vehicle details for several VINs along with the time they were
+        fetched, asking the backing cache only for the VINs that are not held in memory
+        with their fetch time.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: Copies of the vehicle details and their fetch time keyed by VIN, for the
+            cached VINs.
+        :rtype: Dict[str, CacheEntry]
+        """
+        found, missing = self._get_many_local_entries(vins)
+        if missing:
+            with self._backend_read(missing) as generation:
+                for vin, entry in self.backend.get_many_entries(missing).items():
+                    self._set_local(
+                        vin, entry.value, entry.fetched_at, generation=generation
+                    )
+                    found[vin] = entry
+        return found
+
+    def set_many(self, items: Dict[str, dict]):
+        """
+        Sets the vehicle details for several VINs in the backing cache and in memory.
+
+        :param items: The vehicle details to be stored, keyed by VIN.
+        :type items: Dict[str, dict]
+        """
+        self.backend.set_many(items)
+        fetched_at = datetime.utcnow()
+        for vin, vehicle_details in items.items():
+            self._set_local(vin, vehicle_details, fetched_at)
+
+    def delete(self, vin: str) -> bool:
+        """
+        Deletes the vehicle details for the provided VIN from the backing cache and from
+        memory.
+
+        :param vin: The VIN for which to delete the vehicle details.
+        :type vin: str
+        :return: True if the backing cache deleted the VIN, False otherwise.
+        :rtype: bool
+        """
+        deleted = self.backend.delete(vin)
+        # After the backing cache, so that reads started before cannot fill memory again.
+        self.invalidate(vin)
+        return deleted
+
+    def delete_matching(self, criteria: DeleteCriteria) -> int:
+        """
+        Deletes the VINs matching the criteria from the backing cache, then drops the
+        entries held in memory that match them too.
+
+        :param criteria: The criteria selecting the VINs to delete.
+        :type criteria: DeleteCriteria
+        :return: The number of VINs the backing cache deleted.
+        :rtype: int
+        """
+        deleted = self.backend.delete_matching(criteria)
+        with self._lock:
+            if criteria.vins is None:
+                vins = list(self._entries)
+                # The VINs read meanwhile may match too.
+                self._invalidate_all()
+            else:
+                for vin in criteria.vins:
+                    self._invalidate_read(vin)
+                vins = [vin for vin in criteria.vins if vin in self._entries]
+            for vin in vins:
+                _, fetched_at, vehicle_details, _ = self._entries[vin]
+                if criteria.matches(vin, vehicle_details, fetched_at):
+                    del self._entries[vin]
+        return deleted
+
+    def get_encoded_entry(self, vin: str) -> EncodedEntry:
+        """
+        Retrieves the vehicle details for the provided VIN serialized as a JSON response
+        body, along with the time they were fetched. The body is built once per entry held
+        in memory and handed out as it is on later hits.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: The response body, None if not cached, and the fetch time.
+        :rtype: EncodedEntry
+        """
+        encoded_entry = self._get_local_encoded_entry(vin)
+        if encoded_entry is not None:
+            return encoded_entry
+
+        with self._backend_read((vin,)) as generation:
+            return self._encode_backend_entry(
+                vin, self.backend.get_entry(vin), generation
+            )
+
+    async def aget(self, vin: str) -> dict:
+        vehicle_details = self._get_local(vin)
+        if vehicle_details is not None:
+            return vehicle_details
+
+        with self._backend_read((vin,)) as generation:
+            vehicle_details = await self.backend.aget(vin)
+            if vehicle_details:
+                self._set_local(vin, vehicle_details, generation=generation)
+        return vehicle_details
+
+    async def aget_entry(self, vin: str) -> CacheEntry:
+        entry = self._get_local_entry(vin)
+        if entry is not None and entry.fetched_at is not None:
+            return entry
+
+        with self._backend_read((vin,)) as generation:
+            entry = await self.backend.aget_entry(vin)
+            if entry.value:
+                self._set_local(
+                    vin, entry.value, entry.fetched_at, generation=generation
+                )
+        return entry
+
+    async def aget_encoded_entry(self, vin: str) -> EncodedEntry:
+        encoded_entry = self._get_local_encoded_entry(vin)
+        if encoded_entry is not None:
+            return encoded_entry
+
+        with self._backend_read((vin,)) as generation:
+            return self._encode_backend_entry(
+                vin, await self.backend.aget_entry(vin), generation
+            )
+
+    async def aset(self, vin: str, vehicle_details: dict):
+        await self.backend.aset(vin, vehicle_details)
+        self._set_local(vin, vehicle_details, datetime.utcnow())
+
+    async def adelete(self, vin: str) -> bool:
+        deleted = await self.backend.adelete(vin)
+        self.invalidate(vin)
+        return deleted
+
+    async def aget_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        found, missing = self._get_many_local(vins)
+        if missing:
+            with self._backend_read(missing) as generation:
+                backend_details = await self.backend.aget_many(missing)
+                for vin, vehicle_details in backend_details.items():
+                    self._set_local(vin, vehicle_details, generation=generation)
+                    found[vin] = vehicle_details
+        return found
+
+    async def aget_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        found, missing = self._get_many_local_entries(vins)
+        if missing:
+            with self._backend_read(missing) as generation:
+                backend_entries = await self.backend.aget_many_entries(missing)
+                for vin, entry in backend_entries.items():
+                    self._set_local(
+                        vin, entry.value, entry.fetched_at, generation=generation
+                    )
+                    found[vin] = entry
+        return found
+
+    async def aset_many(self, items: Dict[str, dict]):
+        await self.backend.aset_many(items)
+        fetched_at = datetime.utcnow()
+        for vin, vehicle_details in items.items():
+            self._set_local(vin, vehicle_details, fetched_at)
+
+    def invalidate(self, vin: str):
+        """
+        Drops the VIN from memory only, leaving the backing cache untouched.
+
+        :param vin: The VIN to drop.
+        :type vin: str
+        """
+        with self._lock:
+            self._entries.pop(vin, None)
+            self._invalidate_read(vin)
+
+    def clear(self):
+        """
+        Drops every entry held in memory.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._invalidate_all()
+
+    def stats(self) -> dict:
+        """
+        Returns the size and hit/miss counters of the in-memory tier.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _get_local(self, vin: str):
+        entry = self._get_local_entry(vin)
+        return None if entry is None else entry.value
+
+    def _get_local_entry(self, vin: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._get_live(vin)
+            if entry is None:
+                return None
+            _, fetched_at, vehicle_details, _ = entry
+            # Callers annotate the result, so never hand out the stored dict itself.
+            local_entry = CacheEntry(dict(vehicle_details), fetched_at)
+        # The backend did not see the read, but evicts by reads.
+        self.backend.record_accesses((vin,))
+        return local_entry
+
+    def _get_local_encoded_entry(self, vin: str) -> Optional[EncodedEntry]:
+        with self._lock:
+            entry = self._get_live(vin)
+            if entry is None:
+                return None
+            expires_at, fetched_at, vehicle_details, body = entry
+            # Like get_entry, look the fetch time up when it is not known.
+            if fetched_at is None:
+                return None
+            if body is None:
+                body = encode_response(vehicle_details)
+                self._entries[vin] = (expires_at, fetched_at, vehicle_details, body)
+        self.backend.record_accesses((vin,))
+        return EncodedEntry(body, fetched_at)
+
+    def _get_live(self, vin: str):
+        # Must be called with the lock held.
+        entry = self._entries.get(vin)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[vin]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(vin)
+        self.hits += 1
+        return entry
+
+    def _encode_backend_entry(
+        self, vin: str, entry: CacheEntry, generation: int
+    ) -> EncodedEntry:
+        if not entry.value:
+            return EncodedEntry(None, entry.fetched_at)
+        body = encode_response(entry.value)
+        self._set_local(vin, entry.value, entry.fetched_at, body, generation)
+        return EncodedEntry(body, entry.fetched_at)
+
+    @contextmanager
+    def _backend_read(self, vins: Iterable[str]) -> Iterator[int]:
+        """
+        Tracks a read of the backing cache, yielding the generation to pass to _set_local
+        so that VINs invalidated during the read are not filled.
+        """
+        vins = list(vins)
+        with self._lock:
+            self._reads.update(vins)
+            generation = self._generation
+        try:
+            yield generation
+        finally:
+            with self._lock:
+                self._reads.subtract(vins)
+                for vin in set(vins):
+                    if self._reads[vin] <= 0:
+                        del self._reads[vin]
+                        self._invalidated_generations.pop(vin, None)
+
+    def _invalidate_read(self, vin: str):
+        # Must be called with the lock held. Only VINs being read are remembered, so the
+        # generations kept are bounded by the reads in flight.
+        self._generation += 1
+        if vin in self._reads:
+            self._invalidated_generations[vin] = self._generation
+
+    def _invalidate_all(self):
+        # Must be called with the lock held.
+        self._generation += 1
+        self._cleared_generation = self._generation
+
+    def _is_invalidated(self, vin: str, generation: int) -> bool:
+        # Must be called with the lock held.
+        return (
+            self._cleared_generation > generation
+            or self._invalidated_generations.get(vin, 0) > generation
+        )
+
+    def _get_many_local(self, vins: Iterable[str]):
+        found = {}
+        missing = []
+        for vin in vins:
+            vehicle_details = self._get_local(vin)
+            if vehicle_details is None:
+                missing.append(vin)
+            else:
+                found[vin] = vehicle_details
+        return found, missing
+
+    def _get_many_local_entries(self, vins: Iterable[str]):
+        found = {}
+        missing = []
+        for vin in vins:
+            entry = self._get_local_entry(vin)
+            if entry is None or entry.fetched_at is None:
+                missing.append(vin)
+            else:
+                found[vin] = entry
+        return found, missing
+
+    def _set_local(
+        self,
+        vin: str,
+        vehicle_details: dict,
+        fetched_at: Optional[datetime] = None,
+        body: Optional[bytes] = None,
+        generation: Optional[int] = None,
+    ):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and self._is_invalidated(vin, generation):
+                return
+            self._entries[vin] = (
+                time.monotonic() + self.ttl,
+                fetched_at,
+                dict(vehicle_details),
+                body,
+            )
+            self._entries.move_to_end(vin)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
@@ -0,0 +1,223 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+
+from caching.cache_interface import CacheInterface, DeleteCriteria
+from caching.sqlite_cache import IN_CLAUSE_CHUNK_SIZE, MAX_STATEMENT_PARAMETERS
+from models.database_models import NegativeVin as NegativeVinDBModel
+
+
+class NegativeCache(CacheInterface):
+    """
+    Cache class remembering the VINs the vPIC API returned no vehicle details for.
+
+    Entries map a VIN to the time it was found undecodable and expire ttl seconds later,
+    so that lookups retried for such a VIN are answered without querying the API again.
+    """
+
+    def __init__(self, database, ttl: float):
+        self.database = database
+        self.ttl = ttl
+
+    def get(self, vin: str) -> Optional[datetime]:
+        """
+        Retrieves the time the VIN was found undecodable, if the entry has not expired.
+
+        :param vin: The VIN to look up.
+        :type vin: str
+        :return: The time the entry was cached, or None if there is no live entry.
+        :rtype: Optional[datetime]
+        """
+        cached_at = None
+        try:
+            db_session = self.database.get_session()
+            cached_at = (
+                db_session.query(NegativeVinDBModel.cached_at)
+                .filter(
+                    NegativeVinDBModel.vin == vin,
+                    NegativeVinDBModel.cached_at > self._expired_before(),
+                )
+                .scalar()
+            )
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to fetch negative cache vin.",
+                extra={"vin": vin},
+            )
+        finally:
+            db_session.close()
+        return cached_at
+
+    def set(self, vin: str, cached_at: Optional[datetime] = None):
+        """
+        Records the VIN as undecodable, and drops the entries that have expired.
+
+        :param vin: The VIN the API returned no vehicle details for.
+        :type vin: str
+        :param cached_at: The time the API answered, now by default.
+        :type cached_at: Optional[datetime]
+        """
+        statement = insert(NegativeVinDBModel).values(
+            vin=vin, cached_at=cached_at or datetime.utcnow()
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[NegativeVinDBModel.vin],
+            set_={"cached_at": statement.excluded.cached_at},
+        )
+        try:
+            db_session = self.database.get_session()
+            db_session.execute(statement)
+            db_session.query(NegativeVinDBModel).filter(
+                NegativeVinDBModel.cached_at <= self._expired_before()
+            ).delete()
+            db_session.commit()
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to negative cache vin.",
+                extra={"vin": vin},
+            )
+            db_session.rollback()
+        finally:
+            db_session.close()
+
+    def set_many(self, items: Dict[str, Optional[datetime]]):
+        """
+        Records several VINs as undecodable in a single transaction, and drops the entries
+        that have expired.
+
+        :param items: The time the API answered, now if None, keyed by VIN.
+        :type items: Dict[str, Optional[datetime]]
+        """
+        if not items:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {"vin": vin, "cached_at": cached_at or now}
+            for vin, cached_at in items.items()
+        ]
+        # Two bound parameters per row.
+        rows_per_statement = MAX_STATEMENT_PARAMETERS // 2
+        try:
+            db_session = self.database.get_session()
+            for start in range(0, len(rows), rows_per_statement):
+                statement = insert(NegativeVinDBModel).values(
+                    rows[start : start + rows_per_statement]
+                )
+                statement = statement.on_conflict_do_update(
+                    index_elements=[NegativeVinDBModel.vin],
+                    set_={"cached_at": statement.excluded.cached_at},
+                )
+                db_session.execute(statement)
+            db_session.query(NegativeVinDBModel).filter(
+                NegativeVinDBModel.cached_at <= self._expired_before()
+            ).delete()
+            db_session.commit()
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to negative cache vins.",
+                extra={"vins": list(items)},
+            )
+            db_session.rollback()
+        finally:
+            db_session.close()
+
+    def get_many(self, vins: Iterable[str]) -> Dict[str, datetime]:
+        """
+        Retrieves the live entries for several VINs with one IN query per chunk.
+
+        :param vins: The VINs to look up.
+        :type vins: Iterable[str]
+        :return: The time each entry was cached, keyed by VIN, for the VINs with a live entry.
+        :rtype: Dict[str, datetime]
+        """
+        vins = list(vins)
+        entries = {}
+        try:
+            db_session = self.database.get_session()
+            expired_before = self._expired_before()
+            for start in range(0, len(vins), IN_CLAUSE_CHUNK_SIZE):
+                chunk = vins[start : start + IN_CLAUSE_CHUNK_SIZE]
+                rows = db_session.query(NegativeVinDBModel).filter(
+                    NegativeVinDBModel.vin.in_(chunk),
+                    NegativeVinDBModel.cached_at > expired_before,
+                )
+                for row in rows:
+                    entries[row.vin] = row.cached_at
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to fetch negative cache vins.",
+                extra={"vins": vins},
+            )
+        finally:
+            db_session.close()
+        return entries
+
+    def delete(self, vin: str) -> bool:
+        """
+        Deletes the entry for the provided VIN, expired or not.
+
+        :param vin: The VIN for which to delete the entry.
+        :type vin: str
+        :return: True if an entry was deleted, False otherwise.
+        :rtype: bool
+        """
+        success = False
+        try:
+            db_session = self.database.get_session()
+            deleted_rows = (
+                db_session.query(NegativeVinDBModel).filter_by(vin=vin).delete()
+            )
+            db_session.commit()
+            success = deleted_rows > 0
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to delete negative cache vin.",
+                extra={"vin": vin},
+            )
+            db_session.rollback()
+        finally:
+            db_session.close()
+        return success
+
+    def delete_matching(self, criteria: DeleteCriteria) -> int:
+        """
+        Deletes the entries for the VINs listed in the criteria, in a single transaction.
+        Entries hold no vehicle details, so criteria with a predicate delete nothing.
+
+        :param criteria: The criteria selecting the VINs to delete.
+        :type criteria: DeleteCriteria
+        :return: The number of deleted entries.
+        :rtype: int
+        """
+        if criteria.vins is None or criteria.has_predicate():
+            return 0
+        vins = list(criteria.vins)
+        deleted_rows = 0
+        try:
+            db_session = self.database.get_session()
+            for start in range(0, len(vins), IN_CLAUSE_CHUNK_SIZE):
+                deleted_rows += (
+                    db_session.query(NegativeVinDBModel)
+                    .filter(
+                        NegativeVinDBModel.vin.in_(
+                            vins[start : start + IN_CLAUSE_CHUNK_SIZE]
+                        )
+                    )
+                    .delete()
+                )
+            db_session.commit()
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to delete negative cache vins.",
+                extra={"vins": vins},
+            )
+            db_session.rollback()
+            deleted_rows = 0
+        finally:
+            db_session.close()
+        return deleted_rows
+
+    def _expired_before(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=self.ttl)
@@ -0,0 +1,315 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from caching.cache_interface import CacheEntry, CacheInterface, DeleteCriteria
+from caching.codecs import Codec, JsonCodec, decode_entry
+from caching.resp_client import RespClient, RespError
+from caching.sqlite_cache import DEFAULT_SOURCE
+
+# Keys fetched per MGET command. The commands of a get_many are pipelined, so a batch lookup
+# costs a single round trip however many chunks it spans.
+MGET_CHUNK_SIZE = 500
+
+
+class RedisCache(CacheInterface):
+    """
+    Cache class storing the vehicle details on a server speaking the Redis protocol, so that
+    every worker and node of a deployment shares a single cache.
+
+    Each VIN is stored under key_prefix + VIN, serialized by the codec along with the time
+    its vehicle details were fetched and where they came from. Values stored by any codec
+    stay readable when the codec is changed. Deletions are published on the invalidation
+    channel, for the other workers to drop the VIN from their in-memory tier.
+    """
+
+    def __init__(
+        self,
+        client: RespClient,
+        key_prefix: str = "vin:",
+        ttl: Optional[int] = None,
+        invalidation_channel: Optional[str] = None,
+        codec: Codec = JsonCodec(),
+    ):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.invalidation_channel = invalidation_channel
+        self.codec = codec
+
+    def get(self, vin: str) -> dict:
+        """
+        Retrieves the vehicle details from the cache based on the provided VIN.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: The vehicle details retrieved from the cache.
+        :rtype: dict
+        """
+        return self.get_entry(vin).value
+
+    def get_entry(self, vin: str) -> CacheEntry:
+        """
+        Retrieves the vehicle details from the cache along with the time they were fetched.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: The vehicle details, empty if not cached, and when they were fetched.
+        :rtype: CacheEntry
+        """
+        try:
+            return self._decode(vin, self.client.execute("GET", self._key(vin)))
+        except (OSError, RespError, ValueError):
+            logging.exception(
+                "Encountered exception while trying to fetch cache vin.",
+                extra={"vin": vin},
+            )
+            return CacheEntry({})
+
+    def set(self, vin: str, vehicle_details: dict, source: str = DEFAULT_SOURCE):
+        """
+        Sets the vehicle details in the cache for the provided VIN.
+
+        :param vin: The VIN for which to set the vehicle details.
+        :type vin: str
+        :param vehicle_details: The vehicle details to be stored in the cache.
+        :type vehicle_details: dict
+        :param source: Where the vehicle details came from.
+        :type source: str
+        """
+        self.set_many({vin: vehicle_details}, source=source)
+
+    def get_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        """
+        Retrieves the vehicle details for several VINs with pipelined MGET commands.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: The vehicle details keyed by VIN, for the VINs present in the cache.
+        :rtype: Dict[str, dict]
+        """
+        return {vin: entry.value for vin, entry in self.get_many_entries(vins).items()}
+
+    def get_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        """
+        Retrieves the vehicle details for several VINs along with the time they were
+        fetched, with pipelined MGET commands.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: The vehicle details and their fetch time keyed by VIN, for the VINs present
+            in the cache.
+        :rtype: Dict[str, CacheEntry]
+        """
+        vins = list(vins)
+        entries = {}
+        if not vins:
+            return entries
+        chunks = [
+            vins[start : start + MGET_CHUNK_SIZE]
+            for start in range(0, len(vins), MGET_CHUNK_SIZE)
+        ]
+        try:
+            replies = self.client.pipeline(
+                [("MGET", *map(self._key, chunk)) for chunk in chunks]
+            )
+            for chunk, values in zip(chunks, replies):
+                if isinstance(values, RespError):
+                    raise values
+                for vin, value in zip(chunk, values):
+                    entry = self._decode(vin, value)
+                    if entry.value:
+                        entries[vin] = entry
+        except (OSError, RespError, ValueError):
+            logging.exception(
+                "Encountered exception while trying to fetch cache vins.",
+                extra={"vins": vins},
+            )
+        return entries
+
+    def set_many(self, items: Dict[str, dict], source: str = DEFAULT_SOURCE):
+        """
+        Sets the vehicle details for several VINs with pipelined SET commands.
+
+        :param items: The vehicle details to be stored, keyed by VIN.
+        :type items: Dict[str, dict]
+        :param source: Where the vehicle details came from.
+        :type source: str
+        """
+        if not items:
+            return
+        fetched_at = datetime.utcnow()
+        expiry = () if self.ttl is None else ("EX", self.ttl)
+        commands = [
+            (
+                "SET",
+                self._key(vin),
+                self.codec.encode(vin, vehicle_details, fetched_at, source),
+                *expiry,
+            )
+            for vin, vehicle_details in items.items()
+        ]
+        try:
+            for reply in self.client.pipeline(commands):
+                if isinstance(reply, RespError):
+                    raise reply
+        except (OSError, RespError):
+            logging.exception(
+                "Encountered exception while trying to cache vins.",
+                extra={"vins": list(items)},
+            )
+
+    def delete(self, vin: str) -> bool:
+        """
+        Deletes the vehicle details from the cache for the provided VIN, and tells the other
+        workers to drop it from their in-memory tier.
+
+        :param vin: The VIN for which to delete the vehicle details.
+        :type vin: str
+        :return: True if the deletion is successful, False otherwise.
+        :rtype: bool
+        """
+        commands = [("DEL", self._key(vin))]
+        if self.invalidation_channel is not None:
+            commands.append(("PUBLISH", self.invalidation_channel, vin))
+        try:
+            deleted_keys = self.client.pipeline(commands)[0]
+            if isinstance(deleted_keys, RespError):
+                raise deleted_keys
+        except (OSError, RespError):
+            logging.exception(
+                "Encountered exception while trying to delete vin.", extra={"vin": vin}
+            )
+            return False
+        return deleted_keys > 0
+
+    def delete_matching(self, criteria: DeleteCriteria) -> int:
+        """
+        Deletes the VINs listed in the criteria with pipelined DEL commands, and publishes
+        them on the invalidation channel.
+
+        :param criteria: The criteria listing the VINs to delete.
+        :type criteria: DeleteCriteria
+        :return: The number of deleted VINs.
+        :rtype: int
+        :raises NotImplementedError: If the criteria have a predicate, as the server cannot
+            query the vehicle details.
+        :raises OSError: If the server cannot be reached.
+        :raises RespError: If the server answered with an error.
+        """
+        if criteria.vins is None or criteria.has_predicate():
+            raise NotImplementedError("The redis cache only deletes VIN lists in bulk.")
+        vins = list(criteria.vins)
+        deleted = 0
+        for start in range(0, len(vins), MGET_CHUNK_SIZE):
+            chunk = vins[start : start + MGET_CHUNK_SIZE]
+            commands = [("DEL", *map(self._key, chunk))]
+            if self.invalidation_channel is not None:
+                commands += [
+                    ("PUBLISH", self.invalidation_channel, vin) for vin in chunk
+                ]
+            deleted_keys = self.client.pipeline(commands)[0]
+            if isinstance(deleted_keys, RespError):
+                raise deleted_keys
+            deleted += deleted_keys
+        return deleted
+
+    def _key(self, vin: str) -> str:
+        return self.key_prefix + vin
+
+    @staticmethod
+    def _decode(vin: str, value: Optional[bytes]) -> CacheEntry:
+        if value is None:
+            return CacheEntry({})
+        return decode_entry(vin, value)
+
+
+class InvalidationSubscriber:
+    """
+    Listens on the invalidation channel from a daemon thread, and passes the VINs removed
+    by any worker to on_invalidate.
+
+    Messages published while the subscription is down are lost, so on_reconnect is called
+    every time the subscription is established again after a failure.
+    """
+
+    def __init__(
+        self,
+        client: RespClient,
+        channel: str,
+        on_invalidate: Callable[[str], None],
+        on_reconnect: Optional[Callable[[], None]] = None,
+        retry_delay: float = 1.0,
+    ):
+        self.client = client
+        self.channel = channel
+        self.on_invalidate = on_invalidate
+        self.on_reconnect = on_reconnect
+        self.retry_delay = retry_delay
+        self.received = 0
+        self._connection = None
+        self._stopping = threading.Event()
+        self._subscribed = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops listening and waits for the thread to finish.
+        """
+        self._stopping.set()
+        connection = self._connection
+        if connection is not None:
+            connection.shutdown()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait_subscribed(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the subscription is established.
+
+        :rtype: bool
+        """
+        return self._subscribed.wait(timeout)
+
+    def _run(self):
+        failed = False
+        while not self._stopping.is_set():
+            try:
+                self._connection = self.client.connect(timeout=None)
+                # stop may have run before the connection was set.
+                if self._stopping.is_set():
+                    break
+                self._connection.send(("SUBSCRIBE", self.channel))
+                self._connection.read_reply()
+                self._subscribed.set()
+                if failed and self.on_reconnect is not None:
+                    self.on_reconnect()
+                failed = False
+                while not self._stopping.is_set():
+                    message = self._connection.read_reply()
+                    if isinstance(message, list) and message[0] == b"message":
+                        self.received += 1
+                        self.on_invalidate(message[2].decode())
+            except (OSError, RespError):
+                if not self._stopping.is_set():
+                    logging.exception(
+                        "Lost the cache invalidation subscription, reconnecting."
+                    )
+                    failed = True
+                    self._subscribed.clear()
+                    self._stopping.wait(self.retry_delay)
+            finally:
+                if self._connection is not None:
+                    self._connection.close()
+                    self._connection = None
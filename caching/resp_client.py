@@ -0,0 +1,211 @@
+import socket
+import threading
+from typing import Any, List, Optional, Sequence, Union
+
+Argument = Union[str, bytes, int, float]
+
+
+class RespError(Exception):
+    """
+    Error reply of the server, e.g. to an unknown command.
+    """
+
+
+class RespConnection:
+    """
+    Connection to a server speaking the Redis serialization protocol (RESP2).
+
+    Bulk string replies are returned as bytes, arrays as lists, and error replies as
+    RespError instances, so that one failed command of a pipeline does not hide the
+    replies to the others. Any OSError leaves the connection in an unknown state, so
+    it must be closed.
+    """
+
+    def __init__(self, host: str, port: int, timeout: Optional[float]):
+        self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._socket.makefile("rb")
+
+    def send(self, *commands: Sequence[Argument]):
+        """
+        Sends the commands in a single write, without waiting for the replies.
+
+        :param commands: The commands, each a sequence of the command name and arguments.
+        :type commands: Sequence[Argument]
+        """
+        self._socket.sendall(b"".join(encode_command(command) for command in commands))
+
+    def read_reply(self) -> Any:
+        """
+        Reads the next reply.
+
+        :return: The decoded reply.
+        :rtype: Any
+        :raises ConnectionError: If the server closed the connection.
+        """
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("The server closed the connection.")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            return RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("The server closed the connection.")
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self.read_reply() for _ in range(length)]
+        raise ConnectionError(f"Unexpected reply from the server: {line!r}")
+
+    def set_timeout(self, timeout: Optional[float]):
+        self._socket.settimeout(timeout)
+
+    def shutdown(self):
+        """
+        Wakes up a thread blocked reading from the connection, from another thread.
+        """
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+
+def encode_command(command: Sequence[Argument]) -> bytes:
+    """
+    Encodes a command as a RESP array of bulk strings.
+
+    :rtype: bytes
+    """
+    parts = [b"*%d\r\n" % len(command)]
+    for argument in command:
+        if not isinstance(argument, bytes):
+            argument = str(argument).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+    return b"".join(parts)
+
+
+class RespClient:
+    """
+    Thread-safe client keeping a pool of connections to a server speaking the Redis protocol.
+
+    Connections are opened on demand, so the server does not need to be up when the client
+    is created. At most max_idle_connections connections are kept open between calls.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        db: int = 0,
+        password: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_idle_connections: int = 8,
+    ):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.max_idle_connections = max_idle_connections
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def execute(self, *command: Argument) -> Any:
+        """
+        Sends a command and returns its reply.
+
+        :raises RespError: If the server answered with an error.
+        :raises OSError: If the server cannot be reached.
+        """
+        reply = self.pipeline([command])[0]
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    def pipeline(self, commands: List[Sequence[Argument]]) -> List[Any]:
+        """
+        Sends several commands in a single write, then reads their replies, so they cost a
+        single round trip.
+
+        :param commands: The commands, each a sequence of the command name and arguments.
+        :type commands: List[Sequence[Argument]]
+        :return: The replies, in the order of the commands. Error replies are RespError
+            instances.
+        :rtype: List[Any]
+        :raises OSError: If the server cannot be reached.
+        """
+        connection = self._acquire()
+        try:
+            connection.send(*commands)
+            replies = [connection.read_reply() for _ in commands]
+        except BaseException:
+            connection.close()
+            raise
+        self._release(connection)
+        return replies
+
+    def connect(self, timeout: Optional[float] = None) -> RespConnection:
+        """
+        Opens a connection of its own, outside the pool, e.g. to subscribe to a channel.
+
+        :param timeout: The socket timeout of the connection, None to block.
+        :type timeout: Optional[float]
+        :rtype: RespConnection
+        :raises RespError: If authentication or selecting the database failed.
+        :raises OSError: If the server cannot be reached.
+        """
+        connection = RespConnection(self.host, self.port, self.timeout)
+        try:
+            commands = []
+            if self.password is not None:
+                commands.append(("AUTH", self.password))
+            if self.db:
+                commands.append(("SELECT", self.db))
+            if commands:
+                connection.send(*commands)
+                for _ in commands:
+                    reply = connection.read_reply()
+                    if isinstance(reply, RespError):
+                        raise reply
+            connection.set_timeout(timeout)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def close(self):
+        """
+        Closes the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _acquire(self) -> RespConnection:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self.connect(self.timeout)
+
+    def _release(self, connection: RespConnection):
+        with self._lock:
+            if len(self._idle) < self.max_idle_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
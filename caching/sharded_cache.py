@@ -0,0 +1,300 @@
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from caching.cache_interface import CacheEntry, CacheInterface, DeleteCriteria
+from caching.sqlite_cache import (
+    DELETE_CHUNK_SIZE,
+    DEFAULT_SOURCE,
+    LRU,
+    REPLACE,
+    REWRITE_VERSION,
+    VERSION,
+    SqliteCache,
+)
+
+# Rows held in memory per shard by import_rows before they are written.
+IMPORT_CHUNK_SIZE = 5000
+
+
+class ShardedSqliteCache(CacheInterface):
+    """
+    Cache class spreading the VINs across several SQLite databases, each holding a vins
+    table of its own, so that writes to different shards do not wait for a single file lock.
+
+    A VIN always maps to the same shard, picked by the CRC-32 of the VIN, so changing the
+    number of shards leaves the VINs cached before in shards they are no longer looked up
+    in. Move them with /export and /import.
+
+    Also provides the access tracking, size and eviction methods of SqliteCache, applied to
+    every shard, for the CacheEvictor to bound the cache as a whole.
+
+    The negative cache is kept in the application database rather than in the shards, so
+    set, set_many and import_rows remove the VINs written from negative_cache, when given.
+    """
+
+    def __init__(
+        self, databases: List, negative_cache: Optional[CacheInterface] = None
+    ):
+        if not databases:
+            raise ValueError("A sharded cache needs at least one database.")
+        self.databases = list(databases)
+        self.shards = [SqliteCache(database) for database in self.databases]
+        self.negative_cache = negative_cache
+
+    def get_shard(self, vin: str) -> SqliteCache:
+        return self.shards[zlib.crc32(vin.encode()) % len(self.shards)]
+
+    def get(self, vin: str) -> dict:
+        """
+        Retrieves the vehicle details from the shard of the VIN.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: The vehicle details retrieved from the cache.
+        :rtype: dict
+        """
+        return self.get_shard(vin).get(vin)
+
+    def get_entry(self, vin: str) -> CacheEntry:
+        return self.get_shard(vin).get_entry(vin)
+
+    def set(self, vin: str, vehicle_details: dict, source: str = DEFAULT_SOURCE):
+        """
+        Sets the vehicle details in the shard of the VIN, and removes the VIN from the
+        negative cache.
+
+        :param vin: The VIN for which to set the vehicle details.
+        :type vin: str
+        :param vehicle_details: The vehicle details to be stored in the cache.
+        :type vehicle_details: dict
+        :param source: Where the vehicle details came from.
+        :type source: str
+        """
+        self.get_shard(vin).set(vin, vehicle_details, source=source)
+        self._clear_negative([vin])
+
+    def get_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        """
+        Retrieves the vehicle details for several VINs, with one query per shard.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: The vehicle details keyed by VIN, for the VINs present in the cache.
+        :rtype: Dict[str, dict]
+        """
+        vehicle_details = {}
+        for shard, shard_vins in self._group(vins).items():
+            vehicle_details.update(shard.get_many(shard_vins))
+        return vehicle_details
+
+    def get_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        """
+        Retrieves the vehicle details for several VINs along with the time they were
+        fetched, with one query per shard.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: The vehicle details and their fetch time keyed by VIN, for the VINs present
+            in the cache.
+        :rtype: Dict[str, CacheEntry]
+        """
+        entries = {}
+        for shard, shard_vins in self._group(vins).items():
+            entries.update(shard.get_many_entries(shard_vins))
+        return entries
+
+    def set_many(self, items: Dict[str, dict], source: str = DEFAULT_SOURCE):
+        """
+        Sets the vehicle details for several VINs, in one transaction per shard, and removes
+        the VINs from the negative cache.
+
+        :param items: The vehicle details to be stored, keyed by VIN.
+        :type items: Dict[str, dict]
+        :param source: Where the vehicle details came from.
+        :type source: str
+        """
+        for shard, vins in self._group(items).items():
+            shard.set_many({vin: items[vin] for vin in vins}, source=source)
+        self._clear_negative(items)
+
+    def import_rows(
+        self,
+        rows: Iterable[Dict[str, Any]],
+        on_conflict: str = REPLACE,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+    ) -> int:
+        """
+        Upserts rows of the vins table. The rows are gathered per shard and written, with
+        the VINs removed from the negative cache, in one transaction per chunk_size rows of
+        a shard, so at most chunk_size rows per shard are held in memory.
+
+        :param rows: The rows, with the columns of the vins table and at least the vin.
+        :type rows: Iterable[Dict[str, Any]]
+        :param on_conflict: One of CONFLICT_POLICIES.
+        :type on_conflict: str
+        :param chunk_size: The number of rows written per transaction of a shard.
+        :type chunk_size: int
+        :return: The number of rows inserted or updated.
+        :rtype: int
+        :raises Exception: Any exception writing the database. The chunks written before
+            keep their rows.
+        """
+        written = 0
+        shard_rows = defaultdict(list)
+        for row in rows:
+            shard = self.get_shard(row["vin"])
+            shard_rows[shard].append(row)
+            if len(shard_rows[shard]) >= chunk_size:
+                written += self._import_chunk(shard, shard_rows.pop(shard), on_conflict)
+        for shard, chunk in shard_rows.items():
+            written += self._import_chunk(shard, chunk, on_conflict)
+        return written
+
+    def delete(self, vin: str) -> bool:
+        """
+        Deletes the vehicle details from the shard of the VIN.
+
+        :param vin: The VIN for which to delete the vehicle details.
+        :type vin: str
+        :return: True if the deletion is successful, False otherwise.
+        :rtype: bool
+        """
+        return self.get_shard(vin).delete(vin)
+
+    def delete_matching(
+        self, criteria: DeleteCriteria, chunk_size: int = DELETE_CHUNK_SIZE
+    ) -> int:
+        """
+        Deletes the VINs matching the criteria from every shard, or only from the shards of
+        the VINs when the criteria list some.
+
+        :param criteria: The criteria selecting the VINs to delete.
+        :type criteria: DeleteCriteria
+        :param chunk_size: The number of VINs deleted per transaction at most.
+        :type chunk_size: int
+        :return: The number of deleted VINs.
+        :rtype: int
+        :raises Exception: Any exception writing the database. The shards purged before
+            stay purged.
+        """
+        if criteria.vins is None:
+            return sum(
+                shard.delete_matching(criteria, chunk_size=chunk_size)
+                for shard in self.shards
+            )
+        return sum(
+            shard.delete_matching(
+                criteria._replace(vins=frozenset(vins)), chunk_size=chunk_size
+            )
+            for shard, vins in self._group(criteria.vins).items()
+        )
+
+    def record_accesses(self, vins: Iterable[str]):
+        for shard, shard_vins in self._group(vins).items():
+            shard.record_accesses(shard_vins)
+
+    def flush_accesses(self) -> int:
+        return sum(shard.flush_accesses() for shard in self.shards)
+
+    def pending_accesses(self) -> int:
+        return sum(shard.pending_accesses() for shard in self.shards)
+
+    @property
+    def dropped_accesses(self) -> int:
+        return sum(shard.dropped_accesses for shard in self.shards)
+
+    def get_size(self) -> Dict[str, int]:
+        """
+        Returns the number of cached rows and the size of the database files, summed over
+        the shards. auto_vacuum is the lowest value of the shards.
+
+        :rtype: Dict[str, int]
+        """
+        sizes = [shard.get_size() for shard in self.shards]
+        size = {
+            name: sum(shard_size[name] for shard_size in sizes)
+            for name in ("rows", "file_bytes", "used_bytes", "free_bytes")
+        }
+        size["auto_vacuum"] = min(shard_size["auto_vacuum"] for shard_size in sizes)
+        size["shards"] = len(self.shards)
+        return size
+
+    def evict(
+        self, count: int, policy: str = LRU, chunk_size: int = DELETE_CHUNK_SIZE
+    ) -> int:
+        """
+        Deletes up to count rows, taken from the shards in proportion to their rows. VINs
+        are spread evenly, so this picks about the same rows as one store would.
+
+        :param count: The number of rows to evict.
+        :type count: int
+        :param policy: One of EVICTION_POLICIES.
+        :type policy: str
+        :param chunk_size: The number of rows deleted per transaction at most.
+        :type chunk_size: int
+        :return: The number of evicted rows.
+        :rtype: int
+        :raises ValueError: If policy is not one of EVICTION_POLICIES.
+        :raises Exception: Any exception reading or writing the database.
+        """
+        shard_rows = [shard.get_size()["rows"] for shard in self.shards]
+        total_rows = sum(shard_rows)
+        count = min(count, total_rows)
+        if count <= 0:
+            return 0
+        shares = [count * rows // total_rows for rows in shard_rows]
+        remainders = sorted(
+            range(len(self.shards)),
+            key=lambda index: count * shard_rows[index] % total_rows,
+            reverse=True,
+        )
+        for index in remainders[: count - sum(shares)]:
+            shares[index] += 1
+        return sum(
+            shard.evict(share, policy, chunk_size=chunk_size)
+            for shard, share in zip(self.shards, shares)
+            if share
+        )
+
+    def reclaim_space(self, pages: int) -> int:
+        """
+        Returns up to the given number of free pages of each shard to the file system.
+
+        :param pages: The number of free pages to release per shard at most.
+        :type pages: int
+        :return: The number of pages released.
+        :rtype: int
+        """
+        return sum(shard.reclaim_space(pages) for shard in self.shards)
+
+    def get_versions(self) -> Dict[str, int]:
+        """
+        Returns the change counters of the cache, summed over the shards. The sums only grow,
+        and change whenever a shard changes.
+
+        :return: The VERSION and REWRITE_VERSION counters.
+        :rtype: Dict[str, int]
+        """
+        versions = {VERSION: 0, REWRITE_VERSION: 0}
+        for shard in self.shards:
+            for name, value in shard.get_versions().items():
+                versions[name] += value
+        return versions
+
+    def _import_chunk(
+        self, shard: SqliteCache, rows: List[Dict[str, Any]], on_conflict: str
+    ) -> int:
+        written = shard.import_rows(rows, on_conflict=on_conflict)
+        self._clear_negative(row["vin"] for row in rows)
+        return written
+
+    def _clear_negative(self, vins: Iterable[str]):
+        if self.negative_cache is not None:
+            self.negative_cache.delete_matching(DeleteCriteria(vins=frozenset(vins)))
+
+    def _group(self, vins: Iterable[str]) -> Dict[SqliteCache, List[str]]:
+        shard_vins = defaultdict(list)
+        for vin in vins:
+            shard_vins[self.get_shard(vin)].append(vin)
+        return shard_vins
@@ -1,27 +1,69 @@
-import json
+import functools
+import itertools
 import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
 
-from caching.cache_interface import CacheInterface
+from sqlalchemy import bindparam, delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from caching.cache_interface import CacheEntry, CacheInterface, DeleteCriteria
 from database.connection import database
-from models.database_models import Vin as VinDBModel
+from models.database_models import CacheMetadata, NegativeVin, Vin as VinDBModel
 
+# SQLite limits the number of bound parameters per statement.
+IN_CLAUSE_CHUNK_SIZE = 500
 
-class Cache(CacheInterface):
-    """
-    Cache class for storing and retrieving vehicle details.
+# Counters in the cache metadata table. VERSION changes on every write, REWRITE_VERSION only
+# on writes that change or remove existing rows, i.e. the ones that are not plain appends.
+VERSION = "version"
+REWRITE_VERSION = "rewrite_version"
 
-    Provides methods to get, set, and delete vehicle details from the cache.
-    """
+# Recorded in the source column of rows cached from the vPIC API.
+DEFAULT_SOURCE = "vpic"
 
-    __instance = None
+# What import_rows does with a row whose VIN is already cached: REPLACE overwrites it, SKIP
+# keeps the cached row, NEWER overwrites it only if the imported row was fetched later.
+REPLACE = "replace"
+SKIP = "skip"
+NEWER = "newer"
+CONFLICT_POLICIES = (REPLACE, SKIP, NEWER)
+# SQLite builds before 3.32 allow at most 999 bound parameters per statement.
+MAX_STATEMENT_PARAMETERS = 999
 
-    def __new__(cls, *args):
-        if cls.__instance is None:
-            cls.__instance = super(Cache, cls).__new__(cls)
-        return cls.__instance
+# VINs deleted per transaction by delete_matching.
+DELETE_CHUNK_SIZE = 5000
+
+# Eviction policies: LRU evicts the least recently read rows first, LFU the least read ones.
+LRU = "lru"
+LFU = "lfu"
+EVICTION_POLICIES = (LRU, LFU)
+# Columns tracking how the rows are read, left as they are when a row is rewritten.
+ACCESS_COLUMNS = ("hits", "last_accessed_at")
+# Distinct VINs whose reads are counted between two flush_accesses calls. Reads of other
+# VINs are dropped until the next flush.
+MAX_PENDING_ACCESSES = 100000
+# PRAGMA auto_vacuum value of databases whose free pages can be reclaimed incrementally.
+AUTO_VACUUM_INCREMENTAL = 2
 
-    def __init__(self, database):
+
+class SqliteCache(CacheInterface):
+    """
+    Cache class for storing and retrieving vehicle details in a SQLite database.
+
+    Provides methods to get, set, and delete vehicle details from the cache. Reads are
+    counted in memory, and written to the hits and last_accessed_at columns by
+    flush_accesses, so that reads do not write to the database.
+    """
+
+    def __init__(self, database, max_pending_accesses: int = MAX_PENDING_ACCESSES):
         self.database = database
+        self.max_pending_accesses = max_pending_accesses
+        self.dropped_accesses = 0
+        self._accesses = Counter()
+        self._accesses_lock = threading.Lock()
 
     def get(self, vin: str) -> dict:
         """
@@ -32,21 +74,39 @@ class Cache(CacheInterface):
         :return: The vehicle details retrieved from the cache.
         :rtype: dict
         """
+        return self.get_entry(vin).value
+
+    def get_entry(self, vin: str) -> CacheEntry:
+        """
+        Retrieves the vehicle details from the cache along with the time they were fetched.
+
+        :param vin: The VIN for which to retrieve the vehicle details.
+        :type vin: str
+        :return: The vehicle details, empty if not cached, and when they were fetched. Rows
+            stored before the fetched_at column existed have no fetch time.
+        :rtype: CacheEntry
+        """
         try:
             db_session = self.database.get_session()
             vin_object = db_session.query(VinDBModel).filter_by(vin=vin).one_or_none()
-            vin_object = json.loads(vin_object.vehicle_details) if vin_object else {}
+            if vin_object:
+                entry = CacheEntry(
+                    vin_object.to_vehicle_details(), vin_object.fetched_at
+                )
+                self.record_accesses((vin,))
+            else:
+                entry = CacheEntry({})
         except Exception:
             logging.exception(
                 "Encountered exception while trying to fetch cache vin.",
                 extra={"vin": vin},
             )
-            vin_object = {}
+            entry = CacheEntry({})
         finally:
             db_session.close()
-        return vin_object
+        return entry
 
-    def set(self, vin: str, vehicle_details: dict):
+    def set(self, vin: str, vehicle_details: dict, source: str = DEFAULT_SOURCE):
         """
         Sets the vehicle details in the cache for the provided VIN.
 
@@ -54,13 +114,26 @@ class Cache(CacheInterface):
         :type vin: str
         :param vehicle_details: The vehicle details to be stored in the cache.
         :type vehicle_details: dict
+        :param source: Where the vehicle details came from.
+        :type source: str
         """
         try:
             db_session = self.database.get_session()
+            existing = db_session.get(VinDBModel, vin) is not None
+            fetched_at = datetime.utcnow()
             vehicle_details = VinDBModel(
-                vin=vin, vehicle_details=json.dumps(vehicle_details)
+                vin=vin,
+                vehicle_details=None,
+                fetched_at=fetched_at,
+                # Caching a VIN counts as an access, so new rows are not evicted first.
+                last_accessed_at=fetched_at,
+                source=source,
+                **VinDBModel.columns_from_vehicle_details(vehicle_details),
             )
-            db_session.add(vehicle_details)
+            # merge rather than add, so a concurrent writer of the same vin does not
+            # fail on the primary key.
+            db_session.merge(vehicle_details)
+            self._bump_versions(db_session, rewrite=existing)
             db_session.commit()
         except Exception:
             logging.exception(
@@ -70,6 +143,181 @@ class Cache(CacheInterface):
         finally:
             db_session.close()
 
+    def get_many(self, vins: Iterable[str]) -> Dict[str, dict]:
+        """
+        Retrieves the vehicle details for several VINs with one IN query per chunk.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: The vehicle details keyed by VIN, for the VINs present in the cache.
+        :rtype: Dict[str, dict]
+        """
+        return {vin: entry.value for vin, entry in self.get_many_entries(vins).items()}
+
+    def get_many_entries(self, vins: Iterable[str]) -> Dict[str, CacheEntry]:
+        """
+        Retrieves the vehicle details for several VINs along with the time they were
+        fetched, with one IN query per chunk.
+
+        :param vins: The VINs for which to retrieve the vehicle details.
+        :type vins: Iterable[str]
+        :return: The vehicle details and their fetch time keyed by VIN, for the VINs present
+            in the cache.
+        :rtype: Dict[str, CacheEntry]
+        """
+        vins = list(vins)
+        entries = {}
+        try:
+            db_session = self.database.get_session()
+            for start in range(0, len(vins), IN_CLAUSE_CHUNK_SIZE):
+                chunk = vins[start : start + IN_CLAUSE_CHUNK_SIZE]
+                rows = db_session.query(VinDBModel).filter(VinDBModel.vin.in_(chunk))
+                for row in rows:
+                    entries[row.vin] = CacheEntry(
+                        row.to_vehicle_details(), row.fetched_at
+                    )
+            self.record_accesses(entries)
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to fetch cache vins.",
+                extra={"vins": vins},
+            )
+        finally:
+            db_session.close()
+        return entries
+
+    def set_many(self, items: Dict[str, dict], source: str = DEFAULT_SOURCE):
+        """
+        Sets the vehicle details for several VINs in a single transaction.
+
+        :param items: The vehicle details to be stored, keyed by VIN.
+        :type items: Dict[str, dict]
+        :param source: Where the vehicle details came from.
+        :type source: str
+        """
+        if not items:
+            return
+        fetched_at = datetime.utcnow()
+        rows = [
+            {
+                "vin": vin,
+                "vehicle_details": None,
+                "fetched_at": fetched_at,
+                "last_accessed_at": fetched_at,
+                "source": source,
+                **VinDBModel.columns_from_vehicle_details(vehicle_details),
+            }
+            for vin, vehicle_details in items.items()
+        ]
+        statement = insert(VinDBModel)
+        statement = statement.on_conflict_do_update(
+            index_elements=[VinDBModel.vin],
+            set_={
+                column: statement.excluded[column]
+                for column in rows[0]
+                if column != "vin"
+            },
+        )
+        try:
+            db_session = self.database.get_session()
+            vins = list(items)
+            existing = any(
+                db_session.query(VinDBModel.vin)
+                .filter(VinDBModel.vin.in_(vins[start : start + IN_CLAUSE_CHUNK_SIZE]))
+                .first()
+                for start in range(0, len(vins), IN_CLAUSE_CHUNK_SIZE)
+            )
+            db_session.execute(statement, rows)
+            self._bump_versions(db_session, rewrite=existing)
+            db_session.commit()
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to cache vins.",
+                extra={"vins": list(items)},
+            )
+            db_session.rollback()
+        finally:
+            db_session.close()
+
+    def import_rows(
+        self, rows: Iterable[Dict[str, Any]], on_conflict: str = REPLACE
+    ) -> int:
+        """
+        Upserts rows of the vins table in a single transaction, with multi-row INSERT
+        statements. The rows are consumed as the statements are built, so an iterator
+        only holds one statement worth of rows in memory.
+
+        The imported VINs are removed from the negative cache.
+
+        :param rows: The rows, with the columns of the vins table and at least the vin.
+        :type rows: Iterable[Dict[str, Any]]
+        :param on_conflict: One of CONFLICT_POLICIES.
+        :type on_conflict: str
+        :return: The number of rows inserted or updated.
+        :rtype: int
+        :raises ValueError: If on_conflict is not one of CONFLICT_POLICIES.
+        :raises Exception: Any exception writing the database, after rolling back.
+        """
+        if on_conflict not in CONFLICT_POLICIES:
+            raise ValueError(
+                f"Unknown conflict policy: {on_conflict}, expected one of "
+                f"{CONFLICT_POLICIES}."
+            )
+        columns = VinDBModel.__table__.columns
+        names = [column.name for column in columns]
+        rows_per_statement = MAX_STATEMENT_PARAMETERS // len(names)
+        rows = iter(rows)
+        written = 0
+        existing = False
+        db_session = self.database.get_session()
+        try:
+            connection = db_session.connection()
+            dialect = connection.dialect
+            # Converts the values the way the ORM does, e.g. datetimes to the stored format.
+            processors = [
+                column.type.dialect_impl(dialect).bind_processor(dialect)
+                for column in columns
+            ]
+            while True:
+                chunk = list(itertools.islice(rows, rows_per_statement))
+                if not chunk:
+                    break
+                vins = tuple(row["vin"] for row in chunk)
+                in_clause = f"({', '.join(['?'] * len(vins))})"
+                # Skipped rows leave the cached ones untouched, so they are no rewrite.
+                if on_conflict != SKIP and not existing:
+                    existing = (
+                        connection.exec_driver_sql(
+                            f"SELECT 1 FROM {VinDBModel.__tablename__}"
+                            f" WHERE vin IN {in_clause} LIMIT 1",
+                            vins,
+                        ).first()
+                        is not None
+                    )
+                parameters = []
+                for row in chunk:
+                    parameters.extend(
+                        row.get(name) if processor is None else processor(row.get(name))
+                        for name, processor in zip(names, processors)
+                    )
+                result = connection.exec_driver_sql(
+                    build_import_statement(on_conflict, len(chunk)), tuple(parameters)
+                )
+                written += result.rowcount
+                connection.exec_driver_sql(
+                    f"DELETE FROM {NegativeVin.__tablename__} WHERE vin IN {in_clause}",
+                    vins,
+                )
+            if written:
+                self._bump_versions(db_session, rewrite=existing)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.close()
+        return written
+
     def delete(self, vin: str) -> bool:
         """
         Deletes the vehicle details from the cache for the provided VIN.
@@ -83,6 +331,8 @@ class Cache(CacheInterface):
         try:
             db_session = self.database.get_session()
             deleted_rows = db_session.query(VinDBModel).filter_by(vin=vin).delete()
+            if deleted_rows > 0:
+                self._bump_versions(db_session, rewrite=True)
             db_session.commit()
             success = True if deleted_rows > 0 else False
         except Exception:
@@ -94,5 +344,326 @@ class Cache(CacheInterface):
             db_session.close()
             return success
 
+    def delete_matching(
+        self, criteria: DeleteCriteria, chunk_size: int = DELETE_CHUNK_SIZE
+    ) -> int:
+        """
+        Deletes the VINs matching the criteria with set-based DELETE statements, committing
+        every chunk_size VINs so that other writers are not locked out for the whole purge.
+
+        :param criteria: The criteria selecting the VINs to delete.
+        :type criteria: DeleteCriteria
+        :param chunk_size: The number of VINs deleted per transaction at most.
+        :type chunk_size: int
+        :return: The number of deleted VINs.
+        :rtype: int
+        :raises Exception: Any exception writing the database, after rolling back the current
+            chunk. The chunks committed before it stay deleted.
+        """
+        conditions = self._delete_conditions(criteria)
+        deleted = 0
+        if criteria.vins is not None:
+            vins = list(criteria.vins)
+            for start in range(0, len(vins), chunk_size):
+                chunk = vins[start : start + chunk_size]
+                deleted += self._delete_chunk(
+                    [
+                        delete(VinDBModel).where(
+                            VinDBModel.vin.in_(
+                                chunk[offset : offset + IN_CLAUSE_CHUNK_SIZE]
+                            ),
+                            *conditions,
+                        )
+                        for offset in range(0, len(chunk), IN_CLAUSE_CHUNK_SIZE)
+                    ]
+                )
+            return deleted
+        statement = delete(VinDBModel).where(
+            VinDBModel.vin.in_(
+                select(VinDBModel.vin).where(*conditions).limit(chunk_size)
+            )
+        )
+        while True:
+            chunk_deleted = self._delete_chunk([statement])
+            deleted += chunk_deleted
+            if chunk_deleted < chunk_size:
+                return deleted
+
+    def _delete_chunk(self, statements: List) -> int:
+        db_session = self.database.get_session()
+        try:
+            deleted = sum(
+                db_session.execute(statement).rowcount for statement in statements
+            )
+            if deleted:
+                self._bump_versions(db_session, rewrite=True)
+            db_session.commit()
+        except Exception:
+            db_session.rollback()
+            raise
+        finally:
+            db_session.close()
+        return deleted
+
+    @staticmethod
+    def _delete_conditions(criteria: DeleteCriteria) -> List:
+        conditions = []
+        if criteria.vin_prefix is not None:
+            # A range rather than LIKE, so that the primary key index is used.
+            prefix = criteria.vin_prefix
+            upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            conditions += [VinDBModel.vin >= prefix, VinDBModel.vin < upper_bound]
+        if criteria.make is not None:
+            conditions.append(VinDBModel.make == criteria.make)
+        if criteria.model is not None:
+            conditions.append(VinDBModel.model == criteria.model)
+        if criteria.model_year is not None:
+            conditions.append(VinDBModel.model_year == criteria.model_year)
+        if criteria.fetched_before is not None:
+            # Rows stored before the fetched_at column existed are older than any date.
+            conditions.append(
+                (VinDBModel.fetched_at < criteria.fetched_before)
+                | VinDBModel.fetched_at.is_(None)
+            )
+        return conditions
+
+    def record_accesses(self, vins: Iterable[str]):
+        """
+        Counts reads of the VINs, to be written by the next flush_accesses call.
+
+        :param vins: The VINs read.
+        :type vins: Iterable[str]
+        """
+        with self._accesses_lock:
+            for vin in vins:
+                if (
+                    vin in self._accesses
+                    or len(self._accesses) < self.max_pending_accesses
+                ):
+                    self._accesses[vin] += 1
+                else:
+                    self.dropped_accesses += 1
+
+    def flush_accesses(self) -> int:
+        """
+        Adds the reads counted since the last call to the hits of the rows, and sets their
+        last_accessed_at to now, in a single transaction. The cache versions are left as
+        they are, as the exported columns do not change.
+
+        :return: The number of VINs whose reads were written.
+        :rtype: int
+        """
+        with self._accesses_lock:
+            accesses, self._accesses = self._accesses, Counter()
+        if not accesses:
+            return 0
+        table = VinDBModel.__table__
+        statement = (
+            table.update()
+            .where(table.c.vin == bindparam("accessed_vin"))
+            .values(
+                hits=func.coalesce(table.c.hits, 0) + bindparam("accessed_hits"),
+                last_accessed_at=datetime.utcnow(),
+            )
+        )
+        try:
+            db_session = self.database.get_session()
+            db_session.execute(
+                statement,
+                [
+                    {"accessed_vin": vin, "accessed_hits": hits}
+                    for vin, hits in accesses.items()
+                ],
+            )
+            db_session.commit()
+        except Exception:
+            logging.exception(
+                "Encountered exception while trying to write cache reads."
+            )
+            db_session.rollback()
+            return 0
+        finally:
+            db_session.close()
+        return len(accesses)
+
+    def pending_accesses(self) -> int:
+        with self._accesses_lock:
+            return len(self._accesses)
+
+    def get_size(self) -> Dict[str, int]:
+        """
+        Returns the number of cached rows and the size of the database file.
+
+        :return: The rows, the bytes of the file, of its used pages and of its free pages,
+            and the PRAGMA auto_vacuum value.
+        :rtype: Dict[str, int]
+        """
+        db_session = self.database.get_session()
+        try:
+            rows = db_session.scalar(select(func.count()).select_from(VinDBModel))
+            connection = db_session.connection()
+            pragmas = {
+                name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                for name in ("page_size", "page_count", "freelist_count", "auto_vacuum")
+            }
+        finally:
+            db_session.close()
+        page_size = pragmas["page_size"]
+        return {
+            "rows": rows,
+            "file_bytes": pragmas["page_count"] * page_size,
+            "used_bytes": (pragmas["page_count"] - pragmas["freelist_count"])
+            * page_size,
+            "free_bytes": pragmas["freelist_count"] * page_size,
+            "auto_vacuum": pragmas["auto_vacuum"],
+        }
+
+    def evict(
+        self, count: int, policy: str = LRU, chunk_size: int = DELETE_CHUNK_SIZE
+    ) -> int:
+        """
+        Deletes up to count rows, the least recently read ones first with LRU and the least
+        read ones with LFU, the least recently read first among rows read as often. Rows
+        imported or cached before reads were tracked have no hits or last read, and go
+        first. The victims are picked with one indexed query, then deleted chunk_size rows
+        per transaction.
+
+        :param count: The number of rows to evict.
+        :type count: int
+        :param policy: One of EVICTION_POLICIES.
+        :type policy: str
+        :param chunk_size: The number of rows deleted per transaction at most.
+        :type chunk_size: int
+        :return: The number of evicted rows.
+        :rtype: int
+        :raises ValueError: If policy is not one of EVICTION_POLICIES.
+        :raises Exception: Any exception reading or writing the database.
+        """
+        if policy == LRU:
+            order = [VinDBModel.last_accessed_at]
+        elif policy == LFU:
+            order = [VinDBModel.hits, VinDBModel.last_accessed_at]
+        else:
+            raise ValueError(
+                f"Unknown eviction policy: {policy}, expected one of "
+                f"{EVICTION_POLICIES}."
+            )
+        if count <= 0:
+            return 0
+        db_session = self.database.get_session()
+        try:
+            victims = db_session.scalars(
+                select(VinDBModel.vin).order_by(*order).limit(count)
+            ).all()
+        finally:
+            db_session.close()
+        if not victims:
+            return 0
+        return self.delete_matching(
+            DeleteCriteria(vins=frozenset(victims)), chunk_size=chunk_size
+        )
+
+    def reclaim_space(self, pages: int) -> int:
+        """
+        Returns up to the given number of free pages to the file system. Only databases
+        created with auto_vacuum=INCREMENTAL, or vacuumed after setting it, can shrink
+        without rewriting the whole file.
+
+        :param pages: The number of free pages to release at most.
+        :type pages: int
+        :return: The number of pages released.
+        :rtype: int
+        """
+        engine = self.database.get_engine()
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if auto_vacuum != AUTO_VACUUM_INCREMENTAL or pages <= 0:
+                return 0
+            free_pages = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion, execute would free one page.
+            connection.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({int(pages)});"
+            )
+            return free_pages - cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        finally:
+            connection.close()
+
+    def get_versions(self) -> Dict[str, int]:
+        """
+        Returns the change counters of the cache. Counters that were never bumped are 0.
+
+        :return: The VERSION and REWRITE_VERSION counters.
+        :rtype: Dict[str, int]
+        """
+        versions = {VERSION: 0, REWRITE_VERSION: 0}
+        try:
+            db_session = self.database.get_session()
+            for row in db_session.query(CacheMetadata):
+                versions[row.name] = row.value
+        finally:
+            db_session.close()
+        return versions
+
+    @staticmethod
+    def _bump_versions(db_session, rewrite: bool):
+        names = [VERSION, REWRITE_VERSION] if rewrite else [VERSION]
+        statement = insert(CacheMetadata).values(
+            [{"name": name, "value": 1} for name in names]
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[CacheMetadata.name],
+            set_={"value": CacheMetadata.value + 1},
+        )
+        db_session.execute(statement)
+
+
+@functools.lru_cache(maxsize=None)
+def build_import_statement(on_conflict: str, row_count: int) -> str:
+    """
+    Builds the multi-row upsert of row_count rows used by SqliteCache.import_rows, with
+    positional parameters in the order of the columns of the vins table.
+
+    Built by hand rather than with insert().values(), which compiles the statement again
+    for every chunk of rows and made the import an order of magnitude slower.
+
+    :rtype: str
+    """
+    table = VinDBModel.__table__
+    names = [column.name for column in table.columns]
+    placeholders = ", ".join(["?"] * len(names))
+    statement = (
+        f"INSERT INTO {table.name} ({', '.join(names)}) VALUES "
+        + ", ".join([f"({placeholders})"] * row_count)
+        + " ON CONFLICT (vin) DO "
+    )
+    if on_conflict == SKIP:
+        return statement + "NOTHING"
+    statement += "UPDATE SET " + ", ".join(
+        f"{name} = excluded.{name}"
+        for name in names
+        if name != "vin" and name not in ACCESS_COLUMNS
+    )
+    if on_conflict == NEWER:
+        statement += (
+            f" WHERE {table.name}.fetched_at IS NULL"
+            f" OR excluded.fetched_at > {table.name}.fetched_at"
+        )
+    return statement
+
+
+class Cache(SqliteCache):
+    """
+    Singleton cache bound to the application database.
+    """
+
+    __instance = None
+
+    def __new__(cls, *args):
+        if cls.__instance is None:
+            cls.__instance = super(Cache, cls).__new__(cls)
+        return cls.__instance
+
 
 cache = Cache(database)
@@ -5,3 +5,50 @@ HERE = os.path.dirname(os.path.abspath(__file__))
 DATABASE_NAME = "vins_database.db"
 DATABASE_PATH = os.path.join(HERE, "..", "data")
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}/{DATABASE_NAME}"
+
+# Databases holding the vins table with the "sharded_sqlite" cache backend, one per shard.
+# VINs are assigned to shards by hash, so changing the count requires moving the cache with
+# /export and /import.
+DATABASE_SHARD_COUNT = 4
+DATABASE_SHARD_URLS = [
+    f"sqlite:///{DATABASE_PATH}/vins_database_shard_{index}.db"
+    for index in range(DATABASE_SHARD_COUNT)
+]
+
+# SQLite engine profiles. The pragmas of the selected profile are applied to every new
+# connection; an empty profile keeps the SQLite defaults (rollback journal, synchronous=FULL).
+# auto_vacuum only takes effect when set before the first table of a database is created.
+DATABASE_PROFILES = {
+    "default": {},
+    "durable": {
+        "auto_vacuum": "INCREMENTAL",
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+    },
+    "balanced": {
+        "auto_vacuum": "INCREMENTAL",
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+    },
+    "fast": {
+        "auto_vacuum": "INCREMENTAL",
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY",
+    },
+}
+DATABASE_PROFILE = "balanced"
+
+# Connection pool configuration
+DATABASE_POOL_SIZE = 8
+DATABASE_MAX_OVERFLOW = 8
+DATABASE_POOL_TIMEOUT = 30
@@ -1,8 +1,73 @@
-from sqlalchemy import create_engine
+import time
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
-from database.config import DATABASE_URL
+from database.config import (
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_SIZE,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_PROFILE,
+    DATABASE_PROFILES,
+    DATABASE_URL,
+)
 from database.database_interface import DatabaseInterface
+from metrics.metrics import sqlite_query_duration
+
+
+def create_database_engine(url: str, profile: str = DATABASE_PROFILE, **engine_options):
+    """
+    Creates an engine whose connections are tuned with the pragmas of the given profile.
+
+    :param url: The database url.
+    :type url: str
+    :param profile: The name of a profile in DATABASE_PROFILES.
+    :type profile: str
+    :param engine_options: Keyword arguments overriding the default pool settings.
+    :return: The database engine.
+    :rtype: SQLAlchemy engine
+    :raises KeyError: If the profile is unknown.
+    """
+    pragmas = DATABASE_PROFILES[profile]
+    engine_options = {
+        "pool_size": DATABASE_POOL_SIZE,
+        "max_overflow": DATABASE_MAX_OVERFLOW,
+        "pool_timeout": DATABASE_POOL_TIMEOUT,
+        **engine_options,
+    }
+    engine = create_engine(url, **engine_options)
+
+    @event.listens_for(engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query_timer(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        connection.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def observe_query_duration(
+        connection, cursor, statement, parameters, context, executemany
+    ):
+        duration = time.perf_counter() - connection.info["query_started"].pop()
+        statement_type = (
+            statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        )
+        sqlite_query_duration.observe(duration, statement_type)
+
+    @event.listens_for(engine, "handle_error")
+    def discard_query_timer(exception_context):
+        if exception_context.connection is not None:
+            query_started = exception_context.connection.info.get("query_started")
+            if query_started:
+                query_started.pop()
+
+    return engine
 
 
 class Database(DatabaseInterface):
@@ -36,8 +101,49 @@ class Database(DatabaseInterface):
         :rtype: SQLAlchemy engine
         """
         if cls.__engine is None:
-            cls.__engine = create_engine(DATABASE_URL)
+            cls.__engine = create_database_engine(DATABASE_URL)
         return cls.__engine
 
 
+class DatabasePool(DatabaseInterface):
+    """
+    Database engine with a connection pool of its own.
+
+    Used by components that must not share connections with the default engine.
+    """
+
+    def __init__(
+        self, url: str = DATABASE_URL, profile: str = DATABASE_PROFILE, **engine_options
+    ):
+        self.url = url
+        self.profile = profile
+        self.engine_options = engine_options
+        self.__engine = None
+        self.__session_factory = None
+
+    def get_session(self):
+        """
+        Returns a new database session.
+
+        :return: The database session.
+        :rtype: SQLAlchemy session
+        """
+        if self.__session_factory is None:
+            self.__session_factory = sessionmaker(bind=self.get_engine())
+        return self.__session_factory()
+
+    def get_engine(self):
+        """
+        Returns the database engine, creating it on first use.
+
+        :return: The database engine.
+        :rtype: SQLAlchemy engine
+        """
+        if self.__engine is None:
+            self.__engine = create_database_engine(
+                self.url, self.profile, **self.engine_options
+            )
+        return self.__engine
+
+
 database = Database()
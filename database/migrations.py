@@ -0,0 +1,42 @@
+from sqlalchemy import inspect, text
+
+
+def add_missing_columns(engine, metadata):
+    """
+    Adds the columns declared in the metadata that are missing from existing tables.
+
+    create_all only creates missing tables, so columns added to a model later are added
+    here with ALTER TABLE. Added columns are nullable and start out empty.
+
+    :param engine: The database engine.
+    :param metadata: The SQLAlchemy metadata describing the tables.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                    )
+                )
+
+
+def add_missing_indexes(engine, metadata):
+    """
+    Creates the indexes declared in the metadata that are missing from existing tables.
+
+    :param engine: The database engine.
+    :param metadata: The SQLAlchemy metadata describing the tables.
+    """
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
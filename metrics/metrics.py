@@ -0,0 +1,370 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds, in seconds, of the histogram buckets.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class MetricsRegistry:
+    """
+    The set of metrics exposed by /metrics, keyed by name.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric"):
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class Metric:
+    """
+    Base class of the metrics, holding one value per combination of label values.
+
+    Metrics register themselves with the registry they are created with, and are rendered
+    in the Prometheus text exposition format. A metric created with a function reports the
+    value returned by the function whenever it is rendered instead.
+    """
+
+    type_name = None
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        registry: MetricsRegistry = registry,
+        function: Optional[Callable[[], float]] = None,
+    ):
+        self.name = name
+        self.function = function
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def render(self) -> List[str]:
+        """
+        Returns the lines of the metric in the Prometheus text exposition format.
+
+        :rtype: List[str]
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, label_values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{format_labels(label_values)} {format_value(value)}"
+            )
+        return lines
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        if self.function is not None:
+            yield "", (), self.function()
+            return
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield "", tuple(zip(self.label_names, label_values)), value
+
+    def value(self, *label_values: str) -> float:
+        """
+        Returns the current value for the given label values.
+
+        :rtype: float
+        """
+        with self._lock:
+            return self._values.get(label_values, 0.0)
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, such as a number of requests.
+    """
+
+    type_name = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down.
+    """
+
+    type_name = "gauge"
+
+    def set(self, value: float, *label_values: str):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1.0):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(Metric):
+    """
+    Counts observations, such as durations, into cumulative buckets.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        registry: MetricsRegistry = registry,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names, registry)
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                # One count per bucket, plus the +Inf bucket, then the sum.
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                self._values[label_values] = series
+            series[index] += 1
+            series[-1] += value
+
+    def value(self, *label_values: str) -> Tuple[int, float]:
+        """
+        Returns the number and the sum of the observations for the given label values.
+
+        :rtype: Tuple[int, float]
+        """
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                return 0, 0.0
+            return sum(series[:-1]), series[-1]
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(series) for labels, series in self._values.items()}
+        for label_values, series in sorted(values.items()):
+            labels = tuple(zip(self.label_names, label_values))
+            count = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), series):
+                count += bucket_count
+                yield "_bucket", labels + (("le", format_value(bound)),), count
+            yield "_count", labels, count
+            yield "_sum", labels, series[-1]
+
+
+def format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{name}="{escape_label(value)}"' for name, value in labels)
+    return "{" + ",".join(pairs) + "}"
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Timings of the current request, reported in its Server-Timing header.
+server_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "server_timings", default=None
+)
+
+http_requests = Counter(
+    "vin_http_requests_total",
+    "HTTP requests handled, by method, route and status code.",
+    ("method", "path", "status"),
+)
+http_request_duration = Histogram(
+    "vin_http_request_duration_seconds",
+    "Time taken to handle HTTP requests, including streaming the response body.",
+    ("method", "path"),
+)
+stage_duration = Histogram(
+    "vin_stage_duration_seconds",
+    "Time spent in each stage of the request handlers.",
+    ("stage",),
+)
+cache_lookups = Counter(
+    "vin_cache_lookups_total",
+    "VINs looked up in the cache, by result (hit or miss).",
+    ("result",),
+)
+cache_hit_ratio = Gauge(
+    "vin_cache_hit_ratio",
+    "Share of the VINs looked up that were found in the cache.",
+    function=lambda: cache_lookups.value("hit")
+    / max(cache_lookups.value("hit") + cache_lookups.value("miss"), 1),
+)
+negative_cache_hits = Counter(
+    "vin_negative_cache_hits_total",
+    "Lookups answered with a 404 from the negative cache, without querying the vPIC API.",
+)
+negative_cache_stores = Counter(
+    "vin_negative_cache_stores_total",
+    "VINs stored in the negative cache after the vPIC API returned no vehicle details.",
+)
+stale_cache_hits = Counter(
+    "vin_stale_cache_hits_total",
+    "Cache hits older than vehicle_details_ttl, served while refreshed in the background.",
+)
+cache_refreshes = Counter(
+    "vin_cache_refreshes_total",
+    "Background refreshes of stale cache entries that updated the cache (refreshed) or "
+    "kept the stale entry because the vPIC API returned no vehicle details (failed).",
+    ("result",),
+)
+prefix_decoder_lookups = Counter(
+    "vin_prefix_decoder_lookups_total",
+    "Cache misses the prefix decoder answered (decoded) or left to the vPIC API (fallback).",
+    ("result",),
+)
+warmup_vins = Counter(
+    "vin_warmup_vins_total",
+    "VINs processed by cache warm-up jobs, by result: cached, skipped (already cached), "
+    "invalid, undecoded (no vehicle details) or failed (vPIC request failed).",
+    ("result",),
+)
+imported_rows = Counter(
+    "vin_imported_rows_total",
+    "Rows of imported parquet files, by result: written (inserted or updated) or invalid.",
+    ("result",),
+)
+cache_evictions = Counter(
+    "vin_cache_evicted_rows_total",
+    "Rows evicted from the SQLite cache to keep it within its bounds, by policy (lru or lfu).",
+    ("policy",),
+)
+upstream_retries = Counter(
+    "vin_upstream_retries_total",
+    "vPIC requests retried after a timeout, a connection error, a 429 or a 5xx, by endpoint.",
+    ("endpoint",),
+)
+upstream_rejections = Counter(
+    "vin_upstream_rejections_total",
+    "vPIC requests failed fast without being sent, by reason: circuit_open or rate_limited.",
+    ("endpoint", "reason"),
+)
+upstream_request_duration = Histogram(
+    "vin_upstream_request_duration_seconds",
+    "Time taken by requests to the vPIC API, by endpoint and outcome.",
+    ("endpoint", "outcome"),
+)
+upstream_requests_in_flight = Gauge(
+    "vin_upstream_requests_in_flight",
+    "Requests to the vPIC API currently awaiting a response.",
+)
+sqlite_query_duration = Histogram(
+    "vin_sqlite_query_duration_seconds",
+    "Time taken to execute SQLite statements, by statement type.",
+    ("statement",),
+)
+export_snapshot_duration = Histogram(
+    "vin_export_snapshot_write_seconds",
+    "Time taken to write parts of the export snapshot, by kind (rebuild or append).",
+    ("kind",),
+    buckets=DEFAULT_BUCKETS + (30.0, 60.0, 120.0),
+)
+
+
+@contextmanager
+def timed(
+    stage: str,
+    histogram: Histogram = stage_duration,
+    label_values: Sequence[str] = (),
+):
+    """
+    Records the duration of the enclosed block in the histogram, labelled with the stage
+    unless other label values are given, and in the Server-Timing header of the request.
+
+    :param stage: The stage name used in the Server-Timing header.
+    :type stage: str
+    :param histogram: The histogram receiving the duration.
+    :type histogram: Histogram
+    :param label_values: The label values of the histogram, the stage name by default.
+    :type label_values: Sequence[str]
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        histogram.observe(duration, *(tuple(label_values) or (stage,)))
+        add_server_timing(stage, duration)
+
+
+def add_server_timing(stage: str, duration: float):
+    """
+    Adds the duration of a stage to the Server-Timing header of the current request.
+
+    :param stage: The stage name.
+    :type stage: str
+    :param duration: The duration in seconds.
+    :type duration: float
+    """
+    timings = server_timings.get()
+    if timings is not None:
+        timings.append((stage, duration))
+
+
+def format_server_timing(timings: Sequence[Tuple[str, float]]) -> str:
+    """
+    Formats the stage timings as a Server-Timing header value, durations in milliseconds.
+
+    :rtype: str
+    """
+    return ", ".join(
+        f"{stage};dur={duration * 1000:.3f}" for stage, duration in timings
+    )
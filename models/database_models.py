@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, Text
+import json
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text, select
 from sqlalchemy.ext.declarative import declarative_base
-from database.connection import Database
+from sqlalchemy.orm import Session
+from database.migrations import add_missing_columns, add_missing_indexes
 
 
 Base = declarative_base()
@@ -9,13 +13,139 @@ Base = declarative_base()
 class Vin(Base):
     """
     Represents the VIN table in the database.
+
+    The vehicle details are stored in typed columns. vehicle_details holds the JSON
+    document rows were stored as before, until migrate_json_vins moves it into the columns.
+    hits and last_accessed_at are maintained by the cache for eviction. hits starts at 0
+    for rows cached by the application, and is None for rows imported or cached before
+    reads were tracked.
     """
 
     __tablename__ = "vins"
+    __table_args__ = (
+        Index("ix_vins_make_model", "make", "model"),
+        Index("ix_vins_hits_last_accessed_at", "hits", "last_accessed_at"),
+    )
 
     vin = Column(String(17), primary_key=True)
     vehicle_details = Column(Text(255))
+    make = Column(String(128))
+    model = Column(String(128))
+    model_year = Column(Integer, index=True)
+    body_class = Column(String(128))
+    fetched_at = Column(DateTime, index=True)
+    source = Column(String(32))
+    hits = Column(Integer, default=0)
+    last_accessed_at = Column(DateTime, index=True)
+
+    @staticmethod
+    def columns_from_vehicle_details(vehicle_details: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Maps the vehicle details returned by the API onto the typed columns.
+
+        :param vehicle_details: The vehicle details, as produced by build_response.
+        :type vehicle_details: Dict[str, Any]
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "make": vehicle_details.get("Make"),
+            "model": vehicle_details.get("Model"),
+            "model_year": parse_model_year(vehicle_details.get("Model Year")),
+            "body_class": vehicle_details.get("Body Class"),
+        }
+
+    def to_vehicle_details(self) -> Dict[str, Any]:
+        """
+        Rebuilds the vehicle details, in the shape produced by build_response.
+
+        :rtype: Dict[str, Any]
+        """
+        if self.vehicle_details is not None:
+            return json.loads(self.vehicle_details)
+        return {
+            "Make": self.make,
+            "Model": self.model,
+            "Model Year": None if self.model_year is None else str(self.model_year),
+            "Body Class": self.body_class,
+            "Input VIN Requested": self.vin,
+        }
+
+
+class NegativeVin(Base):
+    """
+    Represents the table of VINs the vPIC API returned no vehicle details for.
+    """
+
+    __tablename__ = "negative_vins"
+
+    vin = Column(String(17), primary_key=True)
+    cached_at = Column(DateTime, nullable=False, index=True)
+
+
+class CacheMetadata(Base):
+    """
+    Represents the cache metadata table, a set of named counters.
+    """
+
+    __tablename__ = "cache_metadata"
+
+    name = Column(String(32), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+
+def parse_model_year(model_year: Any) -> Optional[int]:
+    """
+    Parses the model year reported by the vPIC API, which is a string such as "2014".
+
+    :return: The model year, or None if it is missing or not a year.
+    :rtype: Optional[int]
+    """
+    try:
+        model_year = int(model_year)
+    except (TypeError, ValueError):
+        return None
+    return model_year if 0 < model_year < 10000 else None
 
 
-# Create the tables
-Base.metadata.create_all(bind=Database.get_engine())
+def migrate_json_vins(engine, batch_size: int = 1000) -> int:
+    """
+    Moves the vehicle details of rows still stored as JSON into the typed columns.
+
+    :param engine: The database engine.
+    :param batch_size: The number of rows migrated per transaction.
+    :type batch_size: int
+    :return: The number of migrated rows.
+    :rtype: int
+    """
+    migrated_rows = 0
+    with Session(engine) as db_session:
+        while True:
+            rows = db_session.scalars(
+                select(Vin).where(Vin.vehicle_details.is_not(None)).limit(batch_size)
+            ).all()
+            if not rows:
+                return migrated_rows
+            for row in rows:
+                try:
+                    vehicle_details = json.loads(row.vehicle_details)
+                except ValueError:
+                    vehicle_details = {}
+                for name, value in Vin.columns_from_vehicle_details(
+                    vehicle_details
+                ).items():
+                    setattr(row, name, value)
+                row.vehicle_details = None
+            db_session.commit()
+            migrated_rows += len(rows)
+
+
+def create_tables(engine):
+    """
+    Creates the tables and brings existing ones up to date with the models.
+
+    :param engine: The database engine.
+    """
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine, Base.metadata)
+    add_missing_indexes(engine, Base.metadata)
+    migrate_json_vins(engine)
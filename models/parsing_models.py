@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, root_validator, validator
+
+from app.config import batch_lookup_max_vins, bulk_remove_max_vins
+
+
+class BatchLookupRequest(BaseModel):
+    """
+    Represents the body of a batch lookup request.
+    """
+
+    vins: List[str] = Field(..., min_items=1, max_items=batch_lookup_max_vins)
+
+
+class WarmupRequest(BaseModel):
+    """
+    Represents the body of a warm-up request.
+    """
+
+    path: str = Field(..., min_length=1)
+    restart: bool = False
+
+
+class BulkRemoveRequest(BaseModel):
+    """
+    Represents the body of a bulk remove request. The VINs matching every given criterion
+    are removed.
+    """
+
+    vins: Optional[List[str]] = Field(None, min_items=1, max_items=bulk_remove_max_vins)
+    vin_prefix: Optional[str] = Field(None, min_length=1, max_length=17)
+    make: Optional[str] = Field(None, min_length=1)
+    model: Optional[str] = Field(None, min_length=1)
+    model_year: Optional[int] = None
+    fetched_before: Optional[datetime] = None
+
+    @validator("fetched_before")
+    def to_naive_utc(cls, fetched_before: Optional[datetime]) -> Optional[datetime]:
+        if fetched_before is None or fetched_before.tzinfo is None:
+            return fetched_before
+        return fetched_before.astimezone(timezone.utc).replace(tzinfo=None)
+
+    @root_validator(skip_on_failure=True)
+    def check_criteria(cls, values):
+        if all(value is None for value in values.values()):
+            raise ValueError("At least one criterion is required.")
+        return values